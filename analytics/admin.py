@@ -0,0 +1,27 @@
+from django.contrib import admin
+
+from .models import DailyOrderStats, ProductDailySales
+
+
+class RollupAdmin(admin.ModelAdmin):
+    """Lecture seule : les agrégats sont calculés (rebuild_analytics pour corriger)"""
+    date_hierarchy = 'day'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ProductDailySales)
+class ProductDailySalesAdmin(RollupAdmin):
+    list_display = ['day', 'product', 'units', 'revenue']
+    list_select_related = ['product']
+    raw_id_fields = ['product']
+
+
+@admin.register(DailyOrderStats)
+class DailyOrderStatsAdmin(RollupAdmin):
+    list_display = ['day', 'status', 'orders', 'revenue']
+    list_filter = ['status']
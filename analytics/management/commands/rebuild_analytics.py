@@ -0,0 +1,30 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from analytics.rollups import rebuild
+
+
+def parse_day(value):
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f'Date invalide (AAAA-MM-JJ attendu) : {value}')
+
+
+class Command(BaseCommand):
+    help = "Recalcule les agrégats de ventes d'une période depuis les commandes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='Premier jour (AAAA-MM-JJ), sans borne par défaut')
+        parser.add_argument('--end', help='Dernier jour inclus (AAAA-MM-JJ), sans borne par défaut')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        start = parse_day(options['start']) if options['start'] else None
+        end = parse_day(options['end']) if options['end'] else None
+        if start and end and end < start:
+            raise CommandError('--end doit être postérieur à --start')
+        written = rebuild(start, end, options['batch_size'])
+        period = f"du {start or 'début'} au {end or 'dernier jour'}"
+        self.stdout.write(f'{written} ligne(s) d\'agrégats recalculée(s) {period}')
@@ -0,0 +1,43 @@
+from django.db import models
+
+from orders.models import Order
+from products.models import Product
+
+
+class ProductDailySales(models.Model):
+    """Ventes d'un produit sur une journée, hors commandes annulées"""
+    day = models.DateField()
+    product = models.ForeignKey(Product, related_name='daily_sales', on_delete=models.CASCADE)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.day} - {self.product_id} : {self.units} vendu(s)"
+
+    class Meta:
+        ordering = ['-day']
+        verbose_name = 'ventes journalières par produit'
+        verbose_name_plural = 'ventes journalières par produit'
+        constraints = [
+            # Clé des mises à jour incrémentales (INSERT ... ON CONFLICT)
+            models.UniqueConstraint(fields=['day', 'product'], name='product_daily_sales_key'),
+        ]
+
+
+class DailyOrderStats(models.Model):
+    """Nombre et montant des commandes d'une journée, par statut"""
+    day = models.DateField()
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    orders = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.day} - {self.status} : {self.orders} commande(s)"
+
+    class Meta:
+        ordering = ['-day']
+        verbose_name = 'commandes journalières par statut'
+        verbose_name_plural = 'commandes journalières par statut'
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'status'], name='daily_order_stats_key'),
+        ]
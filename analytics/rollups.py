@@ -0,0 +1,142 @@
+"""
+Tables d'agrégats des ventes.
+
+Les agrégats sont tenus à jour au fil de l'eau, dans la transaction qui
+crée, modifie ou supprime les commandes : chaque évènement agrège
+seulement les commandes concernées puis ajoute (ou retire) les montants
+avec ``INSERT ... ON CONFLICT DO UPDATE SET x = x + excluded.x``, ce qui
+reste correct avec des écritures concurrentes.
+
+Les lignes modifiées directement (admin, SQL) ne sont pas suivies :
+``manage.py rebuild_analytics`` recalcule une période depuis les tables brutes.
+"""
+import datetime
+
+from django.db import connections, router, transaction
+from django.db.models import Count, DecimalField, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from orders.models import Order, OrderItem
+from .models import DailyOrderStats, ProductDailySales
+
+CANCELLED = 'cancelled'
+
+SALES_UPSERT = """
+    INSERT INTO {table} (day, product_id, units, revenue) VALUES (%s, %s, %s, %s)
+    ON CONFLICT (day, product_id) DO UPDATE SET
+        units = {table}.units + excluded.units, revenue = {table}.revenue + excluded.revenue
+"""
+ORDERS_UPSERT = """
+    INSERT INTO {table} (day, status, orders, revenue) VALUES (%s, %s, %s, %s)
+    ON CONFLICT (day, status) DO UPDATE SET
+        orders = {table}.orders + excluded.orders, revenue = {table}.revenue + excluded.revenue
+"""
+
+
+def sales_by_day(items):
+    """Unités et chiffre d'affaires par (jour, produit) des lignes ``items``"""
+    return (items
+            .annotate(day=TruncDate('order__created_at'))
+            .values('day', 'product_id')
+            .annotate(units=Sum('quantity'),
+                      revenue=Sum(F('quantity') * F('price'),
+                                  output_field=DecimalField(max_digits=14, decimal_places=2)))
+            .order_by())
+
+
+def orders_by_day(orders, *fields):
+    """Nombre et montant des commandes ``orders`` par jour (et ``fields``)"""
+    return (orders
+            .annotate(day=TruncDate('created_at'))
+            .values('day', *fields)
+            .annotate(orders=Count('id'), revenue=Sum('total_amount'))
+            .order_by())
+
+
+def _upsert(model, sql, rows, using):
+    if not rows:
+        return
+    connection = connections[using]
+    ops = connection.ops
+    params = [
+        (ops.adapt_datefield_value(day), key, count, ops.adapt_decimalfield_value(revenue, 14, 2))
+        for day, key, count, revenue in rows
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql.format(table=connection.ops.quote_name(model._meta.db_table)), params)
+
+
+def add_sales(rows, sign=1, using=None):
+    _upsert(ProductDailySales, SALES_UPSERT, [
+        (row['day'], row['product_id'], sign * row['units'], sign * row['revenue']) for row in rows
+    ], using or router.db_for_write(ProductDailySales))
+
+
+def add_order_stats(rows, sign=1, using=None):
+    _upsert(DailyOrderStats, ORDERS_UPSERT, [
+        (row['day'], row['status'], sign * row['orders'], sign * row['revenue']) for row in rows
+    ], using or router.db_for_write(DailyOrderStats))
+
+
+def record_orders(order_ids, sign=1):
+    """Ajoute (``sign=1``) ou retire (``sign=-1``) des commandes des agrégats"""
+    add_order_stats(orders_by_day(Order.objects.filter(pk__in=order_ids), 'status'), sign)
+    items = OrderItem.objects.filter(order_id__in=order_ids).exclude(order__status=CANCELLED)
+    add_sales(sales_by_day(items), sign)
+
+
+def record_status_change(order_ids, old_status, new_status):
+    """Déplace des commandes de ``old_status`` vers ``new_status`` dans les agrégats"""
+    rows = list(orders_by_day(Order.objects.filter(pk__in=order_ids)))
+    # Retrait de l'ancien statut et ajout au nouveau en un seul envoi
+    add_order_stats(
+        [{**row, 'status': old_status, 'orders': -row['orders'], 'revenue': -row['revenue']} for row in rows]
+        + [{**row, 'status': new_status} for row in rows]
+    )
+    # Les ventes par produit ne comptent pas les commandes annulées
+    if CANCELLED in (old_status, new_status) and old_status != new_status:
+        sign = -1 if new_status == CANCELLED else 1
+        add_sales(sales_by_day(OrderItem.objects.filter(order_id__in=order_ids)), sign)
+
+
+def day_bounds(start=None, end=None):
+    """Bornes ``created_at`` (fuseau courant) des jours ``start`` à ``end`` inclus"""
+    bounds = {}
+    if start is not None:
+        bounds['created_at__gte'] = timezone.make_aware(datetime.datetime.combine(start, datetime.time.min))
+    if end is not None:
+        next_day = end + datetime.timedelta(days=1)
+        bounds['created_at__lt'] = timezone.make_aware(datetime.datetime.combine(next_day, datetime.time.min))
+    return bounds
+
+
+def rebuild(start=None, end=None, batch_size=5000):
+    """
+    Recalcule les agrégats des jours ``start`` à ``end`` (inclus, None =
+    sans borne) depuis les commandes. Retourne le nombre de lignes écrites.
+    """
+    days = {}
+    if start is not None:
+        days['day__gte'] = start
+    if end is not None:
+        days['day__lte'] = end
+    orders = Order.objects.filter(**day_bounds(start, end))
+    items = OrderItem.objects.filter(order__in=orders).exclude(order__status=CANCELLED)
+
+    written = 0
+    with transaction.atomic(using=router.db_for_write(ProductDailySales)):
+        ProductDailySales.objects.filter(**days).delete()
+        DailyOrderStats.objects.filter(**days).delete()
+        for model, rows in (
+            (DailyOrderStats, orders_by_day(orders, 'status')),
+            (ProductDailySales, sales_by_day(items)),
+        ):
+            batch = []
+            for row in rows.iterator(chunk_size=batch_size):
+                batch.append(model(**row))
+                if len(batch) >= batch_size:
+                    written += len(model.objects.bulk_create(batch))
+                    batch = []
+            written += len(model.objects.bulk_create(batch))
+    return written
@@ -0,0 +1,59 @@
+import datetime
+
+from django.utils import timezone
+from rest_framework import serializers
+
+from orders.models import Order
+
+# Au-delà, un tableau de bord doit passer par l'export ou un agrégat mensuel
+MAX_PERIOD_DAYS = 366
+DEFAULT_PERIOD_DAYS = 30
+
+
+class PeriodSerializer(serializers.Serializer):
+    """Période demandée : ``start`` et ``end`` inclus, les 30 derniers jours par défaut"""
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        end = attrs.get('end') or timezone.localdate()
+        start = attrs.get('start') or end - datetime.timedelta(days=DEFAULT_PERIOD_DAYS - 1)
+        if end < start:
+            raise serializers.ValidationError({'end': ['Doit être postérieur à start.']})
+        if (end - start).days >= MAX_PERIOD_DAYS:
+            raise serializers.ValidationError({'start': [f'Période limitée à {MAX_PERIOD_DAYS} jours.']})
+        return {'start': start, 'end': end}
+
+
+class TopProductsSerializer(PeriodSerializer):
+    limit = serializers.IntegerField(required=False, default=10, min_value=1, max_value=100)
+
+    def validate(self, attrs):
+        return {**super().validate(attrs), 'limit': attrs['limit']}
+
+
+class TotalsSerializer(serializers.Serializer):
+    orders = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+
+
+class DailyRevenueSerializer(TotalsSerializer):
+    day = serializers.DateField()
+
+
+class StatusTotalsSerializer(TotalsSerializer):
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
+
+
+class SummarySerializer(TotalsSerializer):
+    start = serializers.DateField()
+    end = serializers.DateField()
+    units = serializers.IntegerField()
+    statuses = StatusTotalsSerializer(many=True)
+
+
+class ProductSalesSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField()
+    name = serializers.CharField()
+    units = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
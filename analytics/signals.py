@@ -0,0 +1,22 @@
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+
+from orders.models import Order
+from orders.signals import order_placed, order_status_changed
+from . import rollups
+
+
+@receiver(order_placed)
+def record_placed_orders(sender, order_ids, **kwargs):
+    rollups.record_orders(order_ids)
+
+
+@receiver(order_status_changed)
+def record_status_change(sender, order_ids, old_status, new_status, **kwargs):
+    rollups.record_status_change(order_ids, old_status, new_status)
+
+
+@receiver(pre_delete, sender=Order)
+def forget_deleted_order(sender, instance, **kwargs):
+    # Avant la suppression : les lignes de la commande existent encore
+    rollups.record_orders([instance.pk], sign=-1)
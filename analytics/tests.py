@@ -0,0 +1,132 @@
+import datetime
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from orders.models import Order, OrderItem
+from products.models import Product
+from .models import DailyOrderStats, ProductDailySales
+
+
+def snapshot():
+    """Contenu des agrégats, pour comparer avec un recalcul complet"""
+    return (
+        sorted(DailyOrderStats.objects.filter(orders__gt=0).values_list('day', 'status', 'orders', 'revenue')),
+        sorted(ProductDailySales.objects.filter(units__gt=0).values_list('day', 'product_id', 'units', 'revenue')),
+    )
+
+
+class RollupTests(APITestCase):
+    def setUp(self):
+        self.honey = Product.objects.create(name='Miel', description='Pur', price=Decimal('2500.00'), stock=100)
+        self.bread = Product.objects.create(name='Pain', description='Frais', price=Decimal('150.00'), stock=100)
+
+    def place_order(self, *lines):
+        response = self.client.post(reverse('order-create-order'), {
+            'customer_name': 'Awa', 'customer_email': 'awa@example.com', 'customer_address': 'Dakar',
+            'items_data': [{'product_id': product.id, 'quantity': quantity} for product, quantity in lines],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return Order.objects.get(pk=response.data['order_id'])
+
+    def test_orders_update_rollups_incrementally(self):
+        self.place_order((self.honey, 2), (self.bread, 1))
+        self.place_order((self.honey, 1))
+        today = timezone.localdate()
+        self.assertEqual(ProductDailySales.objects.get(day=today, product=self.honey).units, 3)
+        self.assertEqual(ProductDailySales.objects.get(day=today, product=self.bread).revenue, Decimal('150.00'))
+        stats = DailyOrderStats.objects.get(day=today, status='pending')
+        self.assertEqual((stats.orders, stats.revenue), (2, Decimal('7650.00')))
+
+    def test_status_changes_move_counts_and_cancel_removes_sales(self):
+        order = self.place_order((self.honey, 2))
+        self.client.post(reverse('order-confirm-order', args=[order.id]))
+        self.client.post(reverse('order-cancel-order', args=[order.id]))
+        counts = dict(DailyOrderStats.objects.values_list('status', 'orders'))
+        self.assertEqual(counts, {'pending': 0, 'confirmed': 0, 'cancelled': 1})
+        self.assertEqual(ProductDailySales.objects.get(product=self.honey).units, 0)
+
+    def test_deleted_orders_are_removed(self):
+        order = self.place_order((self.honey, 1))
+        self.place_order((self.bread, 4))
+        order.delete()
+        self.assertEqual(ProductDailySales.objects.get(product=self.honey).units, 0)
+        self.assertEqual(DailyOrderStats.objects.get(status='pending').orders, 1)
+
+    def test_rebuild_matches_incremental_rollups(self):
+        self.place_order((self.honey, 2), (self.bread, 3))
+        cancelled = self.place_order((self.bread, 1))
+        cancelled.status = 'cancelled'
+        cancelled.save()
+        old = self.place_order((self.honey, 1))
+        Order.objects.filter(pk=old.pk).update(created_at=timezone.now() - datetime.timedelta(days=3))
+        # update() ne passe pas par les signaux : seul le recalcul déplace la commande
+        expected_old_day = timezone.localdate() - datetime.timedelta(days=3)
+        call_command('rebuild_analytics', stdout=StringIO())
+        incremental = snapshot()
+        self.assertIn(expected_old_day, {row[0] for row in incremental[1]})
+
+        ProductDailySales.objects.all().delete()
+        DailyOrderStats.objects.all().delete()
+        call_command('rebuild_analytics', start=expected_old_day.isoformat(),
+                     end=timezone.localdate().isoformat(), stdout=StringIO())
+        self.assertEqual(snapshot(), incremental)
+
+    def test_rebuild_only_touches_requested_days(self):
+        self.place_order((self.honey, 1))
+        yesterday = timezone.localdate() - datetime.timedelta(days=1)
+        DailyOrderStats.objects.create(day=yesterday, status='pending', orders=99, revenue=0)
+        call_command('rebuild_analytics', start=timezone.localdate().isoformat(), stdout=StringIO())
+        self.assertEqual(DailyOrderStats.objects.get(day=yesterday).orders, 99)
+        call_command('rebuild_analytics', end=yesterday.isoformat(), stdout=StringIO())
+        self.assertFalse(DailyOrderStats.objects.filter(day=yesterday).exists())
+
+
+class AnalyticsApiTests(APITestCase):
+    def setUp(self):
+        self.today = timezone.localdate()
+        self.yesterday = self.today - datetime.timedelta(days=1)
+        self.honey = Product.objects.create(name='Miel', description='Pur', price=Decimal('2500.00'), stock=1)
+        self.bread = Product.objects.create(name='Pain', description='Frais', price=Decimal('150.00'), stock=1)
+        ProductDailySales.objects.bulk_create([
+            ProductDailySales(day=self.yesterday, product=self.honey, units=2, revenue=Decimal('5000')),
+            ProductDailySales(day=self.today, product=self.bread, units=10, revenue=Decimal('1500')),
+            ProductDailySales(day=self.today, product=self.honey, units=1, revenue=Decimal('2500')),
+        ])
+        DailyOrderStats.objects.bulk_create([
+            DailyOrderStats(day=self.yesterday, status='delivered', orders=2, revenue=Decimal('5000')),
+            DailyOrderStats(day=self.today, status='pending', orders=3, revenue=Decimal('4000')),
+            DailyOrderStats(day=self.today, status='cancelled', orders=1, revenue=Decimal('900')),
+        ])
+
+    def test_summary_reads_only_rollups(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('analytics-list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['orders'], response.data['revenue'], response.data['units']),
+                         (5, '9000.00', 13))
+        statuses = {row['status']: row['orders'] for row in response.data['statuses']}
+        self.assertEqual(statuses, {'pending': 3, 'confirmed': 0, 'shipped': 0, 'delivered': 2, 'cancelled': 1})
+
+    def test_daily_revenue_fills_empty_days(self):
+        start = self.today - datetime.timedelta(days=2)
+        response = self.client.get(reverse('analytics-revenue'), {'start': start, 'end': self.today})
+        self.assertEqual([(row['orders'], row['revenue']) for row in response.data],
+                         [(0, '0.00'), (2, '5000.00'), (3, '4000.00')])
+
+    def test_top_products(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('analytics-products'), {'limit': 1})
+        self.assertEqual(list(response.data), [
+            {'product_id': self.honey.id, 'name': 'Miel', 'units': 3, 'revenue': '7500.00'},
+        ])
+
+    def test_invalid_period_is_rejected(self):
+        response = self.client.get(reverse('analytics-list'), {'start': self.today, 'end': self.yesterday})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(reverse('analytics-list'), {'start': '2020-01-01', 'end': '2024-01-01'})
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,78 @@
+import datetime
+from decimal import Decimal
+
+from django.db.models import F, Sum
+from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from orders.models import Order
+from .models import DailyOrderStats, ProductDailySales
+from .rollups import CANCELLED
+from .serializers import (DailyRevenueSerializer, PeriodSerializer, ProductSalesSerializer,
+                          SummarySerializer, TopProductsSerializer)
+
+
+class AnalyticsViewSet(viewsets.ViewSet):
+    """
+    Tableaux de bord des ventes.
+
+    Toutes les réponses sont lues dans les tables d'agrégats journaliers
+    (une ligne par jour et par produit ou statut), jamais dans les commandes.
+    Le chiffre d'affaires exclut les commandes annulées.
+    """
+
+    def get_period(self, serializer_class=PeriodSerializer):
+        serializer = serializer_class(data=self.request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data
+
+    def list(self, request):
+        """Totaux de la période et répartition des commandes par statut"""
+        period = self.get_period()
+        days = (period['start'], period['end'])
+        totals = {
+            row['status']: row
+            for row in DailyOrderStats.objects.filter(day__range=days)
+            .values('status').annotate(orders=Sum('orders'), revenue=Sum('revenue')).order_by()
+        }
+        statuses = [
+            {'status': status, 'orders': totals.get(status, {}).get('orders', 0),
+             'revenue': totals.get(status, {}).get('revenue') or Decimal('0')}
+            for status, _ in Order.STATUS_CHOICES
+        ]
+        sold = [row for row in statuses if row['status'] != CANCELLED]
+        units = ProductDailySales.objects.filter(day__range=days).aggregate(units=Sum('units'))['units']
+        return Response(SummarySerializer({
+            **period,
+            'orders': sum(row['orders'] for row in sold),
+            'revenue': sum((row['revenue'] for row in sold), Decimal('0')),
+            'units': units or 0,
+            'statuses': statuses,
+        }).data)
+
+    @action(detail=False)
+    def revenue(self, request):
+        """Commandes et chiffre d'affaires par jour (jours sans vente inclus)"""
+        period = self.get_period()
+        rows = {
+            row['day']: row
+            for row in DailyOrderStats.objects.filter(day__range=(period['start'], period['end']))
+            .exclude(status=CANCELLED)
+            .values('day').annotate(orders=Sum('orders'), revenue=Sum('revenue')).order_by()
+        }
+        series = []
+        day = period['start']
+        while day <= period['end']:
+            series.append(rows.get(day, {'day': day, 'orders': 0, 'revenue': Decimal('0')}))
+            day += datetime.timedelta(days=1)
+        return Response(DailyRevenueSerializer(series, many=True).data)
+
+    @action(detail=False)
+    def products(self, request):
+        """Produits les plus vendus de la période (``?limit=``, par chiffre d'affaires)"""
+        period = self.get_period(TopProductsSerializer)
+        rows = (ProductDailySales.objects.filter(day__range=(period['start'], period['end']))
+                .values('product_id').annotate(name=F('product__name'), units=Sum('units'), revenue=Sum('revenue'))
+                .filter(units__gt=0).order_by('-revenue', 'product_id')[:period['limit']])
+        return Response(ProductSalesSerializer(rows, many=True).data)
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+"""
+Lectures du catalogue sous ASGI : vues DRF synchrones contre vues async.
+
+Les mêmes clients (liste paginée et fiches produit, tirages reproductibles)
+interrogent le handler ASGI standard de Django, où chaque requête occupe un
+thread, puis ``CatalogASGIHandler`` (``products.async_views``). Avec et sans
+cache, pour séparer le coût de la base de celui du rendu.
+
+Usage :
+    python benchmarks/async_catalog.py [--concurrency 16 64 256] [--requests 20]
+"""
+import argparse
+
+from utils import print_table, setup_django, temporary_database
+
+setup_django()
+
+from django.core.cache import cache  # noqa: E402
+from django.core.handlers.asgi import ASGIHandler  # noqa: E402
+from django.test import override_settings  # noqa: E402
+
+from benchmarks.loadtest import Traffic, run_asgi, seed  # noqa: E402
+from ecommerce.asgi import CatalogASGIHandler  # noqa: E402
+
+MIX = {'catalog': 50, 'product_detail': 50}
+HANDLERS = {'sync (ASGIHandler)': ASGIHandler, 'async (CatalogASGIHandler)': CatalogASGIHandler}
+NO_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[16, 64, 256])
+    parser.add_argument('--requests', type=int, default=20, help='requêtes par client')
+    parser.add_argument('--products', type=int, default=2000)
+    args = parser.parse_args()
+
+    rows = []
+    with temporary_database(on_disk=True), override_settings(DEBUG=False):
+        product_ids, _ = seed(args.products, 0)
+        for cached in (False, True):
+            with override_settings(**({} if cached else {'CACHES': NO_CACHE})):
+                for concurrency in args.concurrency:
+                    for name, handler in HANDLERS.items():
+                        cache.clear()
+                        report = run_asgi(Traffic(product_ids, [], MIX), concurrency,
+                                          requests=args.requests, application=handler())
+                        total = report['total']
+                        rows.append({'cache': 'oui' if cached else 'non', 'clients': concurrency,
+                                     'vues': name, 'rps': total['rps'], 'erreurs': total['errors'],
+                                     'p50_ms': total['p50_ms'], 'p99_ms': total['p99_ms']})
+
+    print_table('Lectures du catalogue sous ASGI', rows,
+                ['cache', 'clients', 'vues', 'rps', 'erreurs', 'p50_ms', 'p99_ms'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+"""
+Benchmark des changements de statut en masse.
+
+Compare, pour ``--orders`` commandes en attente passées à ``confirmed`` :
+- la boucle d'avant (``get`` puis ``save()`` de toutes les colonnes, une
+  commande par requête HTTP ``confirm_order``), mesurée sur un échantillon
+  de ``--sample`` commandes puis extrapolée ;
+- ``transition_orders`` (lecture verrouillée + un UPDATE par paquet).
+
+Usage :
+    python benchmarks/bulk_transitions.py [--orders 10000] [--sample 500]
+"""
+import argparse
+import time
+
+from utils import print_table, setup_django, temporary_database
+
+setup_django()
+
+from decimal import Decimal  # noqa: E402
+
+from ecommerce.metrics import start_request_stats, stop_request_stats  # noqa: E402
+from orders.models import Order, OrderItem  # noqa: E402
+from orders.transitions import transition_orders  # noqa: E402
+from products.models import Product  # noqa: E402
+
+
+def seed(total, batch_size=5000):
+    OrderItem.objects.all().delete()
+    Order.objects.all().delete()
+    product = Product.objects.first() or Product.objects.create(
+        name='Produit', description='Benchmark', price=Decimal('10.00'), stock=10)
+    ids = []
+    for start in range(0, total, batch_size):
+        orders = Order.objects.bulk_create(
+            Order(customer_name=f'Client {i}', customer_email=f'client{i}@example.com',
+                  customer_address='Dakar', total_amount=Decimal('10.00'))
+            for i in range(start, min(total, start + batch_size))
+        )
+        OrderItem.objects.bulk_create(
+            OrderItem(order=order, product=product, quantity=1, price=product.price, product_name=product.name)
+            for order in orders
+        )
+        ids.extend(order.id for order in orders)
+    return ids
+
+
+def save_loop(ids):
+    for order_id in ids:
+        order = Order.objects.get(pk=order_id)
+        order.status = 'confirmed'
+        order.save()
+
+
+def timed(func, *args):
+    # Compteur des métriques : CaptureQueriesContext plafonne à 9000 requêtes
+    stats, token = start_request_stats()
+    try:
+        start = time.perf_counter()
+        func(*args)
+        return time.perf_counter() - start, stats.count
+    finally:
+        stop_request_stats(token)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--orders', type=int, default=10000)
+    parser.add_argument('--sample', type=int, default=500)
+    args = parser.parse_args()
+
+    with temporary_database():
+        ids = seed(args.orders)
+        sample = ids[:min(args.sample, len(ids))]
+        elapsed, queries = timed(save_loop, sample)
+        scale = len(ids) / len(sample)
+        rows = [{'mode': f'save() par commande (extrapolé de {len(sample)})', 'commandes': len(ids),
+                 'duree_s': round(elapsed * scale, 2), 'requetes': round(queries * scale)}]
+
+        ids = seed(args.orders)
+        elapsed, queries = timed(transition_orders, ids, 'confirmed')
+        assert Order.objects.filter(status='confirmed').count() == len(ids)
+        rows.append({'mode': 'transition_orders', 'commandes': len(ids),
+                     'duree_s': round(elapsed, 2), 'requetes': queries})
+
+        print_table('Confirmation de commandes en attente', rows, ['mode', 'commandes', 'duree_s', 'requetes'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,252 @@
+"""
+Budgets de performance par endpoint.
+
+Chaque route des routers ``products``, ``orders`` et ``analytics`` est déclarée dans
+``ENDPOINTS`` avec un nombre maximal de requêtes SQL et une latence p95
+maximale. ``run_suite`` remplit la base à plusieurs tailles, appelle chaque
+endpoint (cache vidé, donc chemin le plus coûteux) et retourne un rapport
+JSON stable, à comparer entre deux commits.
+
+Le nombre de requêtes ne doit pas dépendre de la taille des données :
+c'est ce qui fait échouer une régression N+1.
+"""
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from orders.cart import get_cart_store
+from orders.models import Order, OrderItem
+from analytics.urls import router as analytics_router
+from orders.urls import router as orders_router
+from products.models import Product
+from products.urls import router as products_router
+
+ROUTERS = [products_router, orders_router, analytics_router]
+DEFAULT_SIZES = (10, 100, 1000)
+
+CUSTOMER = {
+    'customer_name': 'Client Perf',
+    'customer_email': 'perf@example.com',
+    'customer_address': 'Dakar',
+}
+
+
+class Endpoint:
+    """
+    Un appel d'API et son budget.
+
+    ``prepare(data)`` est exécuté hors mesure et retourne ``(args, payload)`` :
+    les arguments de ``reverse`` et le corps JSON de la requête.
+    """
+
+    def __init__(self, name, method, max_queries, p95_ms, prepare=None, query=''):
+        self.name = name
+        self.method = method
+        self.max_queries = max_queries
+        self.p95_ms = p95_ms
+        self.prepare = prepare or (lambda data: ((), None))
+        self.query = query
+
+    @property
+    def key(self):
+        return f'{self.name} {self.method}'
+
+    def request(self, client, args, payload):
+        url = reverse(self.name, args=args) + self.query
+        response = getattr(client, self.method.lower())(url, payload, content_type='application/json')
+        if response.streaming:
+            # Le contenu est produit (et la base lue) pendant l'itération
+            response.content_bytes = b''.join(response.streaming_content)
+        return response
+
+
+def _product(data):
+    return (data['products'][0].id,), None
+
+
+def _new_product(data):
+    product = Product.objects.create(name='Jetable', description='Perf', price=Decimal('1.00'), stock=1)
+    return (product.id,), None
+
+
+def _product_payload(data):
+    return (data['products'][-1].id,), {'name': 'Produit modifié', 'description': 'Perf',
+                                        'price': '12.00', 'stock': 10 ** 6}
+
+
+def _order(data):
+    return (data['orders'][0].id,), None
+
+
+def _new_order(data):
+    return (_create_order(data['products'][:3]).id,), None
+
+
+def _order_payload(data):
+    return (data['orders'][0].id,), {**CUSTOMER, 'customer_address': 'Thiès', 'total_amount': '30.00'}
+
+
+def _pending_orders(data):
+    orders = Order.objects.bulk_create(Order(total_amount=Decimal('30.00'), **CUSTOMER) for _ in range(100))
+    return (), {'ids': [order.id for order in orders], 'status': 'confirmed'}
+
+
+def _cart(data):
+    return (), {**CUSTOMER, 'items_data': [{'product_id': p.id, 'quantity': 1} for p in data['products'][:5]]}
+
+
+def _stored_cart(payload=None):
+    """Panier de 5 produits ; ``payload(data)`` : corps de la requête"""
+    def prepare(data):
+        store = get_cart_store()
+        cart_id = store.create()
+        for product in data['products'][:5]:
+            store.change(cart_id, product.id, 1)
+        return (cart_id,), payload(data) if payload else None
+    return prepare
+
+
+def _cart_line(data):
+    return {'product_id': data['products'][0].id, 'quantity': 2}
+
+
+ENDPOINTS = [
+    Endpoint('api-root', 'GET', 0, 50),
+    Endpoint('product-list', 'GET', 2, 100),
+    Endpoint('product-list', 'POST', 2, 100, lambda data: ((), {
+        'name': 'Nouveau', 'description': 'Perf', 'price': '5.00', 'stock': 3})),
+    Endpoint('product-detail', 'GET', 2, 50, _product),
+    Endpoint('product-detail', 'PUT', 2, 100, _product_payload),
+    Endpoint('product-detail', 'PATCH', 2, 100, lambda data: ((data['products'][-1].id,), {'price': '11.00'})),
+    Endpoint('product-detail', 'DELETE', 5, 100, _new_product),
+    Endpoint('product-available', 'GET', 2, 100),
+    Endpoint('product-search', 'GET', 2, 100, query='?q=produit'),
+    Endpoint('order-list', 'GET', 3, 150),
+    Endpoint('order-list', 'POST', 15, 150, _cart),
+    Endpoint('order-detail', 'GET', 3, 50, _order),
+    Endpoint('order-detail', 'PUT', 5, 100, _order_payload),
+    Endpoint('order-detail', 'PATCH', 5, 100, lambda data: ((data['orders'][0].id,), {'customer_phone': '770000000'})),
+    Endpoint('order-detail', 'DELETE', 8, 100, _new_order),
+    Endpoint('order-export', 'GET', 2, 500),
+    Endpoint('order-create-order', 'POST', 18, 150, _cart),
+    Endpoint('order-confirm-order', 'POST', 6, 100, _new_order),
+    Endpoint('order-cancel-order', 'POST', 11, 100, _new_order),
+    Endpoint('order-bulk-transition', 'POST', 6, 200, _pending_orders),
+    # Le panier ne touche la base que pour le devis et la commande
+    Endpoint('cart-list', 'POST', 0, 20),
+    Endpoint('cart-detail', 'GET', 0, 20, _stored_cart()),
+    Endpoint('cart-detail', 'DELETE', 0, 20, _stored_cart()),
+    Endpoint('cart-add-item', 'POST', 0, 20, _stored_cart(_cart_line)),
+    Endpoint('cart-update-item', 'POST', 0, 20, _stored_cart(_cart_line)),
+    Endpoint('cart-remove-item', 'POST', 0, 20, _stored_cart(_cart_line)),
+    Endpoint('cart-quote', 'GET', 1, 50, _stored_cart()),
+    Endpoint('cart-checkout', 'POST', 18, 150, _stored_cart(lambda data: CUSTOMER)),
+    Endpoint('analytics-list', 'GET', 2, 50),
+    Endpoint('analytics-revenue', 'GET', 1, 50),
+    Endpoint('analytics-products', 'GET', 1, 50),
+]
+
+
+def routed_endpoints():
+    """Couples (nom de route, méthode HTTP) enregistrés par les routers"""
+    routes = set()
+    for router in ROUTERS:
+        for pattern in router.urls:
+            actions = getattr(pattern.callback, 'actions', None)
+            if actions is None:
+                routes.add((pattern.name, 'GET'))
+                continue
+            for method in actions:
+                # HEAD est servi par la même action que GET
+                if method != 'head':
+                    routes.add((pattern.name, method.upper()))
+    return routes
+
+
+def _create_order(products):
+    order = Order.objects.create(total_amount=sum(p.price for p in products), stock_reserved=False, **CUSTOMER)
+    OrderItem.objects.bulk_create(
+        OrderItem(order=order, product=p, quantity=1, price=p.price, product_name=p.name) for p in products
+    )
+    return order
+
+
+def seed(size):
+    """Remplace le contenu de la base par ``size`` produits et ``size`` commandes de 3 lignes"""
+    OrderItem.objects.all().delete()
+    Order.objects.all().delete()
+    Product.objects.all().delete()
+    products = Product.objects.bulk_create(
+        Product(name=f'Produit {i}', description='Produit de perf', price=Decimal('10.00'), stock=10 ** 6)
+        for i in range(size)
+    )
+    orders = Order.objects.bulk_create(
+        Order(total_amount=Decimal('30.00'), **CUSTOMER) for _ in range(size)
+    )
+    OrderItem.objects.bulk_create(
+        OrderItem(order=order, product=products[(i + j) % size], quantity=1, price=Decimal('10.00'),
+                  product_name=products[(i + j) % size].name)
+        for i, order in enumerate(orders) for j in range(3)
+    )
+    cache.clear()
+    return {'products': products, 'orders': orders}
+
+
+def measure_endpoint(client, endpoint, data, repeat):
+    """Retourne le nombre maximal de requêtes SQL et les latences triées (ms)"""
+    # Préparation (création des objets à supprimer, etc.) hors mesure
+    prepared = [endpoint.prepare(data) for _ in range(repeat + 1)]
+    # Premier appel non mesuré (imports paresseux, résolution des URLs...)
+    endpoint.request(client, *prepared.pop())
+    queries, samples = 0, []
+    for args, payload in prepared:
+        cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            response = endpoint.request(client, args, payload)
+            elapsed = (time.perf_counter() - start) * 1000
+        if response.status_code >= 400:
+            raise AssertionError(f'{endpoint.key} : HTTP {response.status_code} {response.content[:200]!r}')
+        # Toutes les instructions comptent, y compris BEGIN et SAVEPOINT
+        queries = max(queries, len(captured))
+        samples.append(elapsed)
+    samples.sort()
+    return queries, samples
+
+
+def run_suite(sizes=DEFAULT_SIZES, repeat=10, endpoints=None):
+    """Exécute tous les endpoints à chaque taille et retourne le rapport"""
+    client = Client()
+    results = []
+    for size in sizes:
+        data = seed(size)
+        for endpoint in endpoints or ENDPOINTS:
+            queries, samples = measure_endpoint(client, endpoint, data, repeat)
+            p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+            results.append({
+                'endpoint': endpoint.key,
+                'size': size,
+                'queries': queries,
+                'max_queries': endpoint.max_queries,
+                'p50_ms': round(statistics.median(samples), 2),
+                'p95_ms': round(p95, 2),
+                'budget_p95_ms': endpoint.p95_ms,
+                'ok': queries <= endpoint.max_queries and p95 <= endpoint.p95_ms,
+            })
+    return {'sizes': list(sizes), 'repeat': repeat, 'results': results}
+
+
+def failures(report, latency=True):
+    """
+    Lignes hors budget. ``latency=False`` : budgets de requêtes seulement,
+    les seuls déterministes (tests unitaires, machines partagées).
+    """
+    if latency:
+        return [row for row in report['results'] if not row['ok']]
+    return [row for row in report['results'] if row['queries'] > row['max_queries']]
@@ -0,0 +1,289 @@
+"""
+Test de charge de l'API, dans le processus.
+
+Des clients concurrents envoient un mélange de requêtes (catalogue, fiche
+produit, ``create_order``, ``confirm_order``) directement aux applications
+``ecommerce.wsgi`` (un thread par client) et ``ecommerce.asgi`` (une tâche
+asyncio par client), sans serveur HTTP : on mesure Django et la base, pas
+le réseau. Les tirages sont pilotés par une graine pour que deux exécutions
+envoient la même suite de requêtes.
+
+Le rapport (JSON, clés triées) donne par endpoint le débit et les
+latences p50/p95/p99, à comparer entre deux commits.
+"""
+import asyncio
+import json
+import random
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+from decimal import Decimal
+from io import BytesIO
+
+from django.core.cache import cache
+
+from orders.models import Order, OrderItem
+from products.models import Product
+
+HOST = 'testserver'
+DEFAULT_MIX = {'catalog': 50, 'product_detail': 30, 'create_order': 15, 'confirm_order': 5}
+CUSTOMER = {'customer_name': 'Client Charge', 'customer_email': 'charge@example.com', 'customer_address': 'Dakar'}
+
+
+def parse_mix(value):
+    """``catalog=50,create_order=10`` -> poids par scénario"""
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in DEFAULT_MIX:
+            raise ValueError(f'Scénario inconnu : {name.strip()}')
+        mix[name.strip()] = int(weight)
+    return mix
+
+
+def seed(products, orders, batch_size=5000):
+    """Remplit la base ; retourne les ids des produits et des commandes en attente"""
+    OrderItem.objects.all().delete()
+    Order.objects.all().delete()
+    Product.objects.all().delete()
+    for start in range(0, products, batch_size):
+        Product.objects.bulk_create(
+            Product(sku=f'LT{i}', name=f'Produit {i}', description='Produit de test de charge',
+                    price=Decimal('10.00') + i % 90, stock=10 ** 7)
+            for i in range(start, min(products, start + batch_size))
+        )
+    product_ids = list(Product.objects.values_list('id', flat=True))
+    for start in range(0, orders, batch_size):
+        created = Order.objects.bulk_create(
+            Order(total_amount=Decimal('30.00'), **CUSTOMER) for _ in range(start, min(orders, start + batch_size))
+        )
+        OrderItem.objects.bulk_create(
+            OrderItem(order=order, product_id=product_ids[(order.id * 7 + j) % len(product_ids)],
+                      quantity=1, price=Decimal('10.00'))
+            for order in created for j in range(3)
+        )
+    cache.clear()
+    return product_ids, list(Order.objects.values_list('id', flat=True))
+
+
+class Traffic:
+    """Tire les requêtes des clients ; état partagé entre clients (commandes à confirmer)"""
+
+    def __init__(self, product_ids, pending_order_ids, mix=None, seed=0):
+        self.product_ids = product_ids
+        self.pending = deque(pending_order_ids)
+        self.mix = mix or DEFAULT_MIX
+        self.seed = seed
+
+    def client(self, index):
+        """Générateur de requêtes ``(scénario, méthode, chemin, query, corps)`` d'un client"""
+        rng = random.Random(f'{self.seed}-{index}')
+        names = list(self.mix)
+        weights = [self.mix[name] for name in names]
+        while True:
+            name = rng.choices(names, weights)[0]
+            yield (name, *getattr(self, name)(rng))
+
+    def catalog(self, rng):
+        return 'GET', '/api/products/', f'page_size={rng.choice((10, 20, 50))}', None
+
+    def product_detail(self, rng):
+        return 'GET', f'/api/products/{rng.choice(self.product_ids)}/', '', None
+
+    def create_order(self, rng):
+        lines = [{'product_id': product_id, 'quantity': rng.randint(1, 3)}
+                 for product_id in rng.sample(self.product_ids, min(3, len(self.product_ids)))]
+        return 'POST', '/api/orders/create_order/', '', {**CUSTOMER, 'items_data': lines}
+
+    def confirm_order(self, rng):
+        try:
+            order_id = self.pending.popleft()
+        except IndexError:
+            return self.create_order(rng)
+        return 'POST', f'/api/orders/{order_id}/confirm_order/', '', None
+
+    def record(self, name, status, body):
+        """Les commandes créées deviennent confirmables"""
+        if name == 'create_order' and status == 201:
+            self.pending.append(json.loads(body)['order_id'])
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.lock = threading.Lock()
+
+    def add(self, name, status, elapsed):
+        with self.lock:
+            self.latencies[name].append(elapsed)
+            self.statuses[name][str(status)] += 1
+
+
+def percentile(samples, fraction):
+    """Rang le plus proche, sur une liste triée"""
+    return samples[min(len(samples) - 1, max(0, round(fraction * len(samples)) - 1))]
+
+
+def summarize(recorder, duration):
+    endpoints = {}
+    everything = []
+    for name, samples in recorder.latencies.items():
+        samples.sort()
+        everything.extend(samples)
+        statuses = dict(recorder.statuses[name])
+        endpoints[name] = {
+            'requests': len(samples),
+            'errors': sum(count for status, count in statuses.items() if int(status) >= 400),
+            'statuses': statuses,
+            'rps': round(len(samples) / duration, 1),
+            'p50_ms': round(percentile(samples, 0.50) * 1000, 2),
+            'p95_ms': round(percentile(samples, 0.95) * 1000, 2),
+            'p99_ms': round(percentile(samples, 0.99) * 1000, 2),
+        }
+    everything.sort()
+    total = {
+        'requests': len(everything),
+        'errors': sum(row['errors'] for row in endpoints.values()),
+        'rps': round(len(everything) / duration, 1),
+        'p50_ms': round(percentile(everything, 0.50) * 1000, 2) if everything else None,
+        'p95_ms': round(percentile(everything, 0.95) * 1000, 2) if everything else None,
+        'p99_ms': round(percentile(everything, 0.99) * 1000, 2) if everything else None,
+    }
+    return {'duration_s': round(duration, 2), 'total': total, 'endpoints': endpoints}
+
+
+def encode(body):
+    return json.dumps(body).encode() if body is not None else b''
+
+
+# WSGI ------------------------------------------------------------------
+
+def wsgi_call(application, method, path, query, body):
+    data = encode(body)
+    environ = {
+        'REQUEST_METHOD': method, 'PATH_INFO': path, 'QUERY_STRING': query, 'SCRIPT_NAME': '',
+        'SERVER_NAME': HOST, 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1', 'HTTP_HOST': HOST,
+        'REMOTE_ADDR': '127.0.0.1', 'CONTENT_TYPE': 'application/json', 'CONTENT_LENGTH': str(len(data)),
+        'wsgi.version': (1, 0), 'wsgi.url_scheme': 'http', 'wsgi.input': BytesIO(data),
+        'wsgi.errors': sys.stderr, 'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+    }
+    status = []
+    result = application(environ, lambda line, headers, exc_info=None: status.append(int(line[:3])))
+    try:
+        content = b''.join(result)
+    finally:
+        # Déclenche request_finished (fermeture des connexions), comme un serveur WSGI
+        if hasattr(result, 'close'):
+            result.close()
+    return status[0], content
+
+
+def run_wsgi(traffic, concurrency, duration=None, requests=None):
+    from ecommerce.wsgi import application
+
+    recorder = Recorder()
+
+    def client(index):
+        stream = traffic.client(index)
+        deadline = time.perf_counter() + duration if duration else None
+        sent = 0
+        while (requests is None or sent < requests) and (deadline is None or time.perf_counter() < deadline):
+            name, method, path, query, body = next(stream)
+            start = time.perf_counter()
+            status, content = wsgi_call(application, method, path, query, body)
+            recorder.add(name, status, time.perf_counter() - start)
+            traffic.record(name, status, content)
+            sent += 1
+
+    threads = [threading.Thread(target=client, args=(index,)) for index in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(recorder, time.perf_counter() - start)
+
+
+# ASGI ------------------------------------------------------------------
+
+async def asgi_call(application, method, path, query, body):
+    data = encode(body)
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'scheme': 'http',
+        'method': method, 'path': path, 'raw_path': path.encode(), 'root_path': '',
+        'query_string': query.encode(), 'server': (HOST, 80), 'client': ('127.0.0.1', 0),
+        'headers': [(b'host', HOST.encode()), (b'content-type', b'application/json'),
+                    (b'content-length', str(len(data)).encode())],
+    }
+    done = asyncio.Event()
+    messages = deque([{'type': 'http.request', 'body': data, 'more_body': False}])
+    response = {'status': None, 'body': []}
+
+    async def receive():
+        if messages:
+            return messages.popleft()
+        # Le client reste connecté jusqu'à la fin de la réponse
+        await done.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+        elif message['type'] == 'http.response.body':
+            response['body'].append(message.get('body', b''))
+            if not message.get('more_body'):
+                done.set()
+
+    await application(scope, receive, send)
+    done.set()
+    return response['status'], b''.join(response['body'])
+
+
+def run_asgi(traffic, concurrency, duration=None, requests=None, application=None):
+    if application is None:
+        from ecommerce.asgi import application
+
+    recorder = Recorder()
+
+    async def client(index):
+        stream = traffic.client(index)
+        deadline = time.perf_counter() + duration if duration else None
+        sent = 0
+        while (requests is None or sent < requests) and (deadline is None or time.perf_counter() < deadline):
+            name, method, path, query, body = next(stream)
+            start = time.perf_counter()
+            status, content = await asgi_call(application, method, path, query, body)
+            recorder.add(name, status, time.perf_counter() - start)
+            traffic.record(name, status, content)
+            sent += 1
+
+    async def main():
+        await asyncio.gather(*(client(index) for index in range(concurrency)))
+
+    start = time.perf_counter()
+    asyncio.run(main())
+    return summarize(recorder, time.perf_counter() - start)
+
+
+RUNNERS = {'wsgi': run_wsgi, 'asgi': run_asgi}
+
+
+def run_load(servers=('wsgi', 'asgi'), products=1000, orders=1000, concurrency=8,
+             duration=None, requests=None, mix=None, random_seed=0):
+    """
+    Remplit la base puis exécute la charge sur chaque serveur. La base est
+    remise dans le même état avant chaque serveur pour des résultats comparables.
+    """
+    report = {
+        'config': {'products': products, 'orders': orders, 'concurrency': concurrency,
+                   'duration_s': duration, 'requests_per_client': requests,
+                   'mix': mix or DEFAULT_MIX, 'seed': random_seed},
+        'servers': {},
+    }
+    for server in servers:
+        product_ids, order_ids = seed(products, orders)
+        traffic = Traffic(product_ids, order_ids, mix, random_seed)
+        report['servers'][server] = RUNNERS[server](traffic, concurrency, duration, requests)
+    return report
@@ -0,0 +1,53 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from benchmarks.loadtest import DEFAULT_MIX, RUNNERS, parse_mix, run_load
+from benchmarks.utils import temporary_database
+
+
+class Command(BaseCommand):
+    help = ("Test de charge reproductible de l'API (WSGI et ASGI) sur une base jetable ; "
+            "rapport JSON par endpoint (req/s, p50/p95/p99)")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--servers', nargs='+', choices=sorted(RUNNERS), default=['wsgi', 'asgi'])
+        parser.add_argument('--products', type=int, default=1000, help='Produits créés avant la charge')
+        parser.add_argument('--orders', type=int, default=1000, help='Commandes en attente créées avant la charge')
+        parser.add_argument('--concurrency', type=int, default=8, help='Clients simultanés')
+        parser.add_argument('--duration', type=float, default=10.0, help='Durée de la charge par serveur (s)')
+        parser.add_argument('--requests', type=int,
+                            help='Nombre de requêtes par client (remplace --duration)')
+        parser.add_argument('--mix', default=','.join(f'{name}={weight}' for name, weight in DEFAULT_MIX.items()),
+                            help='Poids des scénarios (par défaut : %(default)s)')
+        parser.add_argument('--seed', type=int, default=0, help='Graine des tirages')
+        parser.add_argument('--output', help='Fichier JSON de sortie (stdout par défaut)')
+
+    def handle(self, *args, **options):
+        try:
+            mix = parse_mix(options['mix'])
+        except ValueError as e:
+            raise CommandError(e)
+        if options['products'] < 1 or options['concurrency'] < 1:
+            raise CommandError('--products et --concurrency doivent être positifs')
+
+        # Sans DEBUG : pas de journal des requêtes SQL ni de pages d'erreur détaillées
+        with temporary_database(on_disk=True), override_settings(DEBUG=False):
+            report = run_load(
+                servers=options['servers'], products=options['products'], orders=options['orders'],
+                concurrency=options['concurrency'],
+                duration=None if options['requests'] else options['duration'],
+                requests=options['requests'], mix=mix, random_seed=options['seed'],
+            )
+
+        output = json.dumps(report, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+            for server, result in report['servers'].items():
+                total = result['total']
+                self.stderr.write(f"{server} : {total['rps']} req/s, p95 {total['p95_ms']} ms, "
+                                  f"{total['errors']} erreur(s)")
+        else:
+            self.stdout.write(output)
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+"""
+Coût par requête de l'instrumentation Prometheus.
+
+Mesure la latence d'endpoints peu coûteux avec et sans ``MetricsMiddleware``,
+puis le coût du middleware seul autour d'une vue vide.
+
+Usage :
+    python benchmarks/metrics_overhead.py [--repeat 2000]
+"""
+import argparse
+import time
+from decimal import Decimal
+
+from utils import measure, print_table, setup_django, temporary_database
+
+setup_django()
+
+from django.conf import settings  # noqa: E402
+from django.http import HttpResponse  # noqa: E402
+from django.test import Client, RequestFactory, override_settings  # noqa: E402
+from django.urls import resolve  # noqa: E402
+
+from ecommerce.middleware import MetricsMiddleware  # noqa: E402
+from products.models import Product  # noqa: E402
+
+MIDDLEWARE = 'ecommerce.middleware.MetricsMiddleware'
+
+
+def middleware_alone(repeat):
+    """Microsecondes ajoutées par le middleware autour d'une vue qui ne fait rien"""
+    request = RequestFactory().get('/api/products/1/')
+    request.resolver_match = resolve('/api/products/1/')
+    response = HttpResponse()
+    bare = lambda request: response  # noqa: E731
+    wrapped = MetricsMiddleware(bare)
+    timings = {}
+    for name, func in (('sans', bare), ('avec', wrapped)):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func(request)
+        timings[name] = (time.perf_counter() - start) / repeat * 1e6
+    return timings['avec'] - timings['sans']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeat', type=int, default=2000)
+    args = parser.parse_args()
+
+    with temporary_database():
+        product = Product.objects.create(name='Miel', description='Pur', price=Decimal('10.00'), stock=1)
+        without = [name for name in settings.MIDDLEWARE if name != MIDDLEWARE]
+        rows = []
+        for url in ('/health/', f'/api/products/{product.id}/'):
+            for mode, middleware in (('sans', without), ('avec', settings.MIDDLEWARE)):
+                with override_settings(MIDDLEWARE=middleware):
+                    client = Client()
+                    stats = measure(lambda: client.get(url), repeat=args.repeat, warmup=20)
+                rows.append({'url': url, 'métriques': mode, **stats})
+
+        print_table('Latence avec et sans MetricsMiddleware', rows,
+                    ['url', 'métriques', 'median_ms', 'p95_ms', 'max_ms'])
+        print(f'\nCoût du middleware seul : {middleware_alone(args.repeat * 10):.1f} µs par requête')
+
+
+if __name__ == '__main__':
+    main()
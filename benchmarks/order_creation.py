@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+"""
+Benchmark de POST /api/orders/create_order/.
+
+Mesure la latence et le nombre de requêtes SQL pour des commandes de 1, 10
+et 100 lignes : requête HTTP complète, sérialiseur seul, et ancienne
+création ligne par ligne (un ``OrderItem.objects.create`` par ligne, hors
+transaction) à comparer au sérialiseur.
+
+Usage :
+    python benchmarks/order_creation.py [--repeat 20]
+"""
+import argparse
+
+from utils import measure, print_table, setup_django, temporary_database
+
+setup_django()
+
+from decimal import Decimal  # noqa: E402
+
+from django.db import connection  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+
+from orders.models import Order, OrderItem  # noqa: E402
+from orders.serializers import CreateOrderSerializer  # noqa: E402
+from products.models import Product  # noqa: E402
+
+CUSTOMER = {
+    'customer_name': 'Client Benchmark',
+    'customer_email': 'bench@example.com',
+    'customer_address': 'Dakar',
+}
+
+
+def legacy_create(lines):
+    """Reproduit l'ancienne implémentation de CreateOrderSerializer.create"""
+    order = Order.objects.create(total_amount=Decimal('0'), **CUSTOMER)
+    for line in lines:
+        OrderItem.objects.create(order=order, product_id=line['product_id'],
+                                 quantity=line['quantity'], price=line['price'])
+
+
+def count_queries(func):
+    with CaptureQueriesContext(connection) as queries:
+        func()
+    return len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with temporary_database():
+        products = Product.objects.bulk_create(
+            Product(name=f'Produit {i}', description='Benchmark', price=Decimal('10.00'), stock=10 ** 9)
+            for i in range(100)
+        )
+        client = Client()
+        rows = []
+        for size in (1, 10, 100):
+            lines = [{'product_id': p.id, 'quantity': 1, 'price': '10.00'} for p in products[:size]]
+            payload = {**CUSTOMER, 'items_data': lines}
+
+            def post():
+                response = client.post('/api/orders/create_order/', payload, content_type='application/json')
+                assert response.status_code == 201, response.content
+
+            def serializer_create():
+                serializer = CreateOrderSerializer(data=payload)
+                serializer.is_valid(raise_exception=True)
+                serializer.save()
+
+            modes = (('API create_order', post), ('sérialiseur', serializer_create),
+                     ('ligne par ligne', lambda: legacy_create(lines)))
+            for mode, func in modes:
+                rows.append({'mode': mode, 'lignes': size, 'requêtes': count_queries(func),
+                             **measure(func, repeat=args.repeat)})
+
+        print_table('Création de commande', rows,
+                    ['mode', 'lignes', 'requêtes', 'median_ms', 'p95_ms', 'max_ms'])
+
+
+if __name__ == '__main__':
+    main()
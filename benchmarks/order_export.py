@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+"""
+Benchmark mémoire de l'export des commandes.
+
+Compare le pic de mémoire (RSS) de ``GET /api/orders/export/`` avec la
+sérialisation JSON de toutes les commandes en un seul document, comme le
+faisait ``GET /api/orders/`` avant la pagination. Chaque mesure est faite
+dans un processus fils (fork) pour partir du même point : le pic de
+l'export doit rester plat quand le nombre de commandes augmente.
+
+Linux uniquement (/proc). Usage :
+    python benchmarks/order_export.py [--sizes 1000 20000] [--items 3]
+"""
+import argparse
+import json
+import os
+import resource
+import time
+
+from utils import print_table, setup_django, temporary_database
+
+setup_django()
+
+from decimal import Decimal  # noqa: E402
+
+from django.db import connection  # noqa: E402
+from django.test import Client  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from orders.models import Order, OrderItem  # noqa: E402
+from orders.serializers import OrderSerializer  # noqa: E402
+from products.models import Product  # noqa: E402
+
+
+def seed(total, items, batch_size=5000):
+    OrderItem.objects.all().delete()
+    Order.objects.all().delete()
+    products = Product.objects.all()[:items] or Product.objects.bulk_create(
+        Product(name=f'Produit {i}', description='Benchmark ' * 20, price=Decimal('10.00'), stock=10)
+        for i in range(items)
+    )
+    for start in range(0, total, batch_size):
+        orders = Order.objects.bulk_create(
+            Order(customer_name=f'Client {i}', customer_email=f'client{i}@example.com',
+                  customer_address='Dakar', total_amount=Decimal('10.00') * items)
+            for i in range(start, min(total, start + batch_size))
+        )
+        OrderItem.objects.bulk_create(
+            OrderItem(order=order, product=product, quantity=1, price=product.price, product_name=product.name)
+            for order in orders for product in products
+        )
+
+
+def current_rss():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * resource.getpagesize()
+
+
+def peak_rss_in_child(func):
+    """Exécute ``func`` dans un fils et retourne (pic RSS au-delà du départ en Mo, durée en s, octets)"""
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_end)
+        if connection.vendor != 'sqlite':
+            # Ne pas réutiliser (ni fermer) la connexion réseau du parent
+            connection.connection = None
+        start_rss = current_rss()
+        start = time.perf_counter()
+        size = func()
+        elapsed = time.perf_counter() - start
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        os.write(write_end, json.dumps([(peak - start_rss) / 2 ** 20, elapsed, size]).encode())
+        os._exit(0)
+    os.close(write_end)
+    with os.fdopen(read_end) as f:
+        result = json.loads(f.read())
+    os.waitpid(pid, 0)
+    return result
+
+
+def full_list():
+    orders = Order.objects.prefetch_related('items__product')
+    return len(JSONRenderer().render(OrderSerializer(orders, many=True).data))
+
+
+def streamed_export():
+    response = Client().get('/api/orders/export/')
+    return sum(len(chunk) for chunk in response.streaming_content)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 20000])
+    parser.add_argument('--items', type=int, default=3)
+    args = parser.parse_args()
+
+    with temporary_database():
+        rows = []
+        for size in args.sizes:
+            seed(size, args.items)
+            for mode, func in (('liste JSON complète', full_list), ('export CSV en flux', streamed_export)):
+                peak, elapsed, length = peak_rss_in_child(func)
+                rows.append({'mode': mode, 'commandes': size, 'pic_rss_mo': round(peak, 1),
+                             'duree_s': round(elapsed, 2), 'taille_mo': round(length / 2 ** 20, 1)})
+
+        print_table('Pic de mémoire par mode d\'export', rows,
+                    ['mode', 'commandes', 'pic_rss_mo', 'duree_s', 'taille_mo'])
+
+
+if __name__ == '__main__':
+    main()
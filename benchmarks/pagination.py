@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+"""
+Benchmark de la pagination de /api/products/.
+
+Compare la latence de la page 1 et d'une page profonde (10 000 par défaut)
+entre la pagination par curseur (keyset) et la pagination ``?page=N``.
+Avec le curseur la latence doit rester plate ; avec l'offset elle croît
+avec la profondeur de la page.
+
+Usage :
+    python benchmarks/pagination.py [--pages 10000] [--page-size 20]
+"""
+import argparse
+
+from utils import measure, print_table, setup_django, temporary_database
+
+setup_django()
+
+from decimal import Decimal  # noqa: E402
+
+from django.test import Client  # noqa: E402
+
+from ecommerce.pagination import KeysetPagination  # noqa: E402
+from products.models import Product  # noqa: E402
+
+
+def seed(total, batch_size=5000):
+    for start in range(0, total, batch_size):
+        Product.objects.bulk_create(
+            Product(name=f'Produit {i}', description='Benchmark', price=Decimal('10.00'), stock=10)
+            for i in range(start, min(total, start + batch_size))
+        )
+
+
+def cursor_for_page(page, page_size):
+    """Curseur pointant juste avant la page ``page`` (calculé hors mesure)"""
+    if page == 1:
+        return None
+    last = (Product.objects.order_by('-created_at', '-id')
+            .values('created_at', 'id')[(page - 1) * page_size - 1])
+    return KeysetPagination().encode_cursor(last['created_at'], last['id'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--pages', type=int, default=10000)
+    parser.add_argument('--page-size', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with temporary_database():
+        seed(args.pages * args.page_size)
+        client = Client()
+        rows = []
+        for page in (1, args.pages):
+            cursor = cursor_for_page(page, args.page_size)
+            keyset_url = f'/api/products/?page_size={args.page_size}'
+            if cursor:
+                keyset_url += f'&cursor={cursor}'
+            offset_url = f'/api/products/?page={page}&page_size={args.page_size}'
+            for mode, url in (('curseur', keyset_url), ('offset', offset_url)):
+                assert client.get(url).status_code == 200, url
+                stats = measure(lambda: client.get(url), repeat=args.repeat)
+                rows.append({'mode': mode, 'page': page, **stats})
+
+        print_table(f'/api/products/ ({args.pages * args.page_size} produits)', rows,
+                    ['mode', 'page', 'median_ms', 'p95_ms', 'max_ms'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+"""
+Vérifie les budgets de requêtes SQL et de latence p95 de chaque endpoint.
+
+Écrit un rapport JSON (trié, stable) à comparer entre deux commits, et
+sort en erreur si un endpoint dépasse son budget.
+
+Usage :
+    python benchmarks/perf_budgets.py [--sizes 10 100 1000] [--report perf.json]
+"""
+import argparse
+import json
+import sys
+
+from utils import print_table, setup_django, temporary_database
+
+setup_django()
+
+from benchmarks.harness import DEFAULT_SIZES, failures, run_suite  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES))
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--report', help='Fichier JSON de sortie (stdout par défaut)')
+    args = parser.parse_args()
+
+    with temporary_database():
+        report = run_suite(args.sizes, args.repeat)
+
+    output = json.dumps(report, indent=2, sort_keys=True, ensure_ascii=False)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+        print_table('Budgets par endpoint', report['results'],
+                    ['endpoint', 'size', 'queries', 'max_queries', 'p95_ms', 'budget_p95_ms', 'ok'])
+    else:
+        print(output)
+
+    over = failures(report)
+    for row in over:
+        print(f"Budget dépassé : {row['endpoint']} (taille {row['size']}) : "
+              f"{row['queries']}/{row['max_queries']} requêtes, p95 {row['p95_ms']}/{row['budget_p95_ms']} ms",
+              file=sys.stderr)
+    sys.exit(1 if over else 0)
+
+
+if __name__ == '__main__':
+    main()
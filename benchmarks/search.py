@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+"""
+Benchmark de la recherche produits.
+
+Compare l'index plein texte (FTS5 sur SQLite, tsvector + GIN sur
+PostgreSQL) à un filtre ``icontains`` sur le nom et la description, sur
+un catalogue de 100 000 produits par défaut.
+
+Usage :
+    python benchmarks/search.py [--products 100000]
+"""
+import argparse
+import random
+
+from utils import measure, print_table, setup_django, temporary_database
+
+setup_django()
+
+from decimal import Decimal  # noqa: E402
+
+from django.db.models import Q  # noqa: E402
+
+from products.models import Product  # noqa: E402
+from products.search import search_products  # noqa: E402
+
+WORDS = (
+    'tomate pain fromage chèvre miel mangue bissap arachide mil riz poisson huile karité savon '
+    'panier tissu wax épice piment oignon gingembre café thé jus confiture biscuit farine sucre '
+    'local artisanal bio frais séché fumé grillé doux épicé parfumé traditionnel naturel'
+).split()
+QUERIES = ['miel', 'fromage chèvre', 'karité artisanal', 'introuvable']
+SYLLABLES = 'ba be bi bo bu da de di do du ka ke ki ko ku la le li lo lu ma me mi mo mu na ne ni no nu'.split()
+
+
+def vocabulary(rng, size=5000):
+    """Vocabulaire réaliste : quelques mots connus noyés parmi des mots rares"""
+    words = set(WORDS)
+    while len(words) < size:
+        words.add(''.join(rng.choices(SYLLABLES, k=rng.randint(2, 4))))
+    return sorted(words)
+
+
+def seed(total, batch_size=5000):
+    rng = random.Random(42)
+    words = vocabulary(rng)
+    for start in range(0, total, batch_size):
+        Product.objects.bulk_create(
+            Product(
+                name=' '.join(rng.choices(words, k=3)).capitalize(),
+                description=' '.join(rng.choices(words, k=25)),
+                price=Decimal('10.00'), stock=10,
+            )
+            for _ in range(start, min(total, start + batch_size))
+        )
+
+
+def icontains(text, limit=20):
+    condition = Q()
+    for word in text.split():
+        condition &= Q(name__icontains=word) | Q(description__icontains=word)
+    return list(Product.objects.filter(condition).order_by('-created_at', '-id')[:limit])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    with temporary_database():
+        seed(args.products)
+        rows = []
+        for query in QUERIES:
+            for mode, func in (('index', lambda: search_products(query)), ('icontains', lambda: icontains(query))):
+                rows.append({'requête': query, 'mode': mode, **measure(func, repeat=args.repeat)})
+        print_table(f'Recherche ({args.products} produits, 20 résultats)', rows,
+                    ['requête', 'mode', 'median_ms', 'p95_ms', 'max_ms'])
+
+
+if __name__ == '__main__':
+    main()
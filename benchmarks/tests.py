@@ -0,0 +1,47 @@
+from django.test import TestCase, TransactionTestCase
+
+from .harness import ENDPOINTS, failures, routed_endpoints, run_suite
+from .loadtest import parse_mix, run_load
+
+
+class PerformanceBudgetTests(TestCase):
+    """
+    Budgets de requêtes SQL de chaque endpoint (voir harness.py). Les
+    latences dépendent de la machine : elles sont vérifiées par
+    ``benchmarks/perf_budgets.py``, pas ici.
+    """
+
+    def test_every_route_has_a_budget(self):
+        declared = {(endpoint.name, endpoint.method) for endpoint in ENDPOINTS}
+        self.assertEqual(routed_endpoints() - declared, set())
+
+    def test_endpoints_stay_within_query_budget(self):
+        report = run_suite(sizes=(5, 50), repeat=3)
+        over = failures(report, latency=False)
+        self.assertEqual(over, [], '\n'.join(
+            f"{row['endpoint']} (taille {row['size']}) : {row['queries']}/{row['max_queries']} requêtes"
+            for row in over))
+        # Même nombre de requêtes quelle que soit la taille des données (pas de N+1)
+        queries = {}
+        for row in report['results']:
+            queries.setdefault(row['endpoint'], set()).add(row['queries'])
+        self.assertEqual({endpoint: counts for endpoint, counts in queries.items() if len(counts) > 1}, {})
+
+
+class LoadTestTests(TransactionTestCase):
+    """Exécution courte de la charge, pour vérifier le pilotage WSGI et ASGI"""
+
+    def test_both_servers_report_every_scenario(self):
+        mix = parse_mix('catalog=1,product_detail=1,create_order=1,confirm_order=1')
+        # Un seul client : la base SQLite en mémoire des tests ne tolère pas les écritures concurrentes
+        report = run_load(products=5, orders=5, concurrency=1, requests=24, mix=mix, random_seed=1)
+        for server in ('wsgi', 'asgi'):
+            result = report['servers'][server]
+            self.assertEqual(result['total']['requests'], 24)
+            self.assertEqual(result['total']['errors'], 0, result['endpoints'])
+            self.assertEqual(set(result['endpoints']), set(mix))
+            self.assertLessEqual(result['total']['p50_ms'], result['total']['p99_ms'])
+
+    def test_unknown_scenario_is_rejected(self):
+        with self.assertRaises(ValueError):
+            parse_mix('catalog=1,checkout=2')
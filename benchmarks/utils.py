@@ -0,0 +1,74 @@
+"""
+Outils communs aux scripts de benchmark.
+
+Chaque script s'exécute sur une base de test jetable (créée puis détruite
+comme pendant ``manage.py test``) pour ne jamais toucher à la base locale.
+"""
+import os
+import statistics
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+# Permet ``python benchmarks/xxx.py`` depuis la racine du projet
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def setup_django():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ecommerce.settings')
+    import django
+    django.setup()
+
+
+@contextmanager
+def temporary_database(on_disk=False):
+    """
+    Crée une base de test, la migre, et la détruit à la sortie.
+
+    ``on_disk`` : avec SQLite, base dans un fichier plutôt qu'en mémoire,
+    pour que des threads concurrents attendent les verrous au lieu d'échouer.
+    """
+    import tempfile
+
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    if on_disk and connection.vendor == 'sqlite':
+        directory = tempfile.mkdtemp()
+        connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(directory, 'bench.sqlite3')
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def measure(func, repeat=20, warmup=2):
+    """Exécute ``func`` et retourne les statistiques de latence en millisecondes"""
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        'median_ms': round(statistics.median(samples), 3),
+        'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+        'max_ms': round(samples[-1], 3),
+    }
+
+
+def print_table(title, rows, columns):
+    """Affiche une liste de dictionnaires sous forme de tableau"""
+    print(f'\n{title}')
+    widths = [max(len(col), *(len(str(row[col])) for row in rows)) for col in columns]
+    print('  '.join(col.ljust(w) for col, w in zip(columns, widths)))
+    print('  '.join('-' * w for w in widths))
+    for row in rows:
+        print('  '.join(str(row[col]).ljust(w) for col, w in zip(columns, widths)))
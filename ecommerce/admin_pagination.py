@@ -0,0 +1,55 @@
+"""
+Pagination de l'admin pour les grandes tables.
+
+Le changelist de l'admin compte toutes les lignes à chaque page
+(``COUNT(*)`` exact, soit un parcours complet de la table).
+``EstimatedCountPaginator`` :
+- sans filtre ni recherche, reprend l'estimation des statistiques de la
+  base (``pg_class.reltuples`` sous PostgreSQL, ``sqlite_stat1`` après
+  ``ANALYZE`` sous SQLite) quand elle dépasse ``ADMIN_EXACT_COUNT_LIMIT`` ;
+- sinon compte au plus ``ADMIN_EXACT_COUNT_LIMIT`` lignes (``COUNT`` sur une
+  sous-requête avec ``LIMIT``) : au-delà, affiner les filtres.
+
+À utiliser avec ``show_full_result_count = False``, qui supprime le second
+``COUNT(*)`` sur la table entière.
+"""
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.utils.functional import cached_property
+
+
+def estimated_row_count(model, using='default'):
+    """Nombre de lignes de la table de ``model`` d'après les statistiques, ou ``None``"""
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples FROM pg_class WHERE oid = to_regclass(%s)',
+                           [connection.ops.quote_name(table)])
+        elif connection.vendor == 'sqlite':
+            try:
+                # Première valeur de ``stat`` : nombre de lignes de l'index (ou de la table)
+                cursor.execute('SELECT MAX(CAST(stat AS INTEGER)) FROM sqlite_stat1 WHERE tbl = %s', [table])
+            except DatabaseError:
+                # Pas encore d'ANALYZE sur cette base
+                return None
+        else:
+            return None
+        row = cursor.fetchone()
+    # reltuples vaut -1 tant que la table n'a jamais été analysée
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        limit = settings.ADMIN_EXACT_COUNT_LIMIT
+        if not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > limit:
+                return estimate
+        return queryset.order_by()[:limit].count()
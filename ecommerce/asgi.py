@@ -9,8 +9,23 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+from django.core.handlers.asgi import ASGIHandler
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ecommerce.settings')
 
-application = get_asgi_application()
+
+class CatalogASGIHandler(ASGIHandler):
+    """Handler ASGI qui sert les lectures du catalogue avec des vues async (voir asgi_urls.py)"""
+    urlconf = 'ecommerce.asgi_urls'
+
+    def create_request(self, scope, body_file):
+        request, error_response = super().create_request(scope, body_file)
+        if request is not None:
+            request.urlconf = self.urlconf
+        return request, error_response
+
+
+# Équivalent de get_asgi_application(), avec notre handler
+django.setup(set_prefix=False)
+application = CatalogASGIHandler()
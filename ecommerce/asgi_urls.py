@@ -0,0 +1,17 @@
+"""
+URLs servies par ``ecommerce.asgi`` : les lectures du catalogue passent
+par les vues async de ``products.async_views``, tout le reste par les
+URLs habituelles (``ecommerce.urls``). Le flux SSE ``/api/products/stream/``
+n'existe que sous ASGI.
+"""
+from django.urls import path
+
+from products import async_views
+from .urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = [
+    path('api/products/', async_views.product_list, name='product-list'),
+    path('api/products/available/', async_views.product_available, name='product-available'),
+    path('api/products/stream/', async_views.product_stream, name='product-stream'),
+    path('api/products/<int:pk>/', async_views.product_detail, name='product-detail'),
+] + sync_urlpatterns
@@ -0,0 +1,67 @@
+"""
+GET conditionnels (``If-None-Match``, ``If-Modified-Since``).
+
+Les validateurs d'une réponse sont calculés sans la sérialiser : date de
+dernière modification (``updated_at``) et nombre de lignes du queryset
+affiché, en une requête d'agrégat. Le nombre de lignes détecte les
+suppressions, que la date seule ne voit pas : ``Last-Modified`` ne change
+pas quand on supprime une ligne plus ancienne, l'ETag si. ``If-None-Match``
+est prioritaire sur ``If-Modified-Since``.
+
+L'ETag est fort : il dépend aussi de l'hôte, de l'URL complète (page,
+``fields``, ``expand``...) et de l'en-tête ``Accept``, qui fixent le contenu
+exact de la réponse.
+"""
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+def queryset_validators(queryset):
+    """``(dernière modification, nombre de lignes)`` de ``queryset``"""
+    values = queryset.order_by().aggregate(last_modified=Max('updated_at'), count=Count('pk'))
+    return values['last_modified'], values['count']
+
+
+async def aqueryset_validators(queryset):
+    values = await queryset.order_by().aaggregate(last_modified=Max('updated_at'), count=Count('pk'))
+    return values['last_modified'], values['count']
+
+
+def make_etag(request, *parts):
+    key = '|'.join(str(part) for part in (
+        request.get_host(), request.get_full_path(), request.META.get('HTTP_ACCEPT', ''), *parts,
+    ))
+    return f'"{hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]}"'
+
+
+def set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    return response
+
+
+def check_conditional(request, validators, *etag_parts):
+    """``(etag, last_modified, réponse 304 ou None)`` ; ``etag_parts`` : autres données dont dépend la réponse"""
+    last_modified, count = validators
+    etag = make_etag(request, last_modified.isoformat() if last_modified else '', count, *etag_parts)
+    not_modified = get_conditional_response(
+        request, etag=etag, last_modified=int(last_modified.timestamp()) if last_modified else None,
+    )
+    if not_modified is not None:
+        set_validators(not_modified, etag, last_modified)
+    return etag, last_modified, not_modified
+
+
+def conditional_response(request, validators, build, *etag_parts):
+    """304 si le client a déjà la réponse décrite par ``validators``, sinon ``build()`` avec ``ETag`` et ``Last-Modified``"""
+    etag, last_modified, not_modified = check_conditional(request, validators, *etag_parts)
+    if not_modified is not None:
+        return not_modified
+    response = build()
+    if response.status_code == 200:
+        set_validators(response, etag, last_modified)
+    return response
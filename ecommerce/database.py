@@ -0,0 +1,81 @@
+"""
+Configuration des bases de données depuis l'environnement.
+
+``DATABASE_URL`` décrit la base principale, ``DATABASE_REPLICA_URLS`` (liste
+séparée par des virgules) les réplicas en lecture :
+
+    postgresql://user:password@db:5432/ecommerce_db?sslmode=require
+    sqlite:///db.sqlite3            (chemin relatif)
+    sqlite:////var/lib/app/db.sqlite3 (chemin absolu)
+
+Les paramètres de la query string sont passés dans ``OPTIONS`` ; sous
+SQLite, ``transaction_mode`` vaut ``IMMEDIATE`` par défaut.
+"""
+import os
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+ENGINES = {
+    'postgres': 'django.db.backends.postgresql',
+    'postgresql': 'django.db.backends.postgresql',
+    'pgsql': 'django.db.backends.postgresql',
+    'sqlite': 'django.db.backends.sqlite3',
+}
+
+# Transactions SQLite qui prennent le verrou d'écriture dès BEGIN : une
+# lecture suivie d'une écriture (select_for_update sans effet sous SQLite)
+# attend son tour au lieu d'échouer sur « database is locked »
+SQLITE_TRANSACTION_MODE = 'IMMEDIATE'
+
+
+def parse_database_url(url):
+    parts = urlsplit(url)
+    if parts.scheme not in ENGINES:
+        raise ValueError(f'Moteur de base de données non géré : {parts.scheme!r}')
+    config = {'ENGINE': ENGINES[parts.scheme], 'OPTIONS': dict(parse_qsl(parts.query))}
+    if config['ENGINE'].endswith('sqlite3'):
+        # sqlite:///relatif.sqlite3, sqlite:////absolu.sqlite3
+        config['NAME'] = unquote(parts.path[1:]) or ':memory:'
+        config['OPTIONS'].setdefault('transaction_mode', SQLITE_TRANSACTION_MODE)
+        return config
+    config.update({
+        'NAME': unquote(parts.path.lstrip('/')),
+        'USER': unquote(parts.username or ''),
+        'PASSWORD': unquote(parts.password or ''),
+        'HOST': parts.hostname or '',
+        'PORT': str(parts.port or ''),
+    })
+    return config
+
+
+def database_config(url, environ=os.environ):
+    """
+    Configuration Django d'une base décrite par ``url``.
+
+    Connexions persistantes (``DB_CONN_MAX_AGE``, 60 s par défaut) vérifiées
+    avant réutilisation ; avec ``DB_POOL_MAX_SIZE`` sur PostgreSQL, pool de
+    connexions psycopg à la place (``DB_POOL_MIN_SIZE``, ``DB_POOL_TIMEOUT``).
+    """
+    config = parse_database_url(url)
+    config['CONN_MAX_AGE'] = int(environ.get('DB_CONN_MAX_AGE', 60))
+    config['CONN_HEALTH_CHECKS'] = True
+    pool_size = environ.get('DB_POOL_MAX_SIZE')
+    if pool_size and config['ENGINE'] == 'django.db.backends.postgresql':
+        config['OPTIONS']['pool'] = {
+            'min_size': int(environ.get('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(pool_size),
+            'timeout': float(environ.get('DB_POOL_TIMEOUT', 10)),
+        }
+        # Le pool gère lui-même la durée de vie des connexions
+        config['CONN_MAX_AGE'] = 0
+    return config
+
+
+def replica_configs(urls, environ=os.environ):
+    """Alias ``replica``, ``replica_2``... -> configuration, dans l'ordre de ``urls``"""
+    replicas = {}
+    for index, url in enumerate(part.strip() for part in urls.split(',') if part.strip()):
+        config = database_config(url, environ)
+        # Les tests utilisent la base principale : pas de base de test par réplica
+        config['TEST'] = {'MIRROR': 'default'}
+        replicas['replica' if index == 0 else f'replica_{index + 1}'] = config
+    return replicas
@@ -0,0 +1,133 @@
+"""
+Métriques Prometheus de l'application.
+
+Les étiquettes ne prennent que des valeurs bornées : nom de route (jamais
+le chemin brut), action DRF, méthode HTTP connue, classe de statut
+(``2xx``...), type d'email, statut de commande.
+
+Avec plusieurs processus (gunicorn), définir ``PROMETHEUS_MULTIPROC_DIR``
+(répertoire partagé et vidé au démarrage) : ``/metrics`` agrège alors les
+valeurs de tous les processus.
+"""
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+from prometheus_client import (CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram,
+                               generate_latest, multiprocess, REGISTRY)
+
+HTTP_METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+UNMATCHED = '<unmatched>'
+
+# Latences d'API : de 5 ms à 10 s
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', "Durée de traitement des requêtes HTTP",
+    ['view', 'action', 'method', 'status'], buckets=LATENCY_BUCKETS,
+)
+REQUEST_QUERIES = Histogram(
+    'http_request_db_queries', "Nombre de requêtes SQL par requête HTTP",
+    ['view', 'action'], buckets=QUERY_COUNT_BUCKETS,
+)
+REQUEST_QUERY_TIME = Histogram(
+    'http_request_db_duration_seconds', "Temps passé en base par requête HTTP",
+    ['view', 'action'], buckets=LATENCY_BUCKETS,
+)
+EMAIL_DURATION = Histogram(
+    'order_email_send_duration_seconds', "Durée d'envoi des emails de commande",
+    ['kind'], buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+EMAIL_FAILURES = Counter(
+    'order_email_failures_total', "Échecs d'envoi des emails de commande", ['kind'],
+)
+ORDERS_CREATED = Counter(
+    'orders_created_total', "Commandes créées, par statut initial", ['status'],
+)
+ORDER_TRANSITIONS = Counter(
+    'order_status_transitions_total', "Changements de statut des commandes", ['from_status', 'to_status'],
+)
+REQUESTS_SHED = Counter(
+    'http_requests_shed_total', "Écritures refusées par délestage", ['reason'],
+)
+
+
+class QueryStats:
+    """Nombre et durée des requêtes SQL d'une requête HTTP"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+
+# Statistiques de la requête HTTP en cours. Une ContextVar, et non la
+# connexion du thread : sous ASGI les requêtes SQL partent d'autres threads
+# (sync_to_async), qui reçoivent une copie de ce contexte.
+_request_queries = ContextVar('request_queries', default=None)
+
+
+def record_queries(execute, sql, params, many, context):
+    """``execute_wrapper`` installé sur chaque connexion"""
+    stats = _request_queries.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.duration += time.perf_counter() - start
+        stats.count += 1
+
+
+def install_query_recorder(connection, **kwargs):
+    if record_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_queries)
+
+
+def start_request_stats():
+    """Commence à compter les requêtes SQL du contexte courant ; retourne ``(stats, jeton)``"""
+    stats = QueryStats()
+    return stats, _request_queries.set(stats)
+
+
+def current_request_stats():
+    """Statistiques de la requête HTTP en cours, ou ``None`` hors ``MetricsMiddleware``"""
+    return _request_queries.get()
+
+
+def stop_request_stats(token):
+    _request_queries.reset(token)
+
+
+connection_created.connect(lambda sender, connection, **kwargs: install_query_recorder(connection),
+                           weak=False, dispatch_uid='metrics_query_recorder')
+
+
+@contextmanager
+def observe_email(kind):
+    """Chronomètre un envoi d'email ; une exception compte comme un échec"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        EMAIL_FAILURES.labels(kind).inc()
+        raise
+    finally:
+        EMAIL_DURATION.labels(kind).observe(time.perf_counter() - start)
+
+
+def get_registry():
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def metrics_view(request):
+    """Exposition au format texte de Prometheus"""
+    return HttpResponse(generate_latest(get_registry()), content_type=CONTENT_TYPE_LATEST)
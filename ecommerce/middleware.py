@@ -0,0 +1,150 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.http import JsonResponse
+
+from .metrics import (HTTP_METHODS, REQUEST_LATENCY, REQUEST_QUERIES, REQUEST_QUERY_TIME, REQUESTS_SHED,
+                      UNMATCHED, current_request_stats, install_query_recorder, start_request_stats,
+                      stop_request_stats)
+from .routers import pin_to_primary, reset_pinning
+from .shedding import monitor
+
+SAFE_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+
+
+class HybridMiddleware:
+    """
+    Base des middlewares utilisables sous WSGI et sous ASGI sans passage
+    par un thread : ``around(request)`` est un générateur qui encadre l'appel
+    de la vue et reçoit la réponse. S'il produit d'abord une réponse, elle
+    est renvoyée sans appeler la vue.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        around = self.around(request)
+        early = next(around)
+        if early is not None:
+            around.close()
+            return early
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            around.close()
+            raise
+        return self.finish(around, response)
+
+    async def __acall__(self, request):
+        around = self.around(request)
+        early = next(around)
+        if early is not None:
+            around.close()
+            return early
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            around.close()
+            raise
+        return self.finish(around, response)
+
+    def finish(self, around, response):
+        try:
+            around.send(response)
+        except StopIteration:
+            pass
+        return response
+
+    def around(self, request):
+        raise NotImplementedError
+
+
+class MetricsMiddleware(HybridMiddleware):
+    """
+    Latence, nombre de requêtes SQL et temps en base de chaque requête HTTP,
+    par route et action DRF. À placer en tête de ``MIDDLEWARE``.
+
+    Pour une réponse en flux, seule la préparation est mesurée : les
+    requêtes faites pendant l'envoi du contenu ne sont pas comptées.
+    """
+
+    def around(self, request):
+        if not self.is_async:
+            # Connexions ouvertes avant le chargement des métriques
+            for connection in connections.all(initialized_only=True):
+                install_query_recorder(connection)
+        stats, token = start_request_stats()
+        start = time.perf_counter()
+        try:
+            response = yield
+        finally:
+            stop_request_stats(token)
+        elapsed = time.perf_counter() - start
+
+        view, action = self.get_labels(request)
+        method = request.method if request.method in HTTP_METHODS else 'other'
+        REQUEST_LATENCY.labels(view, action, method, f'{response.status_code // 100}xx').observe(elapsed)
+        REQUEST_QUERIES.labels(view, action).observe(stats.count)
+        REQUEST_QUERY_TIME.labels(view, action).observe(stats.duration)
+
+    def get_labels(self, request):
+        """``(route, action)`` : jamais le chemin brut, pour borner les séries"""
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return UNMATCHED, ''
+        # Les vues générées par un router DRF portent le tableau méthode -> action
+        actions = getattr(match.func, 'actions', None) or {}
+        return match.view_name, actions.get(request.method.lower(), '')
+
+
+class ReplicaPinningMiddleware(HybridMiddleware):
+    """
+    Délimite l'épinglage sur la base principale (voir ``ecommerce.routers``)
+    à une requête. Les méthodes non sûres sont épinglées d'emblée : leurs
+    lectures préparent une écriture et ne doivent pas voir un réplica en retard.
+    """
+
+    def around(self, request):
+        token = pin_to_primary(request.method not in SAFE_METHODS)
+        try:
+            yield
+        finally:
+            reset_pinning(token)
+
+
+class LoadSheddingMiddleware(HybridMiddleware):
+    """
+    Refuse les écritures de l'API quand le processus ou la base sature
+    (voir ``ecommerce.shedding``). À placer après ``MetricsMiddleware``.
+    """
+
+    def around(self, request):
+        stats = current_request_stats()
+        if request.method in SAFE_METHODS or not request.path_info.startswith(settings.SHED_PATH_PREFIX):
+            yield
+        else:
+            reason = monitor.overload()
+            if reason is not None:
+                REQUESTS_SHED.labels(reason).inc()
+                response = JsonResponse({'detail': 'Service surchargé, réessayez dans quelques instants.'},
+                                        status=503)
+                response['Retry-After'] = str(settings.SHED_RETRY_AFTER)
+                yield response
+                return
+            monitor.start_write()
+            try:
+                yield
+            finally:
+                monitor.end_write()
+        if stats is not None:
+            monitor.observe(stats.count, stats.duration)
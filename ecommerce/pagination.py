@@ -0,0 +1,181 @@
+"""
+Pagination de l'API.
+
+Par défaut les listes sont paginées par curseur (keyset) sur le couple
+(created_at, id), ce qui correspond à l'ordre ``-created_at`` des modèles :
+chaque page est une simple requête indexée, quelle que soit sa profondeur.
+La pagination par numéro de page reste disponible avec ``?page=N``.
+"""
+import base64
+import binascii
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class OffsetPagination(PageNumberPagination):
+    """Pagination classique ``?page=N``, conservée pour les clients existants"""
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class KeysetPagination(BasePagination):
+    """
+    Pagination par curseur opaque sur (created_at, id), ordre décroissant.
+
+    Le curseur encode la position du dernier (ou premier) élément de la page
+    et le sens de parcours ; il reste stable même si des lignes sont
+    ajoutées pendant le parcours.
+    """
+    page_size = api_settings.PAGE_SIZE or 20
+    max_page_size = 100
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    offset_query_param = 'page'
+    offset_pagination_class = OffsetPagination
+    invalid_cursor_message = 'Curseur invalide.'
+
+    def __init__(self):
+        self.offset_paginator = None
+        self.page = []
+        self.has_next = False
+        self.has_previous = False
+
+    # Sélection du mode -------------------------------------------------
+
+    def use_offset(self, request):
+        return self.offset_query_param in request.query_params
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_offset(request):
+            self.offset_paginator = self.offset_pagination_class()
+            return self.offset_paginator.paginate_queryset(queryset, request, view)
+        return self.paginate_rows(list(self.get_page_queryset(queryset, request)))
+
+    def get_paginated_response(self, data):
+        if self.offset_paginator is not None:
+            return self.offset_paginator.get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        if self.offset_paginator is not None:
+            return self.offset_paginator.get_paginated_response_schema(schema)
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    # Construction de la requête ----------------------------------------
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def get_page_queryset(self, queryset, request):
+        """
+        Retourne la requête (non évaluée) de la page demandée, limitée à
+        ``page_size + 1`` lignes pour savoir s'il existe une page suivante.
+        """
+        self.request = request
+        self.size = self.get_page_size(request)
+        self.cursor = self.decode_cursor(request)
+
+        if self.cursor is None:
+            queryset = queryset.order_by('-created_at', '-id')
+        else:
+            # La borne simple sur created_at permet un parcours d'index ;
+            # le OR ne départage que les lignes de même created_at.
+            created_at, pk, reverse = self.cursor
+            if reverse:
+                queryset = queryset.filter(
+                    Q(created_at__gt=created_at) | Q(id__gt=pk), created_at__gte=created_at,
+                ).order_by('created_at', 'id')
+            else:
+                queryset = queryset.filter(
+                    Q(created_at__lt=created_at) | Q(id__lt=pk), created_at__lte=created_at,
+                ).order_by('-created_at', '-id')
+        return queryset[:self.size + 1]
+
+    def paginate_rows(self, rows):
+        """Découpe les lignes lues par ``get_page_queryset`` en une page"""
+        has_more = len(rows) > self.size
+        rows = rows[:self.size]
+
+        if self.cursor is not None and self.cursor[2]:
+            rows.reverse()
+            self.has_previous = has_more
+            self.has_next = True
+        else:
+            self.has_next = has_more
+            self.has_previous = self.cursor is not None
+
+        self.page = rows
+        return rows
+
+    # Curseurs ----------------------------------------------------------
+
+    def encode_cursor(self, created_at, pk, reverse=False):
+        payload = json.dumps({'c': created_at.isoformat(), 'i': pk, 'r': int(reverse)},
+                             separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode('ascii')).decode('ascii').rstrip('=')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+            created_at = parse_datetime(payload['c'])
+            pk = int(payload['i'])
+            reverse = bool(payload.get('r', 0))
+        except (TypeError, ValueError, KeyError, UnicodeEncodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        if created_at is None:
+            raise NotFound(self.invalid_cursor_message)
+        return created_at, pk, reverse
+
+    def get_cursor_link(self, row, reverse):
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.offset_query_param)
+        cursor = self.encode_cursor(self.get_value(row, 'created_at'), self.get_value(row, 'id'), reverse)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_value(self, row, field):
+        if isinstance(row, dict):
+            return row[field]
+        return getattr(row, field)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.get_cursor_link(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            # Page vide après le curseur : revenir au début de la liste
+            url = self.request.build_absolute_uri()
+            return remove_query_param(url, self.cursor_query_param)
+        return self.get_cursor_link(self.page[0], reverse=True)
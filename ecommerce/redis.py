@@ -0,0 +1,37 @@
+"""Client Redis partagé par les fonctions qui n'utilisent pas le cache Django"""
+from functools import lru_cache
+
+from django.conf import settings
+
+# Un Redis lent ne doit pas ralentir les requêtes : on bascule vite sur le repli local
+SOCKET_TIMEOUT = 0.1
+
+
+@lru_cache(maxsize=None)
+def _client(url):
+    import redis
+
+    return redis.Redis.from_url(url, socket_timeout=SOCKET_TIMEOUT, socket_connect_timeout=SOCKET_TIMEOUT)
+
+
+def get_redis():
+    """Client pour ``REDIS_URL`` (pool de connexions par processus), ou ``None`` sans Redis"""
+    if not settings.REDIS_URL:
+        return None
+    return _client(settings.REDIS_URL)
+
+
+@lru_cache(maxsize=None)
+def _script(url, source):
+    return _client(url).register_script(source)
+
+
+def get_script(source):
+    """
+    Script Lua ``source``, enregistré une fois par processus : ses appels
+    passent par EVALSHA (EVAL seulement si le serveur ne le connaît pas
+    encore). ``None`` sans Redis.
+    """
+    if not settings.REDIS_URL:
+        return None
+    return _script(settings.REDIS_URL, source)
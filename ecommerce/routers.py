@@ -0,0 +1,65 @@
+"""
+Routage des lectures vers les réplicas.
+
+Les lectures des applications de ``DATABASE_REPLICA_APPS`` vont sur un
+réplica tiré au hasard parmi ``DATABASE_REPLICAS``, sauf :
+
+- dans une transaction sur la base principale (lectures cohérentes avec
+  les écritures en cours) ;
+- une fois la requête « épinglée » sur la base principale : dès la première
+  écriture, ou dès le début pour les méthodes HTTP non sûres
+  (voir ``ReplicaPinningMiddleware``). Une requête relit donc toujours ce
+  qu'elle vient d'écrire, malgré le retard de réplication.
+
+Toutes les écritures et les migrations vont sur la base principale.
+"""
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_pinned = ContextVar('database_pinned_to_primary', default=False)
+
+
+def pin_to_primary(pinned=True):
+    """Épingle (ou libère) le contexte courant sur la base principale ; retourne un jeton pour ``reset_pinning``"""
+    return _pinned.set(pinned)
+
+
+def reset_pinning(token):
+    _pinned.reset(token)
+
+
+def is_pinned():
+    return _pinned.get()
+
+
+class PrimaryReplicaRouter:
+    def replicas(self):
+        return getattr(settings, 'DATABASE_REPLICAS', [])
+
+    def db_for_read(self, model, **hints):
+        replicas = self.replicas()
+        if not replicas or model._meta.app_label not in settings.DATABASE_REPLICA_APPS:
+            return None
+        if _pinned.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        if not _pinned.get():
+            _pinned.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Réplicas et base principale contiennent les mêmes données
+        databases = {DEFAULT_DB_ALIAS, *self.replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in self.replicas():
+            return False
+        return None
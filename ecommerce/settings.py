@@ -11,8 +11,13 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 import os
+from decimal import Decimal
 from pathlib import Path
 
+from corsheaders.defaults import default_headers
+
+from .database import SQLITE_TRANSACTION_MODE, database_config, replica_configs
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -42,13 +47,20 @@ INSTALLED_APPS = [
     'users',
     'products',
     'orders',
+    'analytics',
+    'benchmarks',
     # Django REST Framework
     'rest_framework',
     'corsheaders',
 ]
 
 MIDDLEWARE = [
+    # En premier : la latence mesurée inclut tous les autres middlewares
+    'ecommerce.middleware.MetricsMiddleware',
+    'ecommerce.middleware.ReplicaPinningMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    # Après CORS : les réponses 503 restent lisibles par le frontend
+    'ecommerce.middleware.LoadSheddingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -66,6 +78,7 @@ if os.environ.get('CORS_ALLOW_ALL_ORIGINS', 'False').lower() == 'true':
     CORS_ALLOW_ALL_ORIGINS = True
 
 CORS_ALLOW_CREDENTIALS = True
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
 
 ROOT_URLCONF = 'ecommerce.urls'
 
@@ -90,12 +103,65 @@ WSGI_APPLICATION = 'ecommerce.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DATABASE_URL (PostgreSQL en déploiement) ; SQLite local par défaut.
+# Connexions persistantes ou pool, voir ecommerce/database.py.
+
+if os.environ.get('DATABASE_URL'):
+    DATABASES = {'default': database_config(os.environ['DATABASE_URL'])}
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            'OPTIONS': {'transaction_mode': SQLITE_TRANSACTION_MODE},
+        }
     }
-}
+
+# Réplicas en lecture (DATABASE_REPLICA_URLS, séparées par des virgules)
+DATABASES.update(replica_configs(os.environ.get('DATABASE_REPLICA_URLS', '')))
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+# Applications dont les lectures peuvent aller sur un réplica
+DATABASE_REPLICA_APPS = ['products', 'orders', 'analytics']
+DATABASE_ROUTERS = ['ecommerce.routers.PrimaryReplicaRouter']
+
+
+# Cache
+# Redis en déploiement (REDIS_URL), mémoire locale sinon (développement, tests)
+
+REDIS_URL = os.environ.get('REDIS_URL', '')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Durée de vie (secondes) des réponses du catalogue produits en cache
+PRODUCT_CACHE_TIMEOUT = int(os.environ.get('PRODUCT_CACHE_TIMEOUT', 300))
+# Retard maximal (secondes) du stock affiché par les listes après une commande ;
+# le détail d'un produit commandé est invalidé aussitôt
+PRODUCT_LIST_STOCK_LAG = int(os.environ.get('PRODUCT_LIST_STOCK_LAG', 10))
+
+# Durée de conservation (secondes) des réponses rejouées pour une même Idempotency-Key
+IDEMPOTENCY_KEY_TTL = int(os.environ.get('IDEMPOTENCY_KEY_TTL', 24 * 3600))
+
+# Flux SSE des stocks et prix (ASGI) : événements gardés pour les reprises
+# (Last-Event-ID) et intervalle des pings de maintien de connexion (secondes)
+PRODUCT_STREAM_HISTORY = int(os.environ.get('PRODUCT_STREAM_HISTORY', 1000))
+PRODUCT_STREAM_KEEPALIVE = int(os.environ.get('PRODUCT_STREAM_KEEPALIVE', 15))
+
+# Paniers (Redis) : expiration après CART_TTL secondes sans activité
+CART_TTL = int(os.environ.get('CART_TTL', 7 * 24 * 3600))
+CART_MAX_LINES = 100
+CART_MAX_QUANTITY = 1000
 
 
 # Password validation
@@ -139,6 +205,11 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Déclinaisons des images produit (miniature, carte, pleine) générées en
+# arrière-plan ; False pour les générer immédiatement
+PRODUCT_IMAGE_VARIANTS_ASYNC = os.environ.get('PRODUCT_IMAGE_VARIANTS_ASYNC', 'True').lower() == 'true'
+PRODUCT_IMAGE_VARIANT_WORKERS = 2
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -149,10 +220,29 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
-    # 'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
-    # 'PAGE_SIZE': 10
+    # Pagination par curseur sur (created_at, id) ; ?page=N reste disponible
+    'DEFAULT_PAGINATION_CLASS': 'ecommerce.pagination.KeysetPagination',
+    'PAGE_SIZE': 20,
+    'DEFAULT_THROTTLE_CLASSES': ['ecommerce.throttling.TokenBucketThrottle'],
+    # Proxies devant l'application (ingress) : l'IP client est lue dans X-Forwarded-For
+    'NUM_PROXIES': int(os.environ['NUM_PROXIES']) if os.environ.get('NUM_PROXIES') else None,
 }
 
+# Limites par action de viewset, partagées via Redis :
+# THROTTLE_RATES=order.create_order=30/min,product.write=60/min,cart.write=120/min
+# La validation d'un panier (cart.checkout) partage le seau order.create_order.
+# Sans valeur, aucune limite (développement, tests).
+THROTTLE_RATES = dict(
+    part.strip().split('=', 1) for part in os.environ.get('THROTTLE_RATES', '').split(',') if part.strip()
+)
+
+# Délestage des écritures de l'API (503 + Retry-After) quand le processus sature
+SHED_PATH_PREFIX = '/api/'
+SHED_MAX_INFLIGHT_WRITES = int(os.environ.get('SHED_MAX_INFLIGHT_WRITES', 32))
+# Temps moyen d'une requête SQL (secondes) au-delà duquel la base est jugée saturée
+SHED_DB_LATENCY = float(os.environ.get('SHED_DB_LATENCY', 0.25))
+SHED_RETRY_AFTER = int(os.environ.get('SHED_RETRY_AFTER', 5))
+
 # Configuration Email pour le développement
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 EMAIL_HOST = 'localhost'
@@ -161,6 +251,23 @@ EMAIL_USE_TLS = False
 EMAIL_HOST_USER = ''
 EMAIL_HOST_PASSWORD = ''
 
+# Boîte d'envoi des emails de commande (manage.py send_queued_emails)
+ORDER_EMAIL_MAX_ATTEMPTS = 5
+ORDER_EMAIL_RETRY_BASE_DELAY = 60  # secondes, doublé à chaque échec
+
+# Notifications admin : 'immediate' (un email par commande) ou 'digest'
+# (un résumé par fenêtre de ADMIN_DIGEST_WINDOW secondes ou dès
+# ADMIN_DIGEST_MAX_ORDERS commandes). Les commandes d'au moins
+# ADMIN_DIGEST_IMMEDIATE_AMOUNT FCFA sont toujours notifiées tout de suite.
+ADMIN_NOTIFICATION_MODE = os.environ.get('ADMIN_NOTIFICATION_MODE', 'immediate')
+ADMIN_DIGEST_WINDOW = int(os.environ.get('ADMIN_DIGEST_WINDOW', 300))
+ADMIN_DIGEST_MAX_ORDERS = int(os.environ.get('ADMIN_DIGEST_MAX_ORDERS', 200))
+ADMIN_DIGEST_IMMEDIATE_AMOUNT = Decimal(os.environ.get('ADMIN_DIGEST_IMMEDIATE_AMOUNT', '100000'))
+
+# Admin : au-delà de ce nombre de lignes, les changelists affichent une
+# estimation (statistiques de la base) au lieu d'un COUNT(*) exact
+ADMIN_EXACT_COUNT_LIMIT = int(os.environ.get('ADMIN_EXACT_COUNT_LIMIT', 100000))
+
 # Pour la production, utilisez :
 # EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 # EMAIL_HOST = 'smtp.gmail.com'  # ou votre serveur SMTP
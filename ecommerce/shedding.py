@@ -0,0 +1,69 @@
+"""
+Délestage des écritures quand le processus ou la base sature.
+
+Deux signaux, mesurés par processus :
+
+- écritures en cours (requêtes non sûres sous ``/api/``), au-delà de
+  ``SHED_MAX_INFLIGHT_WRITES`` ;
+- temps moyen d'une requête SQL, moyenne mobile sur toutes les requêtes
+  HTTP (lectures comprises), au-delà de ``SHED_DB_LATENCY``. La mesure
+  vient de ``MetricsMiddleware``, qui doit donc être actif.
+
+Au-delà d'un seuil, les nouvelles écritures reçoivent un 503 avec
+``Retry-After`` au lieu d'aggraver la file ; les lectures sont toujours
+servies.
+"""
+import threading
+import time
+
+from django.conf import settings
+
+# Poids d'une nouvelle mesure dans la moyenne mobile
+LATENCY_SMOOTHING = 0.1
+# Sans nouvelle mesure, la moyenne diminue de moitié toutes les HALF_LIFE secondes
+HALF_LIFE = 10.0
+
+
+class LoadMonitor:
+    def __init__(self):
+        self.inflight_writes = 0
+        self.latency = 0.0
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def db_latency(self, now=None):
+        """Temps moyen récent d'une requête SQL, en secondes"""
+        now = time.monotonic() if now is None else now
+        return self.latency * 0.5 ** ((now - self.updated) / HALF_LIFE)
+
+    def observe(self, queries, duration):
+        if not queries:
+            return
+        now = time.monotonic()
+        with self.lock:
+            self.latency = self.db_latency(now) * (1 - LATENCY_SMOOTHING) + duration / queries * LATENCY_SMOOTHING
+            self.updated = now
+
+    def overload(self):
+        """Raison du délestage (``'inflight'``, ``'db_latency'``) ou ``None``"""
+        if self.inflight_writes >= settings.SHED_MAX_INFLIGHT_WRITES:
+            return 'inflight'
+        if self.db_latency() >= settings.SHED_DB_LATENCY:
+            return 'db_latency'
+        return None
+
+    def start_write(self):
+        with self.lock:
+            self.inflight_writes += 1
+
+    def end_write(self):
+        with self.lock:
+            self.inflight_writes -= 1
+
+    def reset(self):
+        with self.lock:
+            self.inflight_writes = 0
+            self.latency = 0.0
+
+
+monitor = LoadMonitor()
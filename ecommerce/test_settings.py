@@ -0,0 +1,20 @@
+"""
+Réglages des tests : ceux de ``settings.py`` plus une seconde base qui joue
+le réplica, pour les tests du routage (``ReplicaRoutingTests``).
+
+``manage.py test`` les utilise par défaut ; avec un autre lanceur, les
+désigner explicitement (``DJANGO_SETTINGS_MODULE=ecommerce.test_settings``
+ou ``--settings=ecommerce.test_settings``).
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import DATABASE_REPLICAS, DATABASES
+
+# Base distincte, sans recopie de ``default`` : elle simule un retard de
+# réplication. Remplace un éventuel réplica configuré et sort de
+# DATABASE_REPLICAS : seuls les tests du routage l'y mettent.
+# SQLite : base en mémoire propre à l'alias ; ailleurs, nom distinct de celui de ``default``
+test_replica = {'NAME': None}
+if not DATABASES['default']['ENGINE'].endswith('sqlite3'):
+    test_replica['NAME'] = f"test_{DATABASES['default']['NAME']}_replica"
+DATABASES = {**DATABASES, 'replica': {**DATABASES['default'], 'TEST': test_replica}}
+DATABASE_REPLICAS = [alias for alias in DATABASE_REPLICAS if alias != 'replica']
@@ -0,0 +1,293 @@
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import transaction
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from prometheus_client import REGISTRY
+from rest_framework.test import APITestCase
+
+from orders.models import EmailOutbox, Order
+from orders.outbox import process_outbox
+from orders.services import send_order_confirmation_email
+from products.models import Product
+from .database import database_config, parse_database_url, replica_configs
+from .redis import _script
+from .routers import PrimaryReplicaRouter, pin_to_primary, reset_pinning
+from .shedding import monitor
+from .throttling import TAKE_TOKEN_SCRIPT, LocalBuckets, local_buckets, parse_rate
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class MetricsTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(name='Miel', description='Pur', price=Decimal('2500.00'), stock=10)
+
+    def place_order(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('order-create-order'), {
+                'customer_name': 'Awa', 'customer_email': 'awa@example.com', 'customer_address': 'Dakar',
+                'items_data': [{'product_id': self.product.id, 'quantity': 1}],
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return Order.objects.get(pk=response.data['order_id'])
+
+    def test_requests_are_labelled_by_route_and_action(self):
+        labels = {'view': 'product-list', 'action': 'list', 'method': 'GET', 'status': '2xx'}
+        before = sample('http_request_duration_seconds_count', **labels)
+        queries = sample('http_request_db_queries_sum', view='product-list', action='list')
+        self.client.get(reverse('product-list'))
+        self.assertEqual(sample('http_request_duration_seconds_count', **labels), before + 1)
+        # Validateurs (ETag) et page de produits
+        self.assertEqual(sample('http_request_db_queries_sum', view='product-list', action='list'), queries + 2)
+
+    def test_unknown_paths_share_one_label(self):
+        before = sample('http_request_duration_seconds_count',
+                        view='<unmatched>', action='', method='GET', status='4xx')
+        self.client.get('/nexiste/pas/1/')
+        self.client.get('/nexiste/pas/2/')
+        self.assertEqual(sample('http_request_duration_seconds_count',
+                                view='<unmatched>', action='', method='GET', status='4xx'), before + 2)
+
+    def test_custom_actions_and_order_counters(self):
+        created = sample('orders_created_total', status='pending')
+        order = self.place_order()
+        self.assertEqual(sample('orders_created_total', status='pending'), created + 1)
+
+        transitions = sample('order_status_transitions_total', from_status='pending', to_status='confirmed')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('order-confirm-order', args=[order.id]))
+        self.assertEqual(sample('order_status_transitions_total',
+                                from_status='pending', to_status='confirmed'), transitions + 1)
+        self.assertGreater(sample('http_request_duration_seconds_count', view='order-confirm-order',
+                                  action='confirm_order', method='POST', status='2xx'), 0)
+
+    def test_email_duration_and_failures(self):
+        order = self.place_order()
+        sent = sample('order_email_send_duration_seconds_count', kind='order_confirmation')
+        failures = sample('order_email_failures_total', kind='order_confirmation')
+        self.assertTrue(send_order_confirmation_email(order))
+        with mock.patch('django.core.mail.EmailMultiAlternatives.send', side_effect=OSError('SMTP')):
+            self.assertFalse(send_order_confirmation_email(order))
+            process_outbox()
+        self.assertEqual(sample('order_email_send_duration_seconds_count', kind='order_confirmation'), sent + 3)
+        self.assertEqual(sample('order_email_failures_total', kind='order_confirmation'), failures + 2)
+        self.assertEqual(EmailOutbox.objects.filter(attempts=1).count(), 2)
+
+    def test_metrics_endpoint(self):
+        self.client.get(reverse('product-list'))
+        response = self.client.get('/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'http_request_duration_seconds_bucket{', response.content)
+        self.assertNotIn(b'/api/products/', response.content)
+
+    def test_health_check_pings_database(self):
+        response = self.client.get('/health/')
+        self.assertEqual(response.json()['status'], 'healthy')
+
+
+class DatabaseUrlTests(SimpleTestCase):
+    def test_postgresql_url(self):
+        config = parse_database_url('postgresql://shop:p%40ss@db:5433/ecommerce_db?sslmode=require')
+        self.assertEqual(config, {
+            'ENGINE': 'django.db.backends.postgresql', 'NAME': 'ecommerce_db', 'USER': 'shop',
+            'PASSWORD': 'p@ss', 'HOST': 'db', 'PORT': '5433', 'OPTIONS': {'sslmode': 'require'},
+        })
+
+    def test_sqlite_urls(self):
+        self.assertEqual(parse_database_url('sqlite:///db.sqlite3')['NAME'], 'db.sqlite3')
+        self.assertEqual(parse_database_url('sqlite:////var/lib/app.sqlite3')['NAME'], '/var/lib/app.sqlite3')
+        # Verrou d'écriture pris dès BEGIN, sauf choix explicite dans l'URL
+        self.assertEqual(parse_database_url('sqlite:///db.sqlite3')['OPTIONS'], {'transaction_mode': 'IMMEDIATE'})
+        self.assertEqual(parse_database_url('sqlite:///db.sqlite3?transaction_mode=DEFERRED')['OPTIONS'],
+                         {'transaction_mode': 'DEFERRED'})
+        with self.assertRaises(ValueError):
+            parse_database_url('mysql://localhost/shop')
+
+    def test_persistent_connections_or_pool(self):
+        config = database_config('postgres://db/shop', {})
+        self.assertEqual((config['CONN_MAX_AGE'], config['CONN_HEALTH_CHECKS']), (60, True))
+        config = database_config('postgres://db/shop', {'DB_POOL_MAX_SIZE': '20'})
+        self.assertEqual(config['OPTIONS']['pool']['max_size'], 20)
+        self.assertEqual(config['CONN_MAX_AGE'], 0)
+
+    def test_replica_aliases_mirror_default_in_tests(self):
+        replicas = replica_configs('postgres://r1/shop, postgres://r2/shop', {})
+        self.assertEqual(list(replicas), ['replica', 'replica_2'])
+        self.assertEqual(replicas['replica_2']['HOST'], 'r2')
+        self.assertEqual(replicas['replica']['TEST'], {'MIRROR': 'default'})
+
+
+HAS_TEST_REPLICA = 'replica' in settings.DATABASES
+
+
+@skipUnless(HAS_TEST_REPLICA, 'réglages de test requis (ecommerce.test_settings)')
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(TransactionTestCase):
+    """Le réplica n'est pas alimenté : il simule un retard de réplication"""
+    # Sans la base du réplica, la classe est ignorée : ne pas la réclamer au lanceur
+    databases = {'default', 'replica'} if HAS_TEST_REPLICA else {'default'}
+
+    def setUp(self):
+        cache.clear()
+        self.router = PrimaryReplicaRouter()
+        token = pin_to_primary(False)
+        self.addCleanup(reset_pinning, token)
+        self.addCleanup(lambda: Product.objects.using('replica').all().delete())
+
+    def test_reads_go_to_replica_until_a_write(self):
+        self.assertEqual(self.router.db_for_read(Product), 'replica')
+        self.assertEqual(self.router.db_for_read(User), None)
+        with transaction.atomic():
+            self.assertEqual(self.router.db_for_read(Product), 'default')
+        Product.objects.create(name='Miel', description='Pur', price=Decimal('10.00'), stock=1)
+        self.assertEqual(self.router.db_for_read(Order), 'default')
+
+    def test_get_requests_read_the_replica(self):
+        product = Product.objects.create(name='Miel', description='Pur', price=Decimal('10.00'), stock=1)
+        url = reverse('product-detail', args=[product.id])
+        # Pas encore répliqué
+        self.assertEqual(self.client.get(url).status_code, 404)
+        Product.objects.using('replica').create(id=product.id, name='Miel', description='Pur',
+                                                price=Decimal('10.00'), stock=1)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_unsafe_requests_read_and_write_the_primary(self):
+        product = Product.objects.create(name='Miel', description='Pur', price=Decimal('10.00'), stock=5)
+        response = self.client.post(reverse('order-create-order'), {
+            'customer_name': 'Awa', 'customer_email': 'awa@example.com', 'customer_address': 'Dakar',
+            'items_data': [{'product_id': product.id, 'quantity': 2}],
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201, response.data)
+        response = self.client.post(reverse('order-confirm-order', args=[response.data['order_id']]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Product.objects.using('default').get().stock, 3)
+        self.assertFalse(Order.objects.using('replica').exists())
+
+    def test_replicas_are_never_migrated(self):
+        self.assertFalse(self.router.allow_migrate('replica', 'products'))
+        self.assertIsNone(self.router.allow_migrate('default', 'products'))
+
+
+class ThrottleTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        local_buckets.clear()
+        self.product = Product.objects.create(name='Miel', description='Pur', price=Decimal('2500.00'), stock=100)
+
+    def place_order(self):
+        return self.client.post(reverse('order-create-order'), {
+            'customer_name': 'Awa', 'customer_email': 'awa@example.com', 'customer_address': 'Dakar',
+            'items_data': [{'product_id': self.product.id, 'quantity': 1}],
+        }, format='json')
+
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate('30/min'), (30, 0.5))
+        self.assertEqual(parse_rate('5/s'), (5, 5))
+
+    def test_bucket_allows_burst_then_refills(self):
+        buckets = LocalBuckets()
+        with mock.patch('ecommerce.throttling.time.monotonic', return_value=100.0):
+            self.assertEqual([buckets.take('k', 2, 1) for _ in range(3)], [0, 0, 1.0])
+        with mock.patch('ecommerce.throttling.time.monotonic', return_value=101.0):
+            self.assertEqual(buckets.take('k', 2, 1), 0)
+
+    @override_settings(THROTTLE_RATES={'order.create_order': '2/min'})
+    def test_action_limit_returns_429_with_retry_after(self):
+        self.assertEqual([self.place_order().status_code for _ in range(2)], [201, 201])
+        response = self.place_order()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '30')
+        self.assertEqual(Order.objects.count(), 2)
+        # Les lectures ne sont pas limitées
+        self.assertEqual(self.client.get(reverse('product-list')).status_code, 200)
+
+    @override_settings(THROTTLE_RATES={'product.write': '1/min'})
+    def test_write_scope_covers_unsafe_methods_only(self):
+        url = reverse('product-detail', args=[self.product.id])
+        self.assertEqual(self.client.patch(url, {'stock': 5}, format='json').status_code, 200)
+        self.assertEqual(self.client.patch(url, {'stock': 6}, format='json').status_code, 429)
+        for _ in range(3):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    @override_settings(THROTTLE_RATES={'order.create_order': '1/min'})
+    def test_clients_have_separate_buckets(self):
+        self.assertEqual(self.place_order().status_code, 201)
+        self.client.force_authenticate(User.objects.create_user('awa'))
+        self.assertEqual(self.place_order().status_code, 201)
+        self.assertEqual(self.place_order().status_code, 429)
+
+    @override_settings(THROTTLE_RATES={'order.create_order': '1/min', 'cart.write': '10/min'})
+    def test_cart_checkout_shares_the_order_bucket(self):
+        self.assertEqual(self.place_order().status_code, 201)
+        cart_id = self.client.post(reverse('cart-list')).data['id']
+        self.client.post(reverse('cart-add-item', args=[cart_id]),
+                         {'product_id': self.product.id, 'quantity': 1}, format='json')
+        response = self.client.post(reverse('cart-checkout', args=[cart_id]), {
+            'customer_name': 'Awa', 'customer_email': 'awa@example.com', 'customer_address': 'Dakar',
+        }, format='json')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(Order.objects.count(), 1)
+
+    @override_settings(THROTTLE_RATES={'order.create_order': '1/min'}, REDIS_URL='redis://127.0.0.1:1/0')
+    def test_falls_back_to_local_buckets_without_redis(self):
+        with self.assertLogs('ecommerce.throttling', 'WARNING'):
+            self.assertEqual(self.place_order().status_code, 201)
+            self.assertEqual(self.place_order().status_code, 429)
+
+    @override_settings(THROTTLE_RATES={'order.create_order': '5/min'}, REDIS_URL='redis://throttle-test/0')
+    def test_redis_script_is_registered_once(self):
+        self.addCleanup(_script.cache_clear)
+        with mock.patch('ecommerce.redis._client') as client:
+            client.return_value.register_script.return_value.return_value = 0
+            for _ in range(3):
+                self.assertEqual(self.place_order().status_code, 201)
+        client.return_value.register_script.assert_called_once_with(TAKE_TOKEN_SCRIPT)
+        self.assertEqual(client.return_value.register_script.return_value.call_count, 3)
+
+
+class LoadSheddingTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        monitor.reset()
+        self.addCleanup(monitor.reset)
+        self.product = Product.objects.create(name='Miel', description='Pur', price=Decimal('2500.00'), stock=100)
+
+    def write(self):
+        return self.client.patch(reverse('product-detail', args=[self.product.id]), {'stock': 5}, format='json')
+
+    @override_settings(SHED_MAX_INFLIGHT_WRITES=2)
+    def test_writes_are_shed_when_too_many_are_in_flight(self):
+        self.assertEqual(self.write().status_code, 200)
+        monitor.start_write()
+        monitor.start_write()
+        shed = sample('http_requests_shed_total', reason='inflight')
+        response = self.write()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '5')
+        self.assertEqual(sample('http_requests_shed_total', reason='inflight'), shed + 1)
+        self.assertEqual(self.client.get(reverse('product-list')).status_code, 200)
+        monitor.end_write()
+        self.assertEqual(self.write().status_code, 200)
+        self.assertEqual(monitor.inflight_writes, 1)
+
+    def test_writes_are_shed_while_database_is_slow(self):
+        for _ in range(50):
+            monitor.observe(1, 1.0)
+        self.assertEqual(self.write().status_code, 503)
+        self.assertEqual(self.client.get(reverse('product-list')).status_code, 200)
+        # La moyenne retombe avec le temps sans nouvelle mesure
+        self.assertLess(monitor.db_latency(monitor.updated + 60), 0.25)
+
+    def test_latency_is_measured_from_requests(self):
+        self.client.get(reverse('product-list'))
+        self.assertGreater(monitor.db_latency(), 0)
+        self.assertLess(monitor.db_latency(), 0.25)
@@ -0,0 +1,145 @@
+"""
+Limitation de débit par seau à jetons (token bucket).
+
+Les limites se règlent par action de viewset dans ``THROTTLE_RATES`` :
+``'<basename>.<action>'`` (``order.create_order``), ou ``'<basename>.write'``
+pour toutes les méthodes non sûres d'un viewset. Une action sans limite
+n'est pas limitée : les lectures du catalogue ne passent pas par Redis.
+Un viewset peut faire partager à une action le seau d'une autre
+(``throttle_scopes = {'checkout': 'order.create_order'}``) : ce seau passe
+alors avant les siens.
+
+Un taux ``30/min`` donne un seau de 30 jetons rechargé de 30 jetons par
+minute : les rafales courtes passent, le débit soutenu est plafonné.
+
+Les seaux sont dans Redis (``REDIS_URL``), partagés par tous les réplicas ;
+sans Redis, ou s'il ne répond pas, chaque processus garde ses seaux en
+mémoire.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import BaseThrottle
+
+from .redis import get_script
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+# Au-delà, les seaux pleins (inactifs) sont oubliés
+MAX_LOCAL_BUCKETS = 10000
+
+# Jetons et date de dernière recharge dans un hash ; horloge du serveur Redis,
+# commune à tous les réplicas. Retourne l'attente en secondes (0 : accepté).
+TAKE_TOKEN_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'stamp')
+local tokens = tonumber(bucket[1]) or capacity
+local stamp = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - stamp) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'stamp', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+return tostring(wait)
+"""
+
+
+def parse_rate(rate):
+    """``'30/min'`` -> ``(capacité, jetons par seconde)``"""
+    count, _, period = rate.partition('/')
+    count = int(count)
+    return count, count / PERIODS[period.strip()[0]]
+
+
+class LocalBuckets:
+    """Seaux en mémoire du processus (repli sans Redis)"""
+
+    def __init__(self):
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def take(self, key, capacity, rate):
+        now = time.monotonic()
+        with self.lock:
+            tokens, stamp = self.buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - stamp) * rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+            self.buckets[key] = (tokens, now)
+            if len(self.buckets) > MAX_LOCAL_BUCKETS:
+                self.prune(now)
+        return wait
+
+    def prune(self, now):
+        # Un seau inactif depuis une heure est plein pour tout taux d'au moins 1/h
+        self.buckets = {key: (tokens, stamp) for key, (tokens, stamp) in self.buckets.items()
+                        if now - stamp < 3600}
+
+    def clear(self):
+        with self.lock:
+            self.buckets.clear()
+
+
+local_buckets = LocalBuckets()
+
+
+def take_token(key, capacity, rate):
+    """Prend un jeton ; retourne l'attente en secondes avant le prochain (0 si accepté)"""
+    script = get_script(TAKE_TOKEN_SCRIPT)
+    if script is not None:
+        from redis.exceptions import RedisError
+
+        try:
+            return float(script(keys=[key], args=[capacity, rate]))
+        except RedisError as e:
+            logger.warning('Redis indisponible pour la limitation de débit, repli local : %s', e)
+    return local_buckets.take(key, capacity, rate)
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Limite par client (utilisateur connecté ou adresse IP) et par action, voir ``THROTTLE_RATES``"""
+
+    def get_scope(self, request, view):
+        rates = getattr(settings, 'THROTTLE_RATES', {})
+        basename = getattr(view, 'basename', None)
+        action = getattr(view, 'action', None)
+        shared = getattr(view, 'throttle_scopes', {}).get(action)
+        scopes = [shared] if shared else []
+        scopes.append(f'{basename}.{action}')
+        if request.method not in SAFE_METHODS:
+            scopes.append(f'{basename}.write')
+        for scope in scopes:
+            if scope in rates:
+                return scope, rates[scope]
+        return None, None
+
+    def get_client(self, request):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return f'user:{user.pk}'
+        return f'ip:{self.get_ident(request)}'
+
+    def allow_request(self, request, view):
+        scope, rate = self.get_scope(request, view)
+        if scope is None:
+            return True
+        capacity, refill = parse_rate(rate)
+        self.wait_seconds = take_token(f'throttle:{scope}:{self.get_client(request)}', capacity, refill)
+        return self.wait_seconds == 0
+
+    def wait(self):
+        return self.wait_seconds
@@ -18,8 +18,11 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from django.db import connection
 from django.http import JsonResponse
 
+from .metrics import metrics_view
+
 def api_home(request):
     """Page d'accueil de l'API"""
     return JsonResponse({
@@ -27,18 +30,26 @@ def api_home(request):
         'endpoints': {
             'products': '/api/products/',
             'orders': '/api/orders/',
+            'carts': '/api/carts/',
+            'analytics': '/api/analytics/',
             'admin': '/admin/',
         }
     })
 
 def health_check(request):
+    try:
+        connection.ensure_connection()
+    except Exception:
+        return JsonResponse({"status": "unhealthy", "message": "Database unavailable"}, status=503)
     return JsonResponse({"status": "healthy", "message": "Ecommerce API is running"})
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('health/', health_check, name='health_check'),
+    path('metrics/', metrics_view, name='metrics'),
     path('api/', include('products.urls')),  # Inclure les URLs des produits sous /api/
     path('api/', include('orders.urls')),    # Inclure les URLs des commandes sous /api/
+    path('api/', include('analytics.urls')),
     path('', api_home, name='api_home'),  # Page d'accueil de l'API à la racine
 ]
 
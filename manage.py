@@ -6,7 +6,9 @@ import sys
 
 def main():
     """Run administrative tasks."""
-    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ecommerce.settings')
+    # Les tests ont leurs propres réglages (base du réplica, voir test_settings.py)
+    default_settings = 'ecommerce.test_settings' if sys.argv[1:2] == ['test'] else 'ecommerce.settings'
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', default_settings)
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc:
@@ -1,35 +1,142 @@
-from django.contrib import admin
-from .models import Order, OrderItem
+from collections import Counter
+
+from django.contrib import admin, messages
+from django.core.exceptions import ValidationError
+from django.forms.models import BaseInlineFormSet
+from django.http import HttpResponseRedirect
+from django.utils import timezone
+from ecommerce.admin_pagination import EstimatedCountPaginator
+from .inventory import InsufficientStock, reserve_stock
+from .models import EmailOutbox, Order, OrderItem
+from .signals import order_placed
+from .transitions import INVALID, UPDATED, transition_orders
+
+class OrderItemInlineFormSet(BaseInlineFormSet):
+    def clean(self):
+        """Nouvelle commande : stock suffisant pour chaque produit, toutes lignes confondues"""
+        super().clean()
+        if self.instance.pk is not None:
+            return
+        quantities = Counter()
+        for form in self.forms:
+            if form.cleaned_data.get('product') and not form.cleaned_data.get('DELETE'):
+                quantities[form.cleaned_data['product']] += form.cleaned_data.get('quantity') or 0
+        errors = [f'Stock insuffisant pour « {product.name} » : {product.stock} disponible(s) '
+                  f'pour {quantity} demandé(s).'
+                  for product, quantity in quantities.items() if product.stock < quantity]
+        if errors:
+            raise ValidationError(errors)
 
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
+    formset = OrderItemInlineFormSet
     extra = 0
-    readonly_fields = ['total']
+    # Recherche à la demande plutôt qu'un <select> de tout le catalogue
+    autocomplete_fields = ['product']
+    readonly_fields = ['product_name', 'total']
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
-    list_display = ['id', 'customer_name', 'customer_email', 'total_amount', 'status', 'created_at']
+    list_display = ['id', 'customer_name', 'customer_email', 'item_count', 'total_amount', 'status', 'created_at']
     list_filter = ['status', 'created_at']
     search_fields = ['customer_name', 'customer_email', 'customer_phone']
-    readonly_fields = ['created_at', 'updated_at']
+    # Le statut ne change que par les actions, qui suivent la machine à états
+    # (stock remis en place à l'annulation)
+    readonly_fields = ['item_count', 'subtotal', 'status', 'created_at', 'updated_at']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     inlines = [OrderItemInline]
+    actions = ['confirm', 'ship', 'deliver', 'cancel']
     
     fieldsets = (
         ('Informations client', {
             'fields': ('customer_name', 'customer_email', 'customer_phone', 'customer_address')
         }),
         ('Détails de la commande', {
-            'fields': ('total_amount', 'status')
+            'fields': ('total_amount', 'item_count', 'subtotal', 'status')
         }),
         ('Dates', {
             'fields': ('created_at', 'updated_at'),
             'classes': ('collapse',)
         }),
     )
+    
+    def save_model(self, request, obj, form, change):
+        if not change:
+            # Réservé dans save_related, même transaction que l'enregistrement
+            obj.stock_reserved = True
+        super().save_model(request, obj, form, change)
+    
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        form.instance.refresh_summary()
+        if not change:
+            lines = list(form.instance.items.values('product_id', 'quantity'))
+            if lines:
+                # Comme pour l'API ; le formulaire a vérifié le stock, mais une
+                # commande concurrente a pu le prendre depuis (voir changeform_view)
+                reserve_stock(lines)
+            # Les lignes saisies dans l'admin n'existent qu'à partir d'ici
+            order_placed.send(sender=Order, order_ids=[form.instance.pk])
+    
+    def changeform_view(self, request, object_id=None, form_url='', extra_context=None):
+        try:
+            return super().changeform_view(request, object_id, form_url, extra_context)
+        except InsufficientStock:
+            # La transaction de la vue est annulée : ni commande ni lignes
+            self.message_user(request, 'Stock insuffisant : le stock a changé entre-temps, '
+                                       'la commande n\'a pas été créée.', messages.ERROR)
+            return HttpResponseRedirect(request.get_full_path())
+    
+    def transition(self, request, queryset, new_status):
+        outcomes = transition_orders(list(queryset.values_list('id', flat=True)), new_status)
+        counts = Counter(outcome for outcome, _ in outcomes.values())
+        label = dict(Order.STATUS_CHOICES)[new_status]
+        self.message_user(request, f'{counts[UPDATED]} commande(s) passée(s) au statut « {label} ».')
+        if counts[INVALID]:
+            self.message_user(request, f'{counts[INVALID]} commande(s) ignorée(s) : '
+                                       f'passage au statut « {label} » impossible.', messages.WARNING)
+    
+    def confirm(self, request, queryset):
+        self.transition(request, queryset, 'confirmed')
+    confirm.short_description = 'Confirmer les commandes sélectionnées'
+    
+    def ship(self, request, queryset):
+        self.transition(request, queryset, 'shipped')
+    ship.short_description = 'Marquer comme expédiées'
+    
+    def deliver(self, request, queryset):
+        self.transition(request, queryset, 'delivered')
+    deliver.short_description = 'Marquer comme livrées'
+    
+    def cancel(self, request, queryset):
+        self.transition(request, queryset, 'cancelled')
+    cancel.short_description = 'Annuler les commandes sélectionnées'
 
 @admin.register(OrderItem)
 class OrderItemAdmin(admin.ModelAdmin):
-    list_display = ['order', 'product', 'quantity', 'price', 'total']
+    list_display = ['order', 'product_name', 'quantity', 'price', 'total']
     list_filter = ['order__status']
-    search_fields = ['order__customer_name', 'product__name']
-    readonly_fields = ['total']
+    search_fields = ['order__customer_name', 'product_name']
+    readonly_fields = ['product_name', 'product_image', 'total']
+    list_select_related = ['order']
+    raw_id_fields = ['order']
+    autocomplete_fields = ['product']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = ['id', 'order', 'kind', 'status', 'attempts', 'next_attempt_at', 'sent_at']
+    list_filter = ['status', 'kind']
+    list_select_related = ['order']
+    raw_id_fields = ['order']
+    readonly_fields = ['created_at', 'sent_at', 'last_error']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ['requeue']
+    
+    def requeue(self, request, queryset):
+        queryset.update(status='pending', attempts=0, next_attempt_at=timezone.now())
+    requeue.short_description = 'Remettre en file'
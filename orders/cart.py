@@ -0,0 +1,221 @@
+"""
+Paniers côté serveur, gardés dans Redis.
+
+Un panier est un hash Redis ``cart:<id>`` (produit -> quantité), qui expire
+après ``CART_TTL`` secondes sans activité : chaque lecture ou modification
+repousse l'échéance. Ajouter, modifier ou retirer un article ne touche pas
+la base ; seuls le devis (``quote``, une requête pour tous les produits,
+servie par un réplica s'il y en a) et la validation en commande la lisent.
+
+Les produits ne sont pas vérifiés à l'ajout : un produit supprimé ou en
+rupture apparaît dans le devis et fait échouer la commande.
+
+Sans ``REDIS_URL``, les paniers restent en mémoire du processus
+(développement, tests).
+"""
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+from functools import lru_cache
+
+from django.conf import settings
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from ecommerce.redis import get_redis, get_script
+from products.models import Product
+
+TTL = getattr(settings, 'CART_TTL', 7 * 24 * 3600)
+MAX_LINES = getattr(settings, 'CART_MAX_LINES', 100)
+MAX_QUANTITY = getattr(settings, 'CART_MAX_QUANTITY', 1000)
+
+# Champ toujours présent : un hash Redis vide n'existe pas
+CREATED_FIELD = 'created_at'
+
+TOO_MANY_LINES = -1
+TOO_MANY_UNITS = -2
+
+# Modification atomique d'une ligne ; ARGV : produit, quantité, 'add' ou 'set',
+# TTL, lignes max, quantité max. Retourne le contenu du panier, nil s'il
+# n'existe pas ou un code d'erreur.
+CHANGE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return nil
+end
+local quantity = tonumber(ARGV[2])
+if ARGV[3] == 'add' then
+    quantity = quantity + tonumber(redis.call('HGET', KEYS[1], ARGV[1]) or '0')
+end
+if quantity <= 0 then
+    redis.call('HDEL', KEYS[1], ARGV[1])
+elseif quantity > tonumber(ARGV[6]) then
+    return -2
+elseif redis.call('HEXISTS', KEYS[1], ARGV[1]) == 0 and redis.call('HLEN', KEYS[1]) > tonumber(ARGV[5]) then
+    return -1
+else
+    redis.call('HSET', KEYS[1], ARGV[1], quantity)
+end
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return redis.call('HGETALL', KEYS[1])
+"""
+
+
+class CartLimitExceeded(APIException):
+    status_code = status.HTTP_400_BAD_REQUEST
+    default_code = 'cart_limit'
+
+
+class CartUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Paniers momentanément indisponibles, réessayez.'
+    default_code = 'cart_unavailable'
+
+
+def check_result(result):
+    if result == TOO_MANY_LINES:
+        raise CartLimitExceeded(f'Un panier ne peut pas contenir plus de {MAX_LINES} produits.')
+    if result == TOO_MANY_UNITS:
+        raise CartLimitExceeded(f'Quantité maximale par produit : {MAX_QUANTITY}.')
+    return result
+
+
+def parse_items(fields):
+    """``{produit: quantité}`` à partir des champs du hash"""
+    return {int(key): int(value) for key, value in fields.items() if key != CREATED_FIELD}
+
+
+@contextmanager
+def redis_errors():
+    """Redis injoignable : 503 plutôt qu'une erreur 500"""
+    from redis.exceptions import RedisError
+
+    try:
+        yield
+    except RedisError:
+        raise CartUnavailable
+
+
+class RedisCartStore:
+    def key(self, cart_id):
+        return f'cart:{cart_id}'
+
+    def create(self):
+        cart_id = secrets.token_urlsafe(16)
+        with redis_errors(), get_redis().pipeline() as pipe:
+            pipe.hset(self.key(cart_id), CREATED_FIELD, int(time.time())).expire(self.key(cart_id), TTL).execute()
+        return cart_id
+
+    def items(self, cart_id):
+        """Contenu du panier (échéance repoussée), ou ``None`` s'il n'existe pas"""
+        with redis_errors(), get_redis().pipeline() as pipe:
+            fields, exists = pipe.hgetall(self.key(cart_id)).expire(self.key(cart_id), TTL).execute()
+        if not exists:
+            return None
+        return parse_items({key.decode(): value for key, value in fields.items()})
+
+    def change(self, cart_id, product_id, quantity, add=False):
+        """Ajoute (``add``) ou fixe la quantité d'un produit ; 0 le retire"""
+        with redis_errors():
+            result = get_script(CHANGE_SCRIPT)(
+                keys=[self.key(cart_id)],
+                args=[product_id, quantity, 'add' if add else 'set', TTL, MAX_LINES, MAX_QUANTITY])
+        if result is None:
+            return None
+        check_result(result)
+        # HGETALL renvoyé par Lua : liste plate [champ, valeur, ...]
+        return parse_items({key.decode(): value for key, value in zip(result[::2], result[1::2])})
+
+    def delete(self, cart_id):
+        with redis_errors():
+            get_redis().delete(self.key(cart_id))
+
+
+class LocalCartStore:
+    """Même comportement que ``RedisCartStore``, en mémoire du processus"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.carts = {}
+
+    def clear(self):
+        with self.lock:
+            self.carts.clear()
+
+    def get(self, cart_id):
+        cart = self.carts.get(cart_id)
+        if cart is None or cart['expires_at'] <= time.monotonic():
+            self.carts.pop(cart_id, None)
+            return None
+        cart['expires_at'] = time.monotonic() + TTL
+        return cart
+
+    def create(self):
+        cart_id = secrets.token_urlsafe(16)
+        with self.lock:
+            self.carts[cart_id] = {'items': {}, 'expires_at': time.monotonic() + TTL}
+        return cart_id
+
+    def items(self, cart_id):
+        with self.lock:
+            cart = self.get(cart_id)
+            return None if cart is None else dict(cart['items'])
+
+    def change(self, cart_id, product_id, quantity, add=False):
+        with self.lock:
+            cart = self.get(cart_id)
+            if cart is None:
+                return None
+            items = cart['items']
+            if add:
+                quantity += items.get(product_id, 0)
+            if quantity <= 0:
+                items.pop(product_id, None)
+            elif quantity > MAX_QUANTITY:
+                check_result(TOO_MANY_UNITS)
+            elif product_id not in items and len(items) >= MAX_LINES:
+                check_result(TOO_MANY_LINES)
+            else:
+                items[product_id] = quantity
+            return dict(items)
+
+    def delete(self, cart_id):
+        with self.lock:
+            self.carts.pop(cart_id, None)
+
+
+@lru_cache(maxsize=None)
+def get_cart_store():
+    return RedisCartStore() if settings.REDIS_URL else LocalCartStore()
+
+
+def order_lines(items):
+    """Lignes ``items_data`` d'une commande, par identifiant de produit croissant"""
+    return [{'product_id': product_id, 'quantity': quantity} for product_id, quantity in sorted(items.items())]
+
+
+def quote(items):
+    """
+    Prix actuels du panier, en une requête sur les produits. Les lignes sont
+    dans l'ordre de ``order_lines`` : les erreurs de la commande (par ligne)
+    leur correspondent.
+    """
+    products = Product.objects.only('id', 'name', 'price', 'stock').in_bulk(items)
+    lines, subtotal, item_count = [], Decimal('0.00'), 0
+    for line in order_lines(items):
+        product = products.get(line['product_id'])
+        if product is None:
+            lines.append({**line, 'available': False})
+            continue
+        total = product.price * line['quantity']
+        lines.append({**line, 'name': product.name, 'unit_price': str(product.price),
+                      'line_total': str(total), 'available': product.stock >= line['quantity']})
+        subtotal += total
+        item_count += line['quantity']
+    return {
+        'lines': lines,
+        'item_count': item_count,
+        'subtotal': str(subtotal),
+        'ready': bool(lines) and all(line['available'] for line in lines),
+    }
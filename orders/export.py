@@ -0,0 +1,129 @@
+"""
+Export des commandes pour la comptabilité.
+
+Une ligne par article commandé (les colonnes de la commande sont répétées),
+en CSV ou en NDJSON. Les commandes sont lues par morceaux avec un curseur
+serveur, les lignes de chaque morceau en une requête : la mémoire utilisée
+ne dépend pas du nombre de commandes exportées.
+"""
+import csv
+import json
+
+from django.db.models import Prefetch
+from rest_framework import serializers
+from rest_framework.renderers import BaseRenderer
+
+from .models import Order, OrderItem
+
+ORDER_COLUMNS = ['order_id', 'created_at', 'status', 'customer_name', 'customer_email',
+                 'customer_phone', 'customer_address', 'total_amount']
+ITEM_COLUMNS = ['item_id', 'product_id', 'product_name', 'quantity', 'unit_price', 'line_total']
+COLUMNS = ORDER_COLUMNS + ITEM_COLUMNS
+
+
+class CSVRenderer(BaseRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Seules les erreurs passent par ici : l'export lui-même est envoyé en flux
+        rows = data.items() if isinstance(data, dict) else [('detail', data)]
+        return ''.join(csv_line([field, error_text(message)]) for field, message in rows)
+
+
+def error_text(message):
+    """Messages d'erreur DRF (``ErrorDetail`` ou listes) en texte simple"""
+    if isinstance(message, (list, tuple)):
+        return ', '.join(map(error_text, message))
+    return str(message)
+
+
+class NDJSONRenderer(BaseRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, ensure_ascii=False) + '\n'
+
+
+class Echo:
+    """Pseudo-fichier : ``csv.writer`` retourne la ligne au lieu de la stocker"""
+
+    def write(self, value):
+        return value
+
+
+_csv_writer = csv.writer(Echo())
+
+
+def csv_line(values):
+    return _csv_writer.writerow(values)
+
+
+class OrderExportFilterSerializer(serializers.Serializer):
+    """Filtres de l'export : ``created_after`` (inclus), ``created_before`` (exclu), ``status``"""
+    created_after = serializers.DateTimeField(required=False)
+    created_before = serializers.DateTimeField(required=False)
+    status = serializers.CharField(required=False)
+
+    def validate_status(self, value):
+        statuses = {part.strip() for part in value.split(',') if part.strip()}
+        unknown = statuses - {choice for choice, _ in Order.STATUS_CHOICES}
+        if unknown:
+            raise serializers.ValidationError([f"Statut inconnu : {name}" for name in sorted(unknown)])
+        return statuses
+
+    def filter(self, queryset):
+        data = self.validated_data
+        if 'created_after' in data:
+            queryset = queryset.filter(created_at__gte=data['created_after'])
+        if 'created_before' in data:
+            queryset = queryset.filter(created_at__lt=data['created_before'])
+        if data.get('status'):
+            queryset = queryset.filter(status__in=data['status'])
+        return queryset
+
+
+def export_queryset(queryset):
+    """Commandes dans l'ordre chronologique, avec seulement les colonnes exportées"""
+    items = (OrderItem.objects
+             .only('id', 'order_id', 'product_id', 'product_name', 'quantity', 'price')
+             .order_by('id'))
+    return (queryset
+            .only('id', 'created_at', 'status', 'customer_name', 'customer_email',
+                  'customer_phone', 'customer_address', 'total_amount')
+            .prefetch_related(Prefetch('items', queryset=items))
+            .order_by('created_at', 'id'))
+
+
+def iter_rows(queryset, chunk_size=2000):
+    """Une liste de valeurs (dans l'ordre de ``COLUMNS``) par article"""
+    for order in export_queryset(queryset).iterator(chunk_size=chunk_size):
+        head = [order.id, order.created_at, order.status, order.customer_name, order.customer_email,
+                order.customer_phone or '', order.customer_address, order.total_amount]
+        items = order.items.all()
+        if not items:
+            # Commande sans ligne : conservée, colonnes d'article vides
+            yield head + [None] * len(ITEM_COLUMNS)
+        for item in items:
+            yield head + [item.id, item.product_id, item.product_name, item.quantity, item.price, item.total]
+
+
+def stream_export(queryset, fmt='csv', chunk_size=2000):
+    """Génère le contenu de l'export, morceau par morceau"""
+    if fmt == 'ndjson':
+        for values in iter_rows(queryset, chunk_size):
+            row = dict(zip(COLUMNS, values))
+            row['created_at'] = row['created_at'].isoformat()
+            for column in ('total_amount', 'unit_price', 'line_total'):
+                if row[column] is not None:
+                    row[column] = str(row[column])
+            yield json.dumps(row, ensure_ascii=False) + '\n'
+        return
+
+    yield csv_line(COLUMNS)
+    for values in iter_rows(queryset, chunk_size):
+        values[1] = values[1].isoformat()
+        yield csv_line(['' if value is None else value for value in values])
@@ -0,0 +1,99 @@
+"""
+Clés d'idempotence (en-tête ``Idempotency-Key``) pour les créations de commande.
+
+Un client qui renvoie la même requête avec la même clé (nouvelle tentative
+après une coupure réseau) reçoit la réponse d'origine, rejouée depuis le
+cache : pas de nouvelle commande, pas de nouveaux emails, aucune requête SQL.
+Les réponses sont gardées ``IDEMPOTENCY_KEY_TTL`` secondes.
+
+Un doublon qui arrive pendant le traitement de l'original attend sa réponse
+(verrou ``cache.add``, comme ``products.cache.get_or_build``) ; au-delà de
+``IDEMPOTENCY_LOCK_WAIT`` secondes il reçoit un 409 et peut réessayer.
+
+Le cache doit être partagé entre les processus (Redis en production) pour
+que les doublons soient reconnus d'un worker à l'autre.
+"""
+import hashlib
+import json
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+KEY_TTL = getattr(settings, 'IDEMPOTENCY_KEY_TTL', 24 * 3600)
+LOCK_TIMEOUT = 30
+LOCK_WAIT = getattr(settings, 'IDEMPOTENCY_LOCK_WAIT', 10.0)
+LOCK_POLL_INTERVAL = 0.05
+
+
+def cache_key(scope, key):
+    return f'orders:idempotency:{scope}:{hashlib.sha256(key.encode("utf-8")).hexdigest()}'
+
+
+def fingerprint(request):
+    """Empreinte du corps de la requête, pour refuser une clé réutilisée sur un autre contenu"""
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(body.encode('utf-8')).hexdigest()
+
+
+def replay(stored, request):
+    if stored['fingerprint'] != fingerprint(request):
+        return Response({'detail': f'Clé {HEADER} déjà utilisée pour une autre requête.'},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    return Response(stored['data'], status=stored['status'], headers={'Idempotent-Replayed': 'true'})
+
+
+def wait_for(key):
+    deadline = time.monotonic() + LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        stored = cache.get(key)
+        if stored is not None:
+            return stored
+    return None
+
+
+def idempotent(scope):
+    """
+    Rend une action DRF idempotente pour les requêtes portant ``Idempotency-Key``.
+
+    Les réponses 2xx et 4xx sont mémorisées ; une erreur 5xx ou une exception
+    ne l'est pas, le client peut réessayer avec la même clé.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(self, request, *args, **kwargs):
+            key = request.headers.get(HEADER)
+            if key is None:
+                return view(self, request, *args, **kwargs)
+            if not key or len(key) > MAX_KEY_LENGTH:
+                return Response({'detail': f'En-tête {HEADER} invalide (1 à {MAX_KEY_LENGTH} caractères).'},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+            key = cache_key(scope, key)
+            stored = cache.get(key)
+            if stored is not None:
+                return replay(stored, request)
+
+            lock_key = f'{key}:lock'
+            if not cache.add(lock_key, 1, LOCK_TIMEOUT):
+                stored = wait_for(key)
+                if stored is not None:
+                    return replay(stored, request)
+                return Response({'detail': 'Requête identique en cours de traitement, réessayez.'},
+                                status=status.HTTP_409_CONFLICT, headers={'Retry-After': '1'})
+            try:
+                response = view(self, request, *args, **kwargs)
+                if response.status_code < 500:
+                    cache.set(key, {'fingerprint': fingerprint(request), 'status': response.status_code,
+                                    'data': response.data}, KEY_TTL)
+            finally:
+                cache.delete(lock_key)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,120 @@
+"""
+Réservation du stock à la création des commandes.
+
+Chaque produit est décrémenté par un ``UPDATE ... SET stock = stock - n
+WHERE stock >= n`` : la base arbitre les commandes concurrentes et le stock
+ne peut jamais devenir négatif. Tout le panier est réservé par une seule
+instruction ; aucune ligne n'est lue puis réécrite en Python, et les
+verrous ne durent que le temps de la transaction de la commande.
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from products.cache import mark_stock_changed
+from products.models import Product
+from products.stream import publish_product_changes
+from .models import Order, OrderItem
+
+
+class _PartialReservation(Exception):
+    pass
+
+
+class InsufficientStock(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Stock insuffisant.'
+    default_code = 'insufficient_stock'
+
+
+def reserve_stock(lines):
+    """
+    Décrémente le stock pour des lignes ``{'product_id', 'quantity'}``.
+
+    Doit être appelée dans une transaction. Si un produit manque de stock,
+    lève ``InsufficientStock`` avec une erreur par ligne concernée (la
+    transaction est alors annulée par l'appelant).
+    """
+    quantities = Counter()
+    for line in lines:
+        quantities[line['product_id']] += line['quantity']
+
+    for _ in range(2):
+        if _decrement(quantities):
+            break
+        available = dict(Product.objects.filter(pk__in=quantities).values_list('id', 'stock'))
+        failed = {product_id for product_id, quantity in quantities.items()
+                  if available.get(product_id, 0) < quantity}
+        if failed:
+            raise InsufficientStock({'items_data': [
+                {'quantity': [f"Stock insuffisant : {available.get(line['product_id'], 0)} disponible(s) "
+                              f"pour {quantities[line['product_id']]} demandé(s)"]}
+                if line['product_id'] in failed else {}
+                for line in lines
+            ]})
+        # Stock réapprovisionné entre-temps : nouvelle tentative
+    else:
+        raise InsufficientStock()
+
+    # update() ne déclenche pas post_save : invalider nous-mêmes les produits commandés
+    transaction.on_commit(lambda: mark_stock_changed(quantities))
+    publish_product_changes(quantities)
+
+
+def _quantity_case(quantities):
+    return Case(*[When(pk=product_id, then=Value(quantity))
+                  for product_id, quantity in quantities.items()],
+                output_field=IntegerField())
+
+
+def _decrement(quantities):
+    """
+    Décrémente tout le panier en une instruction :
+    UPDATE ... SET stock = stock - CASE id ... WHERE id IN (...) AND stock >= CASE id ...
+
+    Retourne False, sans rien modifier, si un produit manque de stock.
+    """
+    requested = _quantity_case(quantities)
+    try:
+        with transaction.atomic():
+            updated = Product.objects.filter(pk__in=quantities, stock__gte=requested).update(
+                stock=F('stock') - requested, updated_at=timezone.now())
+            if updated != len(quantities):
+                # Annule les décréments partiels (savepoint)
+                raise _PartialReservation
+    except _PartialReservation:
+        return False
+    return True
+
+
+def release_stock(order_ids):
+    """
+    Remet en stock les quantités des commandes données.
+
+    Seules les commandes dont le stock est encore réservé sont traitées,
+    ce qui rend l'opération idempotente.
+    """
+    with transaction.atomic():
+        order_ids = list(
+            Order.objects.select_for_update()
+            .filter(id__in=order_ids, stock_reserved=True)
+            .values_list('id', flat=True)
+        )
+        if not order_ids:
+            return
+        Order.objects.filter(id__in=order_ids).update(stock_reserved=False)
+
+        quantities = dict(
+            OrderItem.objects.filter(order_id__in=order_ids)
+            .values('product_id').annotate(quantity=Sum('quantity'))
+            .values_list('product_id', 'quantity')
+        )
+        if quantities:
+            Product.objects.filter(pk__in=quantities).update(
+                stock=F('stock') + _quantity_case(quantities), updated_at=timezone.now())
+            publish_product_changes(quantities)
+            transaction.on_commit(lambda: mark_stock_changed(quantities))
@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand
+from prometheus_client import start_http_server
+
+from orders.outbox import MAX_ATTEMPTS, process_admin_digest, process_outbox
+
+
+class Command(BaseCommand):
+    help = "Envoie les emails de commande en attente dans la boîte d'envoi"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help="Nombre d'emails envoyés par connexion SMTP")
+        parser.add_argument('--max-attempts', type=int, default=MAX_ATTEMPTS,
+                            help="Nombre d'échecs avant abandon d'un email")
+        parser.add_argument('--loop', action='store_true',
+                            help='Tourne en continu au lieu de vider la file une fois')
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help='Pause (secondes) quand la file est vide, avec --loop')
+        parser.add_argument('--metrics-port', type=int,
+                            help='Expose les métriques Prometheus du worker sur ce port')
+
+    def handle(self, *args, **options):
+        if options['metrics_port']:
+            start_http_server(options['metrics_port'])
+        while True:
+            total_sent = total_failed = 0
+            while True:
+                sent, failed = process_outbox(options['batch_size'], options['max_attempts'])
+                total_sent += sent
+                total_failed += failed
+                if sent + failed < options['batch_size']:
+                    break
+            digested = digest_failed = 0
+            while True:
+                sent, failed = process_admin_digest(options['max_attempts'])
+                if not sent + failed:
+                    break
+                digested += sent
+                digest_failed += failed
+            if total_sent or total_failed or not options['loop']:
+                self.stdout.write(f'{total_sent} email(s) envoyé(s), {total_failed} échec(s)')
+            if digested or digest_failed:
+                self.stdout.write(f'Résumé admin : {digested} commande(s) envoyée(s), {digest_failed} en échec')
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
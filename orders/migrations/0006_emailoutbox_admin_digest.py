@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_order_stock_reserved'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='emailoutbox',
+            name='kind',
+            field=models.CharField(choices=[('order_confirmation', 'Confirmation client'), ('admin_notification', 'Notification admin'), ('admin_digest', 'Résumé admin')], max_length=30),
+        ),
+    ]
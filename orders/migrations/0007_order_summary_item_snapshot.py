@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:19
+
+from django.db import migrations, models
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill(apps, schema_editor):
+    """Photographie des produits et résumés des commandes existantes, en deux UPDATE"""
+    Order = apps.get_model('orders', 'Order')
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    Product = apps.get_model('products', 'Product')
+
+    product = Product.objects.filter(pk=OuterRef('product_id'))
+    OrderItem.objects.update(
+        product_name=Subquery(product.values('name')[:1]),
+        product_image=Coalesce(Subquery(product.values('image')[:1]), Value('')),
+    )
+
+    items = OrderItem.objects.filter(order_id=OuterRef('pk')).order_by().values('order_id')
+    amount = DecimalField(max_digits=10, decimal_places=2)
+    Order.objects.update(
+        item_count=Coalesce(Subquery(items.annotate(count=Sum('quantity')).values('count')), 0),
+        subtotal=Coalesce(
+            Subquery(items.annotate(subtotal=Sum(F('price') * F('quantity'), output_field=amount)).values('subtotal')),
+            Value(0), output_field=amount,
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_emailoutbox_admin_digest'),
+        ('products', '0005_product_sku'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='subtotal',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='product_image',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='product_name',
+            field=models.CharField(blank=True, max_length=200),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
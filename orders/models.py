@@ -1,6 +1,9 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
 from django.contrib.auth.models import User
 from products.models import Product
+from .signals import order_status_changed
 
 class Order(models.Model):
     STATUS_CHOICES = [
@@ -17,7 +20,12 @@ class Order(models.Model):
     customer_address = models.TextField()
     
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    # Résumé des lignes, calculé à la création : les listes n'ont pas à lire les lignes
+    item_count = models.PositiveIntegerField(default=0)
+    subtotal = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    # Vrai tant que les quantités commandées sont décomptées du stock
+    stock_reserved = models.BooleanField(default=False)
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -25,20 +33,97 @@ class Order(models.Model):
     def __str__(self):
         return f"Commande #{self.id} - {self.customer_name}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Statut tel que lu en base, pour détecter les changements au save()
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
+    
+    def refresh_summary(self):
+        """Recalcule ``item_count`` et ``subtotal`` depuis les lignes (admin, reprise)"""
+        summary = self.items.aggregate(count=Sum('quantity'), subtotal=Sum(F('price') * F('quantity')))
+        self.item_count = summary['count'] or 0
+        self.subtotal = summary['subtotal'] or 0
+        Order.objects.filter(pk=self.pk).update(item_count=self.item_count, subtotal=self.subtotal)
+    
+    def save(self, *args, **kwargs):
+        previous = getattr(self, '_loaded_status', None)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if previous is not None and previous != self.status:
+                order_status_changed.send(sender=Order, order_ids=[self.pk],
+                                          old_status=previous, new_status=self.status)
+        self._loaded_status = self.status
+    
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Sert la pagination par curseur sur (created_at, id)
+            models.Index(fields=['-created_at', '-id'], name='order_created_id_idx'),
+        ]
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, related_name='items', on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
     price = models.DecimalField(max_digits=10, decimal_places=2)
+    # Produit tel qu'il était à la commande : modifier le produit ne change pas l'historique
+    product_name = models.CharField(max_length=200, blank=True)
+    product_image = models.CharField(max_length=255, blank=True)
     
     def __str__(self):
-        return f"{self.quantity}x {self.product.name} - {self.price} FCFA"
+        return f"{self.quantity}x {self.product_name} - {self.price} FCFA"
+    
+    def take_snapshot(self, product=None):
+        product = product or self.product
+        self.product_name = product.name
+        self.product_image = product.image.name or ''
+    
+    def save(self, *args, **kwargs):
+        if not self.product_name:
+            self.take_snapshot()
+        super().save(*args, **kwargs)
     
     @property
     def total(self):
         if self.price is None:
             return 0
         return self.quantity * self.price
+
+
+class EmailOutbox(models.Model):
+    """
+    Email à envoyer, écrit dans la même transaction que la commande.
+
+    Les lignes sont envoyées hors requête par ``manage.py send_queued_emails``.
+    """
+    KIND_CHOICES = [
+        ('order_confirmation', 'Confirmation client'),
+        ('admin_notification', 'Notification admin'),
+        ('admin_digest', 'Résumé admin'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'En attente'),
+        ('sent', 'Envoyé'),
+        ('dead', 'Abandonné'),
+    ]
+    
+    order = models.ForeignKey(Order, related_name='emails', on_delete=models.CASCADE)
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+    
+    def __str__(self):
+        return f"{self.get_kind_display()} - commande #{self.order_id} ({self.status})"
+    
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
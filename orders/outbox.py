@@ -0,0 +1,186 @@
+"""
+Boîte d'envoi transactionnelle des emails de commande.
+
+``queue_order_emails`` enregistre les emails dans la transaction de la
+commande ; ``process_outbox`` les envoie par lots sur une seule connexion
+SMTP, avec nouvelles tentatives espacées et abandon après
+``ORDER_EMAIL_MAX_ATTEMPTS`` échecs.
+
+En mode ``ADMIN_NOTIFICATION_MODE = 'digest'``, les notifications admin
+s'accumulent (``admin_digest``) et ``process_admin_digest`` les envoie en un
+seul résumé par fenêtre de temps ou par paquet de commandes.
+"""
+from datetime import timedelta
+from itertools import groupby
+from operator import attrgetter
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from ecommerce.metrics import EMAIL_FAILURES, observe_email
+from .models import EmailOutbox, OrderItem
+from .services import build_admin_digest, build_order_confirmation_email, build_order_notification_to_admin
+
+MAX_ATTEMPTS = getattr(settings, 'ORDER_EMAIL_MAX_ATTEMPTS', 5)
+RETRY_BASE_DELAY = getattr(settings, 'ORDER_EMAIL_RETRY_BASE_DELAY', 60)
+RETRY_MAX_DELAY = 6 * 3600
+# Durée pendant laquelle un lot réservé n'est pas repris par un autre worker
+LEASE_SECONDS = 300
+
+BUILDERS = {
+    'order_confirmation': build_order_confirmation_email,
+    'admin_notification': build_order_notification_to_admin,
+}
+
+
+def admin_notification_kind(order):
+    """Notification immédiate, ou place dans le prochain résumé"""
+    if settings.ADMIN_NOTIFICATION_MODE != 'digest' or order.total_amount >= settings.ADMIN_DIGEST_IMMEDIATE_AMOUNT:
+        return 'admin_notification'
+    return 'admin_digest'
+
+
+def queue_order_emails(order):
+    """Met en file la confirmation client et la notification admin"""
+    return EmailOutbox.objects.bulk_create([
+        EmailOutbox(order=order, kind='order_confirmation'),
+        EmailOutbox(order=order, kind=admin_notification_kind(order)),
+    ])
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=min(RETRY_BASE_DELAY * 2 ** (attempts - 1), RETRY_MAX_DELAY))
+
+
+def claim_batch(batch_size):
+    """Réserve un lot d'emails dus pour ce worker"""
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            EmailOutbox.objects.select_for_update(skip_locked=True)
+            .filter(status='pending', next_attempt_at__lte=now)
+            .exclude(kind='admin_digest')
+            .order_by('next_attempt_at', 'id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        EmailOutbox.objects.filter(id__in=ids).update(next_attempt_at=now + timedelta(seconds=LEASE_SECONDS))
+
+    return list(
+        EmailOutbox.objects.filter(id__in=ids)
+        .select_related('order')
+        .prefetch_related('order__items')
+        .order_by('id')
+    )
+
+
+def process_outbox(batch_size=100, max_attempts=MAX_ATTEMPTS):
+    """
+    Envoie un lot d'emails en attente et retourne ``(envoyés, échecs)``.
+
+    Tous les messages du lot partagent une connexion SMTP.
+    """
+    batch = claim_batch(batch_size)
+    if not batch:
+        return 0, 0
+
+    sent, failed = [], []
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as e:
+        failed = [(entry, e) for entry in batch]
+        for entry in batch:
+            EMAIL_FAILURES.labels(entry.kind).inc()
+    else:
+        try:
+            for entry in batch:
+                try:
+                    with observe_email(entry.kind):
+                        BUILDERS[entry.kind](entry.order, connection=connection).send(fail_silently=False)
+                    sent.append(entry.id)
+                except Exception as e:
+                    failed.append((entry, e))
+        finally:
+            connection.close()
+
+    now = timezone.now()
+    if sent:
+        EmailOutbox.objects.filter(id__in=sent).update(
+            status='sent', sent_at=now, last_error='', attempts=F('attempts') + 1)
+    record_failures(failed, now, max_attempts)
+    return len(sent), len(failed)
+
+
+def record_failures(failed, now, max_attempts):
+    """Programme une nouvelle tentative, ou abandonne, pour chaque ``(entrée, erreur)``"""
+    for entry, error in failed:
+        entry.attempts += 1
+        entry.last_error = f'{type(error).__name__}: {error}'
+        if entry.attempts >= max_attempts:
+            entry.status = 'dead'
+        else:
+            entry.next_attempt_at = now + retry_delay(entry.attempts)
+    EmailOutbox.objects.bulk_update([entry for entry, _ in failed],
+                                    ['attempts', 'last_error', 'status', 'next_attempt_at'])
+
+
+def claim_digest(now):
+    """
+    Réserve les commandes du prochain résumé : les plus anciennes, jusqu'à
+    ``ADMIN_DIGEST_MAX_ORDERS``, si ce nombre est atteint ou si la plus
+    ancienne attend depuis ``ADMIN_DIGEST_WINDOW`` secondes
+    """
+    size = settings.ADMIN_DIGEST_MAX_ORDERS
+    with transaction.atomic():
+        entries = list(
+            EmailOutbox.objects.select_for_update(skip_locked=True)
+            .filter(kind='admin_digest', status='pending', next_attempt_at__lte=now)
+            .only('id', 'order_id', 'attempts', 'created_at')
+            .order_by('id')[:size]
+        )
+        oldest = min((entry.created_at for entry in entries), default=now)
+        if not entries or (len(entries) < size and now - oldest < timedelta(seconds=settings.ADMIN_DIGEST_WINDOW)):
+            return []
+        EmailOutbox.objects.filter(id__in=[entry.id for entry in entries]).update(
+            next_attempt_at=now + timedelta(seconds=LEASE_SECONDS))
+    return entries
+
+
+def digest_orders(order_ids):
+    """Commandes du résumé avec leurs lignes (``digest_items``), en une seule requête"""
+    items = (
+        OrderItem.objects.filter(order_id__in=order_ids)
+        .select_related('order')
+        .order_by('order_id', 'id')
+    )
+    orders = []
+    for _, lines in groupby(items, key=attrgetter('order_id')):
+        lines = list(lines)
+        order = lines[0].order
+        order.digest_items = lines
+        orders.append(order)
+    return orders
+
+
+def process_admin_digest(max_attempts=MAX_ATTEMPTS):
+    """
+    Envoie le résumé admin s'il est dû et retourne ``(commandes résumées, commandes en échec)``.
+
+    En cas d'échec, toutes les commandes du résumé sont reprogrammées ensemble.
+    """
+    now = timezone.now()
+    entries = claim_digest(now)
+    if not entries:
+        return 0, 0
+    try:
+        with observe_email('admin_digest'):
+            build_admin_digest(digest_orders([entry.order_id for entry in entries])).send(fail_silently=False)
+    except Exception as e:
+        record_failures([(entry, e) for entry in entries], now, max_attempts)
+        return 0, len(entries)
+    EmailOutbox.objects.filter(id__in=[entry.id for entry in entries]).update(
+        status='sent', sent_at=now, last_error='', attempts=F('attempts') + 1)
+    return len(entries), 0
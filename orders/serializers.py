@@ -1,13 +1,75 @@
+from django.core.files.storage import default_storage
+from django.db import transaction
 from rest_framework import serializers
+from .inventory import reserve_stock
 from .models import Order, OrderItem
+from .signals import order_placed
+from products.models import Product
 from products.serializers import ProductSerializer
 
+# Relations que ?expand= peut déplier, et dépliage par défaut (compatible
+# avec l'ancien format : lignes de commande avec le produit complet)
+ORDER_EXPANSIONS = {'items', 'items.product'}
+DEFAULT_ORDER_EXPAND = frozenset(ORDER_EXPANSIONS)
+BULK_TRANSITION_MAX_IDS = 20000
+
+
+def parse_sparse_fieldsets(query_params):
+    """
+    Lit ``?fields=`` et ``?expand=`` et retourne ``(fields, expand)``.
+
+    ``fields`` vaut None quand tous les champs sont demandés. ``expand``
+    vide renvoie les en-têtes de commande sans les lignes ;
+    ``expand=items`` renvoie les lignes avec seulement l'id du produit.
+    """
+    def split(value):
+        return {part.strip() for part in value.split(',') if part.strip()}
+
+    errors = {}
+    fields = None
+    if 'fields' in query_params:
+        fields = split(query_params['fields'])
+        unknown = fields - set(OrderSerializer.Meta.fields)
+        if unknown:
+            errors['fields'] = [f"Champ inconnu : {name}" for name in sorted(unknown)]
+
+    expand = DEFAULT_ORDER_EXPAND
+    if 'expand' in query_params:
+        expand = split(query_params['expand'])
+        unknown = expand - ORDER_EXPANSIONS
+        if unknown:
+            errors['expand'] = [f"Relation inconnue : {name}" for name in sorted(unknown)]
+        if 'items.product' in expand:
+            expand.add('items')
+
+    if errors:
+        raise serializers.ValidationError(errors)
+    if fields is not None and 'items' not in fields:
+        expand = set()
+    return fields, frozenset(expand)
+
+
 class OrderItemSerializer(serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
+    product_image = serializers.SerializerMethodField()
     
     class Meta:
         model = OrderItem
-        fields = ['id', 'product', 'quantity', 'price', 'total']
+        fields = ['id', 'product', 'product_name', 'product_image', 'quantity', 'price', 'total']
+    
+    def get_product_image(self, item):
+        """URL de l'image du produit au moment de la commande"""
+        if not item.product_image:
+            return None
+        url = default_storage.url(item.product_image)
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request is not None else url
+
+    def __init__(self, *args, expand_product=True, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not expand_product:
+            # Seul l'id du produit : lu depuis product_id, sans jointure
+            self.fields['product'] = serializers.PrimaryKeyRelatedField(read_only=True)
 
 class OrderSerializer(serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
@@ -15,19 +77,50 @@ class OrderSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
         fields = ['id', 'customer_name', 'customer_email', 'customer_phone', 
-                 'customer_address', 'total_amount', 'status', 'created_at', 'items']
-        read_only_fields = ['id', 'status', 'created_at', 'items']
+                 'customer_address', 'total_amount', 'item_count', 'subtotal', 'status', 'created_at', 'items']
+        # Montants calculés par le serveur à la création : jamais modifiables
+        read_only_fields = ['id', 'total_amount', 'item_count', 'subtotal', 'status', 'created_at', 'items']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields = self.context.get('fields')
+        expand = self.context.get('expand', DEFAULT_ORDER_EXPAND)
+
+        if fields is not None:
+            for name in set(self.fields) - fields:
+                self.fields.pop(name)
+        if 'items' not in expand:
+            self.fields.pop('items', None)
+        elif 'items.product' not in expand:
+            self.fields['items'] = OrderItemSerializer(many=True, read_only=True, expand_product=False)
+
+class BulkTransitionSerializer(serializers.Serializer):
+    """Changement de statut d'un lot de commandes"""
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False,
+                                max_length=BULK_TRANSITION_MAX_IDS)
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
+
+class OrderLineSerializer(serializers.Serializer):
+    """Ligne de panier envoyée par le client ; le prix est calculé côté serveur"""
+    product_id = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1)
+
+class CartProductSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField(min_value=1)
+
+class CartLineSerializer(CartProductSerializer):
+    """Quantité d'un produit du panier ; 0 le retire"""
+    quantity = serializers.IntegerField(min_value=0)
 
 class CreateOrderSerializer(serializers.ModelSerializer):
-    items_data = serializers.ListField(
-        child=serializers.DictField(),
-        write_only=True
-    )
+    items_data = OrderLineSerializer(many=True, write_only=True, allow_empty=False)
     
     class Meta:
         model = Order
         fields = ['customer_name', 'customer_email', 'customer_phone', 
                  'customer_address', 'total_amount', 'items_data']
+        # Le total est recalculé à partir des prix des produits
+        read_only_fields = ['total_amount']
     
     def validate_customer_phone(self, value):
         """Validation optionnelle du numéro de téléphone"""
@@ -35,16 +128,35 @@ class CreateOrderSerializer(serializers.ModelSerializer):
             return None
         return value
     
+    def validate_items_data(self, value):
+        """Charge tous les produits référencés en une seule requête"""
+        self.products = Product.objects.in_bulk({line['product_id'] for line in value})
+        errors = [
+            {} if line['product_id'] in self.products
+            else {'product_id': [f"Produit introuvable : {line['product_id']}"]}
+            for line in value
+        ]
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return value
+    
     def create(self, validated_data):
-        items_data = validated_data.pop('items_data')
-        order = Order.objects.create(**validated_data)
+        lines = validated_data.pop('items_data')
+        items = []
+        for line in lines:
+            product = self.products[line['product_id']]
+            item = OrderItem(product=product, quantity=line['quantity'], price=product.price)
+            item.take_snapshot(product)
+            items.append(item)
+        validated_data['subtotal'] = validated_data['total_amount'] = sum(item.total for item in items)
+        validated_data['item_count'] = sum(item.quantity for item in items)
         
-        for item_data in items_data:
-            OrderItem.objects.create(
-                order=order,
-                product_id=item_data['product_id'],
-                quantity=item_data['quantity'],
-                price=item_data['price']
-            )
+        with transaction.atomic():
+            reserve_stock(lines)
+            order = Order.objects.create(stock_reserved=True, **validated_data)
+            for item in items:
+                item.order = order
+            OrderItem.objects.bulk_create(items)
+            order_placed.send(sender=Order, order_ids=[order.pk])
         
-        return order 
\ No newline at end of file
+        return order
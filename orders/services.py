@@ -1,11 +1,40 @@
-from django.core.mail import send_mail
+from django.core.mail import EmailMultiAlternatives
 from django.conf import settings
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
 
-def send_order_confirmation_email(order):
+from ecommerce.metrics import observe_email
+
+
+def get_from_email():
+    return settings.EMAIL_HOST_USER or 'noreply@boutique-ecommerce.com'
+
+
+def get_admin_recipients():
+    return [settings.ADMIN_EMAIL] if hasattr(settings, 'ADMIN_EMAIL') else ['admin@boutique-ecommerce.com']
+
+
+def build_email(subject, template_name, context, recipients, connection=None):
+    """Rend le template HTML et construit le message (texte + HTML)"""
+    # Générer le contenu HTML de l'email
+    html_message = render_to_string(template_name, context)
+    
+    # Version texte simple
+    plain_message = strip_tags(html_message)
+    
+    message = EmailMultiAlternatives(
+        subject=subject,
+        body=plain_message,
+        from_email=get_from_email(),
+        to=recipients,
+        connection=connection,
+    )
+    message.attach_alternative(html_message, 'text/html')
+    return message
+
+def build_order_confirmation_email(order, connection=None):
     """
-    Envoie un email de confirmation de commande
+    Construit l'email de confirmation de commande destiné au client
     """
     subject = f'Confirmation de commande #{order.id} - Boutique E-commerce'
     
@@ -16,22 +45,47 @@ def send_order_confirmation_email(order):
         'total': order.total_amount,
     }
     
-    # Générer le contenu HTML de l'email
-    html_message = render_to_string('orders/email/order_confirmation.html', context)
+    return build_email(subject, 'orders/email/order_confirmation.html', context,
+                       [order.customer_email], connection)
+
+def build_order_notification_to_admin(order, connection=None):
+    """
+    Construit la notification d'une nouvelle commande destinée à l'administrateur
+    """
+    subject = f'Nouvelle commande #{order.id} - {order.customer_name}'
     
-    # Version texte simple
-    plain_message = strip_tags(html_message)
+    context = {
+        'order': order,
+        'items': order.items.all(),
+        'total': order.total_amount,
+    }
+    
+    return build_email(subject, 'orders/email/order_notification_admin.html', context,
+                       get_admin_recipients(), connection)
+
+def build_admin_digest(orders, connection=None):
+    """
+    Construit le résumé des commandes destiné à l'administrateur ; chaque
+    commande porte ses lignes dans ``digest_items`` (voir ``outbox.digest_orders``)
+    """
+    subject = f'{len(orders)} nouvelle(s) commande(s) - Boutique E-commerce'
+    
+    context = {
+        'orders': orders,
+        'total': sum(order.total_amount for order in orders),
+    }
     
+    return build_email(subject, 'orders/email/admin_digest.html', context,
+                       get_admin_recipients(), connection)
+
+def send_order_confirmation_email(order):
+    """
+    Envoie un email de confirmation de commande
+    """
     # Envoyer l'email
     try:
-        send_mail(
-            subject=subject,
-            message=plain_message,
-            from_email=settings.EMAIL_HOST_USER or 'noreply@boutique-ecommerce.com',
-            recipient_list=[order.customer_email],
-            html_message=html_message,
-            fail_silently=False,
-        )
+        with observe_email('order_confirmation'):
+            build_order_confirmation_email(order).send(fail_silently=False)
         return True
     except Exception as e:
         print(f"Erreur lors de l'envoi de l'email: {e}")
@@ -41,27 +95,10 @@ def send_order_notification_to_admin(order):
     """
     Envoie une notification à l'administrateur pour une nouvelle commande
     """
-    subject = f'Nouvelle commande #{order.id} - {order.customer_name}'
-    
-    context = {
-        'order': order,
-        'items': order.items.all(),
-        'total': order.total_amount,
-    }
-    
-    html_message = render_to_string('orders/email/order_notification_admin.html', context)
-    plain_message = strip_tags(html_message)
-    
     try:
-        send_mail(
-            subject=subject,
-            message=plain_message,
-            from_email=settings.EMAIL_HOST_USER or 'noreply@boutique-ecommerce.com',
-            recipient_list=[settings.ADMIN_EMAIL] if hasattr(settings, 'ADMIN_EMAIL') else ['admin@boutique-ecommerce.com'],
-            html_message=html_message,
-            fail_silently=False,
-        )
+        with observe_email('admin_notification'):
+            build_order_notification_to_admin(order).send(fail_silently=False)
         return True
     except Exception as e:
         print(f"Erreur lors de l'envoi de la notification admin: {e}")
-        return False 
\ No newline at end of file
+        return False
@@ -0,0 +1,34 @@
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import Signal, receiver
+
+from ecommerce.metrics import ORDER_TRANSITIONS, ORDERS_CREATED
+
+# Envoyé quand des commandes passent de ``old_status`` à ``new_status``.
+# Arguments : order_ids, old_status, new_status
+order_status_changed = Signal()
+
+# Envoyé quand des commandes viennent d'être créées avec leurs lignes
+# (dans la même transaction). Argument : order_ids
+order_placed = Signal()
+
+
+@receiver(order_status_changed)
+def restore_stock_on_cancel(sender, order_ids, old_status, new_status, **kwargs):
+    """Remet en stock les produits des commandes annulées"""
+    if new_status == 'cancelled' and old_status != 'cancelled':
+        from .inventory import release_stock
+        release_stock(order_ids)
+
+
+@receiver(post_save, sender='orders.Order')
+def count_created_order(sender, instance, created, **kwargs):
+    if created:
+        # Compté seulement si la commande est bien enregistrée
+        transaction.on_commit(ORDERS_CREATED.labels(instance.status).inc)
+
+
+@receiver(order_status_changed)
+def count_status_change(sender, order_ids, old_status, new_status, **kwargs):
+    counter = ORDER_TRANSITIONS.labels(old_status, new_status)
+    transaction.on_commit(lambda: counter.inc(len(order_ids)))
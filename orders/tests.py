@@ -1,3 +1,962 @@
-from django.test import TestCase
+import csv
+import json
+import os
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from importlib import import_module
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, OperationalError, connection
+from django.db.models import Sum
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from products.models import Product
+from .cart import TTL, CartLimitExceeded, LocalCartStore, RedisCartStore, get_cart_store
+from .export import stream_export
+from .idempotency import cache_key
+from .inventory import InsufficientStock
+from .models import EmailOutbox, Order, OrderItem
+from .outbox import process_admin_digest, process_outbox
+from .serializers import CreateOrderSerializer
+from .signals import order_status_changed
+from .transitions import transition_orders
+
+
+def make_product(**extra):
+    defaults = {'name': 'Miel Local', 'description': 'Miel pur', 'price': Decimal('2500.00'), 'stock': 50}
+    defaults.update(extra)
+    return Product.objects.create(**defaults)
+
+
+def make_orders(count, products, items_per_order=2):
+    """Crée ``count`` commandes de ``items_per_order`` lignes chacune"""
+    orders = Order.objects.bulk_create(
+        Order(customer_name=f'Client {i}', customer_email=f'client{i}@example.com',
+              customer_address='Dakar', total_amount=Decimal('0'))
+        for i in range(count)
+    )
+    OrderItem.objects.bulk_create(
+        OrderItem(order=order, product=products[j % len(products)], quantity=1,
+                  price=products[j % len(products)].price, product_name=products[j % len(products)].name)
+        for order in orders for j in range(items_per_order)
+    )
+    return orders
+
+
+class OrderListQueryTests(APITestCase):
+    def setUp(self):
+        self.products = [make_product(name=f'Produit {i}') for i in range(3)]
+        self.url = reverse('order-list')
+
+    def assertConstantQueries(self, url, expected):
+        """``expected`` : requêtes de données, hors agrégat des validateurs (ETag)"""
+        for count in (2, 15):
+            Order.objects.all().delete()
+            make_orders(count, self.products)
+            with self.assertNumQueries(expected + 1):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['results']), count)
+        return response
+
+    def test_list_query_count_is_constant(self):
+        response = self.assertConstantQueries(self.url, 2)
+        item = response.data['results'][0]['items'][0]
+        self.assertEqual(item['product']['name'][:7], 'Produit')
+
+    def test_fields_without_items_skips_prefetch(self):
+        response = self.assertConstantQueries(self.url + '?fields=id,status,total_amount', 1)
+        self.assertEqual(set(response.data['results'][0]), {'id', 'status', 'total_amount'})
+
+    def test_expand_items_returns_product_ids(self):
+        response = self.assertConstantQueries(self.url + '?expand=items', 2)
+        item = response.data['results'][0]['items'][0]
+        self.assertIn(item['product'], {p.id for p in self.products})
+
+    def test_empty_expand_returns_headers(self):
+        response = self.assertConstantQueries(self.url + '?expand=', 1)
+        self.assertNotIn('items', response.data['results'][0])
+
+    def test_detail_query_count(self):
+        order = make_orders(1, self.products, items_per_order=5)[0]
+        # Validateurs (ETag), commande, lignes
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('order-detail', args=[order.id]))
+        self.assertEqual(len(response.data['items']), 5)
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get(self.url + '?fields=id,secret&expand=items.stock')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('fields', response.data)
+        self.assertIn('expand', response.data)
+
+    def test_writes_ignore_sparse_fieldsets(self):
+        order = make_orders(1, self.products)[0]
+        response = self.client.patch(reverse('order-detail', args=[order.id]) + '?fields=id,secret&expand=',
+                                     {'customer_phone': '770000000'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['customer_phone'], '770000000')
+        self.assertEqual(response.data['items'][0]['product']['name'][:7], 'Produit')
+
+
+class OrderConditionalGetTests(APITestCase):
+    def setUp(self):
+        self.products = [make_product(name=f'Produit {i}') for i in range(3)]
+        self.orders = make_orders(3, self.products)
+        self.urls = [reverse('order-list'), reverse('order-detail', args=[self.orders[0].id])]
+
+    def test_if_none_match_returns_304_in_one_query(self):
+        for url in self.urls:
+            response = self.client.get(url)
+            self.assertIn('Last-Modified', response)
+            with mock.patch('orders.serializers.OrderSerializer.to_representation') as serialize:
+                with self.assertNumQueries(1):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+            serialize.assert_not_called()
+            self.assertEqual(response.status_code, 304)
+
+    def test_status_change_invalidates_etag(self):
+        etags = [self.client.get(url)['ETag'] for url in self.urls]
+        self.client.post(reverse('order-confirm-order', args=[self.orders[0].id]))
+        for url, etag in zip(self.urls, etags):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_expanded_products_follow_catalog(self):
+        url = self.urls[1] + '?expand=items.product'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products[0].name = 'Renommé'
+            self.products[0].save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        # Stock des produits modifié par une autre commande
+        etag = self.client.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('order-create-order'), {
+                'customer_name': 'Awa Diop', 'customer_email': 'awa@example.com', 'customer_address': 'Dakar',
+                'items_data': [{'product_id': self.products[0].id, 'quantity': 1}],
+            }, format='json')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        # Sans les produits, la commande n'a pas changé
+        url = self.urls[1] + '?expand=items'
+        etag = self.client.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products[1].save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+
+class EmailOutboxTests(APITestCase):
+    def setUp(self):
+        self.product = make_product()
+        self.payload = {
+            'customer_name': 'Awa Diop', 'customer_email': 'awa@example.com',
+            'customer_address': 'Dakar', 'total_amount': '2500.00',
+            'items_data': [{'product_id': self.product.id, 'quantity': 1, 'price': '2500.00'}],
+        }
+
+    def create_order(self):
+        response = self.client.post(reverse('order-create-order'), self.payload, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response
+
+    def test_create_order_queues_emails_without_sending(self):
+        response = self.create_order()
+        self.assertEqual(response.data['email_status'], 'queued')
+        self.assertEqual(response.data['admin_notification_status'], 'queued')
+        self.assertEqual(len(mail.outbox), 0)
+        kinds = EmailOutbox.objects.filter(order_id=response.data['order_id']).values_list('kind', flat=True)
+        self.assertEqual(sorted(kinds), ['admin_notification', 'order_confirmation'])
+
+    def test_worker_sends_batch_over_one_connection(self):
+        for _ in range(3):
+            self.create_order()
+        with mock.patch('orders.outbox.get_connection', wraps=mail.get_connection) as get_connection:
+            self.assertEqual(process_outbox(batch_size=50), (6, 0))
+        get_connection.assert_called_once()
+        self.assertEqual(len(mail.outbox), 6)
+        self.assertIn('Miel Local', mail.outbox[0].alternatives[0][0])
+        self.assertFalse(EmailOutbox.objects.exclude(status='sent').exists())
+        self.assertEqual(process_outbox(), (0, 0))
+
+    def test_failed_emails_are_retried_then_dead_lettered(self):
+        self.create_order()
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages',
+                        side_effect=ConnectionError('SMTP indisponible')):
+            self.assertEqual(process_outbox(max_attempts=2), (0, 2))
+            entry = EmailOutbox.objects.first()
+            self.assertEqual((entry.status, entry.attempts), ('pending', 1))
+            self.assertGreater(entry.next_attempt_at, timezone.now())
+            self.assertIn('SMTP indisponible', entry.last_error)
+
+            # Pas de nouvelle tentative avant l'échéance
+            self.assertEqual(process_outbox(max_attempts=2), (0, 0))
+            EmailOutbox.objects.update(next_attempt_at=timezone.now())
+            self.assertEqual(process_outbox(max_attempts=2), (0, 2))
+        self.assertEqual(set(EmailOutbox.objects.values_list('status', flat=True)), {'dead'})
+
+    def test_management_command_drains_queue(self):
+        self.create_order()
+        out = StringIO()
+        call_command('send_queued_emails', batch_size=1, stdout=out)
+        self.assertIn('2 email(s) envoyé(s)', out.getvalue())
+        self.assertEqual(len(mail.outbox), 2)
+
+
+@override_settings(ADMIN_NOTIFICATION_MODE='digest', ADMIN_DIGEST_WINDOW=300, ADMIN_DIGEST_MAX_ORDERS=3,
+                   ADMIN_DIGEST_IMMEDIATE_AMOUNT=Decimal('10000'))
+class AdminDigestTests(APITestCase):
+    def setUp(self):
+        self.honey = make_product(stock=100)
+        self.bread = make_product(name='Pain Artisanal', price=Decimal('150.00'), stock=100)
+
+    def create_order(self, quantity=1):
+        response = self.client.post(reverse('order-create-order'), {
+            'customer_name': 'Awa Diop', 'customer_email': 'awa@example.com', 'customer_address': 'Dakar',
+            'items_data': [{'product_id': self.honey.id, 'quantity': quantity},
+                           {'product_id': self.bread.id, 'quantity': 1}],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.data['order_id']
+
+    def test_notifications_wait_for_window(self):
+        self.create_order()
+        self.assertEqual(process_outbox(), (1, 0))
+        self.assertEqual(process_admin_digest(), (0, 0))
+        EmailOutbox.objects.update(created_at=timezone.now() - timedelta(seconds=301))
+        self.assertEqual(process_admin_digest(), (1, 0))
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertIn('1 nouvelle(s) commande(s)', mail.outbox[1].subject)
+
+    def test_count_threshold_flushes_one_summary_rendered_in_one_query(self):
+        ids = [self.create_order(quantity) for quantity in (1, 2, 3, 4)]
+        mail.outbox.clear()
+        # Réservation (2 requêtes dans un savepoint), lignes des commandes (1), marquage (1)
+        with self.assertNumQueries(6):
+            self.assertEqual(process_admin_digest(), (3, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        html = mail.outbox[0].alternatives[0][0]
+        for order_id in ids[:3]:
+            self.assertIn(f'Commande #{order_id}', html)
+        self.assertNotIn(f'Commande #{ids[3]}', html)
+        self.assertIn('Pain Artisanal', html)
+        # La quatrième attend la fin de sa fenêtre
+        self.assertEqual(process_admin_digest(), (0, 0))
+
+    def test_high_value_orders_are_notified_immediately(self):
+        self.create_order(quantity=5)
+        kinds = EmailOutbox.objects.values_list('kind', flat=True)
+        self.assertEqual(sorted(kinds), ['admin_notification', 'order_confirmation'])
+        self.assertEqual(process_outbox(), (2, 0))
+
+    def test_failed_summary_is_retried(self):
+        for _ in range(3):
+            self.create_order()
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages',
+                        side_effect=ConnectionError('SMTP indisponible')):
+            self.assertEqual(process_admin_digest(), (0, 3))
+        self.assertEqual(process_admin_digest(), (0, 0))
+        EmailOutbox.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(process_admin_digest(), (3, 0))
+
+    def test_management_command_sends_summary(self):
+        for _ in range(3):
+            self.create_order()
+        out = StringIO()
+        call_command('send_queued_emails', stdout=out)
+        self.assertIn('3 email(s) envoyé(s)', out.getvalue())
+        self.assertIn('Résumé admin : 3 commande(s) envoyée(s)', out.getvalue())
+        self.assertEqual(len(mail.outbox), 4)
+
+
+class CreateOrderTests(APITestCase):
+    url = reverse('order-create-order')
+
+    def setUp(self):
+        self.products = [make_product(name=f'Produit {i}', price=Decimal(100 + i)) for i in range(60)]
+
+    def payload(self, lines):
+        return {
+            'customer_name': 'Moussa Fall', 'customer_email': 'moussa@example.com',
+            'customer_address': 'Thiès', 'total_amount': '1.00', 'items_data': lines,
+        }
+
+    def test_prices_and_total_are_computed_on_server(self):
+        lines = [{'product_id': self.products[0].id, 'quantity': 2, 'price': '1.00'},
+                 {'product_id': self.products[5].id, 'quantity': 1, 'price': '1.00'}]
+        response = self.client.post(self.url, self.payload(lines), format='json')
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get(id=response.data['order_id'])
+        self.assertEqual(order.total_amount, Decimal('305.00'))
+        self.assertEqual(response.json()['total_amount'], '305.00')
+        self.assertEqual(sorted(order.items.values_list('price', flat=True)), [Decimal('100'), Decimal('105')])
+
+    def test_amounts_cannot_be_changed_afterwards(self):
+        lines = [{'product_id': self.products[0].id, 'quantity': 2}]
+        order_id = self.client.post(self.url, self.payload(lines), format='json').data['order_id']
+        url = reverse('order-detail', args=[order_id])
+        response = self.client.patch(url, {'total_amount': '1.00', 'subtotal': '1.00', 'item_count': 9,
+                                           'customer_phone': '770000000'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        order = Order.objects.get(id=order_id)
+        self.assertEqual((order.total_amount, order.subtotal, order.item_count), (Decimal('200.00'), Decimal('200.00'), 2))
+        self.assertEqual(order.customer_phone, '770000000')
+
+    def test_query_count_does_not_grow_with_cart_size(self):
+        counts = []
+        for size in (1, 50):
+            lines = [{'product_id': p.id, 'quantity': 1} for p in self.products[:size]]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(self.url, self.payload(lines), format='json')
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(Order.objects.get(id=response.data['order_id']).items.count(), size)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_unknown_product_is_reported_per_line(self):
+        lines = [{'product_id': self.products[0].id, 'quantity': 1},
+                 {'product_id': 999999, 'quantity': 1}]
+        response = self.client.post(self.url, self.payload(lines), format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['items_data'][0], {})
+        self.assertIn('product_id', response.data['items_data'][1])
+        self.assertFalse(Order.objects.exists())
+
+    def test_invalid_quantity_and_empty_cart_are_rejected(self):
+        for lines in ([], [{'product_id': self.products[0].id, 'quantity': 0}]):
+            response = self.client.post(self.url, self.payload(lines), format='json')
+            self.assertEqual(response.status_code, 400)
+
+    def test_order_is_rolled_back_when_items_fail(self):
+        lines = [{'product_id': self.products[0].id, 'quantity': 1}]
+        with mock.patch.object(OrderItem.objects, 'bulk_create', side_effect=DatabaseError('boom')):
+            with self.assertRaises(DatabaseError):
+                self.client.post(self.url, self.payload(lines), format='json')
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(EmailOutbox.objects.exists())
+
+
+class StockReservationTests(APITestCase):
+    url = reverse('order-create-order')
+
+    def setUp(self):
+        self.honey = make_product(name='Miel Local', stock=5)
+        self.bread = make_product(name='Pain Artisanal', price=Decimal('150.00'), stock=2)
+
+    def order(self, *lines):
+        payload = {
+            'customer_name': 'Fatou Sow', 'customer_email': 'fatou@example.com', 'customer_address': 'Dakar',
+            'items_data': [{'product_id': product.id, 'quantity': quantity} for product, quantity in lines],
+        }
+        return self.client.post(self.url, payload, format='json')
+
+    def test_order_decrements_stock(self):
+        self.assertEqual(self.order((self.honey, 2), (self.bread, 1), (self.honey, 1)).status_code, 201)
+        self.honey.refresh_from_db()
+        self.bread.refresh_from_db()
+        self.assertEqual((self.honey.stock, self.bread.stock), (2, 1))
+
+    def test_order_invalidates_only_ordered_product_details(self):
+        cache.clear()
+        honey_url, bread_url = (reverse('product-detail', args=[product.id]) for product in (self.honey, self.bread))
+        self.client.get(honey_url)
+        self.client.get(bread_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order((self.honey, 2))
+        self.assertEqual(self.client.get(honey_url).data['stock'], 3)
+        with self.assertNumQueries(0):
+            self.client.get(bread_url)
+
+    def test_insufficient_stock_reports_failed_lines_and_changes_nothing(self):
+        response = self.order((self.honey, 1), (self.bread, 3))
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['items_data'][0], {})
+        self.assertIn('2 disponible', str(response.data['items_data'][1]['quantity'][0]))
+        self.honey.refresh_from_db()
+        self.assertEqual(self.honey.stock, 5)
+        self.assertFalse(Order.objects.exists())
+
+    def test_duplicate_lines_are_checked_together(self):
+        response = self.order((self.bread, 2), (self.bread, 1))
+        self.assertEqual(response.status_code, 409)
+        self.bread.refresh_from_db()
+        self.assertEqual(self.bread.stock, 2)
+
+    def test_cancel_restores_stock_once(self):
+        order_id = self.order((self.honey, 3), (self.bread, 2)).data['order_id']
+        cancel_url = reverse('order-cancel-order', args=[order_id])
+        self.assertEqual(self.client.post(cancel_url).status_code, 200)
+        self.client.post(cancel_url)
+        order = Order.objects.get(id=order_id)
+        order.status = 'pending'
+        order.save()
+        order.status = 'cancelled'
+        order.save()
+        self.honey.refresh_from_db()
+        self.bread.refresh_from_db()
+        self.assertEqual((self.honey.stock, self.bread.stock), (5, 2))
+
+    def test_cancelling_order_without_reservation_keeps_stock(self):
+        order = make_orders(1, [self.honey])[0]
+        order = Order.objects.get(id=order.id)
+        order.status = 'cancelled'
+        order.save()
+        self.honey.refresh_from_db()
+        self.assertEqual(self.honey.stock, 5)
+
+
+class ConcurrentStockTests(TransactionTestCase):
+    """Commandes simultanées sur un même produit : le stock ne devient jamais négatif"""
+
+    def test_concurrent_orders_never_oversell(self):
+        product = make_product(stock=25)
+        other = make_product(name='Pain Artisanal', stock=1000)
+        results = []
+        lock = threading.Lock()
+        start = threading.Barrier(8)
+
+        def worker(index):
+            start.wait()
+            try:
+                for attempt in range(10):
+                    quantity = 1 + (index + attempt) % 3
+                    data = {
+                        'customer_name': f'Client {index}', 'customer_email': 'client@example.com',
+                        'customer_address': 'Dakar',
+                        'items_data': [{'product_id': other.id, 'quantity': 1},
+                                       {'product_id': product.id, 'quantity': quantity}],
+                    }
+                    while True:
+                        try:
+                            serializer = CreateOrderSerializer(data=data)
+                            serializer.is_valid(raise_exception=True)
+                            serializer.save()
+                            outcome = quantity
+                        except InsufficientStock:
+                            outcome = 0
+                        except OperationalError:
+                            # SQLite en mémoire partagée : table verrouillée, on rejoue
+                            time.sleep(0.001)
+                            continue
+                        break
+                    with lock:
+                        results.append(outcome)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        product.refresh_from_db()
+        other.refresh_from_db()
+        sold = OrderItem.objects.filter(product=product).aggregate(total=Sum('quantity'))['total'] or 0
+        self.assertEqual(len(results), 80)
+        self.assertGreaterEqual(product.stock, 0)
+        self.assertEqual(sold, sum(results))
+        self.assertEqual(product.stock, 25 - sold)
+        self.assertEqual(other.stock, 1000 - Order.objects.count())
+
+
+class OrderExportTests(APITestCase):
+    def setUp(self):
+        self.products = [make_product(name=f'Produit {i}', price=Decimal('100.00')) for i in range(3)]
+        self.url = reverse('order-export')
+
+    def export(self, query=''):
+        response = self.client.get(self.url + query)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def test_csv_has_one_row_per_item(self):
+        orders = make_orders(2, self.products)
+        lines = self.export().splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['order_id', 'created_at', 'status'])
+        self.assertEqual(len(lines), 1 + 4)
+        first = lines[1].split(',')
+        self.assertEqual((first[0], first[-4], first[-3], first[-1]),
+                         (str(orders[0].id), 'Produit 0', '1', '100.00'))
+
+    def test_ndjson_format(self):
+        make_orders(1, self.products, items_per_order=3)
+        response = self.client.get(self.url + '?format=ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([row['product_name'] for row in rows], ['Produit 0', 'Produit 1', 'Produit 2'])
+        self.assertEqual(rows[0]['unit_price'], '100.00')
+
+    def test_filters_by_status_and_date(self):
+        old, recent, cancelled = make_orders(3, self.products, items_per_order=1)
+        Order.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=40))
+        Order.objects.filter(pk=cancelled.pk).update(status='cancelled')
+        since = (timezone.now() - timedelta(days=7)).date().isoformat()
+        lines = self.export(f'?created_after={since}&status=pending,confirmed').splitlines()
+        self.assertEqual([line.split(',')[0] for line in lines[1:]], [str(recent.id)])
+
+    def test_invalid_filters_are_rejected(self):
+        response = self.client.get(self.url + '?status=perdue&created_before=hier')
+        self.assertEqual(response.status_code, 400)
+        rows = dict(csv.reader(response.content.decode().splitlines()))
+        self.assertEqual(rows['status'], 'Statut inconnu : perdue')
+        self.assertNotIn('ErrorDetail', rows['created_before'])
+
+    def test_orders_are_read_in_chunks(self):
+        make_orders(5, self.products)
+        with mock.patch('orders.views.stream_export',
+                        lambda queryset, fmt: stream_export(queryset, fmt, chunk_size=2)):
+            # Un curseur sur les commandes + les lignes de chaque morceau de 2
+            with self.assertNumQueries(1 + 3):
+                content = self.export()
+        self.assertEqual(len(content.splitlines()), 1 + 10)
+
+
+class IdempotencyTests(APITestCase):
+    url = reverse('order-create-order')
+
+    def setUp(self):
+        cache.clear()
+        self.product = make_product(stock=10)
+        self.payload = {
+            'customer_name': 'Awa Diop', 'customer_email': 'awa@example.com', 'customer_address': 'Dakar',
+            'items_data': [{'product_id': self.product.id, 'quantity': 1}],
+        }
+
+    def post(self, key, payload=None):
+        return self.client.post(self.url, payload or self.payload, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_original_response_without_queries(self):
+        first = self.post('retry-1')
+        self.assertEqual(first.status_code, 201)
+        with self.assertNumQueries(0):
+            second = self.post('retry-1')
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(EmailOutbox.objects.count(), 2)
+
+    def test_distinct_keys_and_missing_key_create_orders(self):
+        self.post('a')
+        self.post('b')
+        self.client.post(self.url, self.payload, format='json')
+        self.assertEqual(Order.objects.count(), 3)
+
+    def test_key_reused_with_other_payload_is_rejected(self):
+        self.post('panier')
+        response = self.post('panier', {**self.payload, 'customer_name': 'Autre'})
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_validation_errors_are_replayed(self):
+        payload = {**self.payload, 'items_data': []}
+        self.assertEqual(self.post('vide', payload).status_code, 400)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.post('vide', payload).status_code, 400)
+
+    def test_invalid_key_is_rejected(self):
+        self.assertEqual(self.post('x' * 256).status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+    def test_concurrent_duplicate_waits_for_first_response(self):
+        first = self.post('en-cours')
+        key = cache_key('create_order', 'en-cours')
+        stored = cache.get(key)
+        # Situation d'un doublon arrivé pendant le traitement de l'original
+        cache.delete(key)
+        cache.add(f'{key}:lock', 1)
+        threading.Timer(0.1, cache.set, args=(key, stored)).start()
+        with self.assertNumQueries(0):
+            second = self.post('en-cours')
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_duplicate_gives_up_with_conflict(self):
+        key = cache_key('create_order', 'bloquee')
+        cache.add(f'{key}:lock', 1)
+        with mock.patch('orders.idempotency.LOCK_WAIT', 0.1):
+            response = self.post('bloquee')
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Order.objects.exists())
+
+
+class OrderSnapshotTests(APITestCase):
+    def setUp(self):
+        self.honey = make_product(stock=10)
+        self.bread = make_product(name='Pain Artisanal', price=Decimal('150.00'), stock=10,
+                                  image='products/pain.jpg')
+
+    def create_order(self):
+        response = self.client.post(reverse('order-create-order'), {
+            'customer_name': 'Awa Diop', 'customer_email': 'awa@example.com', 'customer_address': 'Dakar',
+            'items_data': [{'product_id': self.honey.id, 'quantity': 2}, {'product_id': self.bread.id, 'quantity': 1}],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return Order.objects.get(pk=response.data['order_id'])
+
+    def test_summary_and_snapshot_are_stored_at_creation(self):
+        order = self.create_order()
+        self.assertEqual((order.item_count, order.subtotal), (3, Decimal('5150.00')))
+        self.assertEqual(sorted(order.items.values_list('product_name', 'product_image')),
+                         [('Miel Local', ''), ('Pain Artisanal', 'products/pain.jpg')])
+
+    def test_product_edits_do_not_rewrite_history(self):
+        order = self.create_order()
+        self.bread.name = 'Pain Complet'
+        self.bread.save()
+        item = self.client.get(reverse('order-detail', args=[order.id])).data['items'][1]
+        self.assertEqual(item['product_name'], 'Pain Artisanal')
+        self.assertTrue(item['product_image'].endswith('/media/products/pain.jpg'))
+        self.assertEqual(item['product']['name'], 'Pain Complet')
+
+    def test_summary_list_is_single_table(self):
+        self.create_order()
+        # Validateurs (ETag) et page de commandes, sans les lignes
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('order-list') + '?fields=id,item_count,subtotal')
+        self.assertEqual(response.data['results'][0]['item_count'], 3)
+        self.assertEqual(response.data['results'][0]['subtotal'], '5150.00')
+
+    def test_backfill_migration(self):
+        order = self.create_order()
+        Order.objects.update(item_count=0, subtotal=0)
+        OrderItem.objects.update(product_name='', product_image='')
+        empty = Order.objects.create(customer_name='Vide', customer_email='v@example.com',
+                                     customer_address='Dakar', total_amount=0)
+        backfill = import_module('orders.migrations.0007_order_summary_item_snapshot').backfill
+        backfill(django_apps, None)
+        order.refresh_from_db()
+        self.assertEqual((order.item_count, order.subtotal), (3, Decimal('5150.00')))
+        self.assertEqual(Order.objects.get(pk=empty.pk).item_count, 0)
+        self.assertEqual(set(OrderItem.objects.values_list('product_name', flat=True)),
+                         {'Miel Local', 'Pain Artisanal'})
+
+    def test_refresh_summary(self):
+        order = self.create_order()
+        order.items.filter(product=self.honey).delete()
+        order.refresh_summary()
+        order.refresh_from_db()
+        self.assertEqual((order.item_count, order.subtotal), (1, Decimal('150.00')))
+
+
+class BulkTransitionTests(APITestCase):
+    def setUp(self):
+        self.product = make_product(stock=10)
+
+    def transition(self, ids, new_status):
+        return self.client.post(reverse('order-bulk-transition'), {'ids': ids, 'status': new_status}, format='json')
+
+    def test_outcomes_per_id(self):
+        pending, confirmed, delivered = make_orders(3, [self.product], items_per_order=1)
+        Order.objects.filter(pk=confirmed.pk).update(status='confirmed')
+        Order.objects.filter(pk=delivered.pk).update(status='delivered')
+        response = self.transition([pending.id, confirmed.id, delivered.id, 999999], 'confirmed')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['counts'], {'updated': 1, 'unchanged': 1, 'invalid': 1, 'not_found': 1})
+        self.assertEqual(response.data['results'], [
+            {'id': pending.id, 'outcome': 'updated', 'status': 'confirmed'},
+            {'id': confirmed.id, 'outcome': 'unchanged', 'status': 'confirmed'},
+            {'id': delivered.id, 'outcome': 'invalid', 'status': 'delivered'},
+            {'id': 999999, 'outcome': 'not_found', 'status': None},
+        ])
+        self.assertEqual(Order.objects.get(pk=delivered.pk).status, 'delivered')
+
+    def test_unknown_status_is_rejected(self):
+        order, = make_orders(1, [self.product])
+        self.assertEqual(self.transition([order.id], 'lost').status_code, 400)
+        self.assertEqual(self.transition([], 'confirmed').status_code, 400)
+
+    def test_signal_sent_once_per_old_status(self):
+        orders = make_orders(4, [self.product], items_per_order=1)
+        Order.objects.filter(pk__in=[orders[0].pk, orders[1].pk]).update(status='confirmed')
+        receiver = mock.Mock()
+        order_status_changed.connect(receiver)
+        self.addCleanup(order_status_changed.disconnect, receiver)
+        self.transition([order.id for order in orders], 'cancelled')
+        calls = {call.kwargs['old_status']: sorted(call.kwargs['order_ids']) for call in receiver.call_args_list}
+        self.assertEqual(calls, {'confirmed': sorted([orders[0].id, orders[1].id]),
+                                 'pending': sorted([orders[2].id, orders[3].id])})
+
+    def test_bulk_cancel_restores_stock(self):
+        make_orders(3, [self.product], items_per_order=1)
+        Order.objects.update(stock_reserved=True)
+        self.transition(list(Order.objects.values_list('id', flat=True)), 'cancelled')
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 13)
+
+    def test_query_count_does_not_grow_with_orders(self):
+        make_orders(5, [self.product])
+        with CaptureQueriesContext(connection) as small:
+            self.transition(list(Order.objects.values_list('id', flat=True)), 'confirmed')
+        make_orders(50, [self.product])
+        with CaptureQueriesContext(connection) as large:
+            self.transition(list(Order.objects.filter(status='pending').values_list('id', flat=True)), 'confirmed')
+        self.assertEqual(len(small), len(large))
+
+    def test_chunks_are_applied_separately(self):
+        orders = make_orders(5, [self.product], items_per_order=1)
+        outcomes = transition_orders([order.id for order in orders], 'confirmed', chunk_size=2)
+        self.assertEqual({outcome for outcome, _ in outcomes.values()}, {'updated'})
+        self.assertEqual(Order.objects.filter(status='confirmed').count(), 5)
+
+    def test_single_actions_validate_transitions(self):
+        order, = make_orders(1, [self.product], items_per_order=1)
+        self.assertEqual(self.client.post(reverse('order-cancel-order', args=[order.id])).status_code, 200)
+        response = self.client.post(reverse('order-confirm-order', args=[order.id]))
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Order.objects.get(pk=order.pk).status, 'cancelled')
+        self.assertEqual(self.client.post(reverse('order-confirm-order', args=[999999])).status_code, 404)
+
+
+class OrderAdminTests(APITestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'secret'))
+        self.products = [make_product(name=f'Produit {i}') for i in range(3)]
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelists_queries_do_not_grow_with_rows(self):
+        for name in ('orders_order', 'orders_orderitem'):
+            with self.subTest(name):
+                url = reverse(f'admin:{name}_changelist')
+                make_orders(5, self.products)
+                small = self.count_queries(url)
+                make_orders(95, self.products)
+                self.assertEqual(self.count_queries(url), small)
+
+    def test_change_pages_do_not_list_the_catalog(self):
+        order, = make_orders(1, self.products)
+        item = order.items.first()
+        urls = [reverse('admin:orders_order_change', args=[order.id]),
+                reverse('admin:orders_orderitem_change', args=[item.id])]
+        for url in urls:
+            self.count_queries(url)  # remplit le cache des ContentType
+        before = [self.count_queries(url) for url in urls]
+        for i in range(50):
+            make_product(name=f'Autre {i}')
+        self.assertEqual([self.count_queries(url) for url in urls], before)
+        for url in urls:
+            self.assertNotContains(self.client.get(url), 'Autre 1')
+
+    def test_status_changes_go_through_transitions(self):
+        product = make_product(stock=5)
+        order_id = self.client.post(reverse('order-create-order'), {
+            'customer_name': 'Awa Diop', 'customer_email': 'awa@example.com', 'customer_address': 'Dakar',
+            'items_data': [{'product_id': product.id, 'quantity': 2}],
+        }, format='json').data['order_id']
+        change_url = reverse('admin:orders_order_change', args=[order_id])
+        self.assertNotContains(self.client.get(change_url), 'name="status"')
+
+        url = reverse('admin:orders_order_changelist')
+        self.client.post(url, {'action': 'cancel', '_selected_action': [order_id]})
+        product.refresh_from_db()
+        self.assertEqual((Order.objects.get(pk=order_id).status, product.stock), ('cancelled', 5))
+        response = self.client.post(url, {'action': 'ship', '_selected_action': [order_id]}, follow=True)
+        self.assertContains(response, '1 commande(s) ignorée(s)')
+        self.assertEqual(Order.objects.get(pk=order_id).status, 'cancelled')
+
+    def test_orders_added_in_admin_reserve_stock(self):
+        product = make_product(stock=3)
+
+        def add_order(quantity):
+            return self.client.post(reverse('admin:orders_order_add'), {
+                'customer_name': 'Awa Diop', 'customer_email': 'awa@example.com', 'customer_phone': '',
+                'customer_address': 'Dakar', 'total_amount': '5000.00',
+                'items-TOTAL_FORMS': 1, 'items-INITIAL_FORMS': 0,
+                'items-0-product': product.id, 'items-0-quantity': quantity, 'items-0-price': '2500.00',
+            })
+
+        self.assertContains(add_order(4), '3 disponible(s)')
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(add_order(2).status_code, 302)
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 1)
+        order = Order.objects.get()
+        self.assertTrue(order.stock_reserved)
+        self.client.post(reverse('admin:orders_order_changelist'), {'action': 'cancel', '_selected_action': [order.id]})
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 3)
+
+    def test_stock_taken_after_validation_cancels_admin_order(self):
+        product = make_product(stock=3)
+        url = reverse('admin:orders_order_add')
+        data = {
+            'customer_name': 'Awa Diop', 'customer_email': 'awa@example.com', 'customer_phone': '',
+            'customer_address': 'Dakar', 'total_amount': '5000.00',
+            'items-TOTAL_FORMS': 1, 'items-INITIAL_FORMS': 0,
+            'items-0-product': product.id, 'items-0-quantity': 2, 'items-0-price': '2500.00',
+        }
+        # Une commande concurrente prend le stock entre la validation et l'enregistrement
+        with mock.patch('orders.admin.reserve_stock', side_effect=InsufficientStock):
+            response = self.client.post(url, data)
+        self.assertRedirects(response, url, fetch_redirect_response=False)
+        self.assertContains(self.client.get(url), 'Stock insuffisant')
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+
+
+class CartTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        get_cart_store().clear()
+        self.honey = make_product(stock=10)
+        self.bread = make_product(name='Pain Artisanal', price=Decimal('150.00'), stock=1)
+        self.cart_id = self.client.post(reverse('cart-list')).data['id']
+
+    def post(self, action, data=None, cart_id=None):
+        return self.client.post(reverse(f'cart-{action}', args=[cart_id or self.cart_id]), data, format='json')
+
+    def test_editing_the_cart_does_not_touch_the_database(self):
+        with self.assertNumQueries(0):
+            self.post('add-item', {'product_id': self.honey.id, 'quantity': 2})
+            self.post('add-item', {'product_id': self.honey.id, 'quantity': 1})
+            self.post('add-item', {'product_id': self.bread.id, 'quantity': 1})
+            self.post('update-item', {'product_id': self.bread.id, 'quantity': 4})
+            response = self.client.get(reverse('cart-detail', args=[self.cart_id]))
+        self.assertEqual(response.data['items'], [{'product_id': self.honey.id, 'quantity': 3},
+                                                  {'product_id': self.bread.id, 'quantity': 4}])
+        response = self.post('remove-item', {'product_id': self.honey.id})
+        self.assertEqual(response.data['items'], [{'product_id': self.bread.id, 'quantity': 4}])
+        response = self.post('update-item', {'product_id': self.bread.id, 'quantity': 0})
+        self.assertEqual(response.data['items'], [])
+
+    def test_unknown_cart_and_limits(self):
+        self.assertEqual(self.post('add-item', {'product_id': 1, 'quantity': 1}, cart_id='inconnu').status_code, 404)
+        self.assertEqual(self.client.get(reverse('cart-quote', args=['inconnu'])).status_code, 404)
+        self.assertEqual(self.post('add-item', {'product_id': 1, 'quantity': 0}).status_code, 400)
+        response = self.post('add-item', {'product_id': self.honey.id, 'quantity': 1001})
+        self.assertEqual(response.status_code, 400)
+        self.client.delete(reverse('cart-detail', args=[self.cart_id]))
+        self.assertEqual(self.client.get(reverse('cart-detail', args=[self.cart_id])).status_code, 404)
+
+    def test_ttl_slides_on_each_access(self):
+        store = get_cart_store()
+        with mock.patch('orders.cart.time.monotonic', return_value=0):
+            cart_id = store.create()
+        with mock.patch('orders.cart.time.monotonic', return_value=TTL - 1):
+            self.assertEqual(store.items(cart_id), {})
+        with mock.patch('orders.cart.time.monotonic', return_value=TTL + 1):
+            self.assertEqual(store.items(cart_id), {})
+        with mock.patch('orders.cart.time.monotonic', return_value=3 * TTL):
+            self.assertIsNone(store.items(cart_id))
+
+    def test_quote_prices_every_line_in_one_query(self):
+        self.post('add-item', {'product_id': self.honey.id, 'quantity': 2})
+        self.post('add-item', {'product_id': self.bread.id, 'quantity': 2})
+        self.post('add-item', {'product_id': 999999, 'quantity': 1})
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('cart-quote', args=[self.cart_id]))
+        self.assertEqual(response.data['subtotal'], '5300.00')
+        self.assertEqual(response.data['item_count'], 4)
+        self.assertFalse(response.data['ready'])
+        self.assertEqual([(line['product_id'], line['available']) for line in response.data['lines']],
+                         [(self.honey.id, True), (self.bread.id, False), (999999, False)])
+        self.assertEqual(response.data['lines'][0]['line_total'], '5000.00')
+
+    def test_checkout_places_the_order_once(self):
+        self.post('add-item', {'product_id': self.honey.id, 'quantity': 2})
+        customer = {'customer_name': 'Awa Diop', 'customer_email': 'awa@example.com', 'customer_address': 'Dakar'}
+        response = self.post('checkout', customer)
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get(pk=response.data['order_id'])
+        self.assertEqual((order.total_amount, order.item_count), (Decimal('5000.00'), 2))
+        self.assertIsNone(get_cart_store().items(self.cart_id))
+
+        retry = self.post('checkout', customer)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.data['order_id'], order.id)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_failed_checkout_keeps_the_cart(self):
+        customer = {'customer_name': 'Awa Diop', 'customer_email': 'awa@example.com', 'customer_address': 'Dakar'}
+        self.assertEqual(self.post('checkout', customer).status_code, 400)
+        self.post('add-item', {'product_id': self.bread.id, 'quantity': 2})
+        response = self.post('checkout', customer)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(get_cart_store().items(self.cart_id), {self.bread.id: 2})
+        self.post('update-item', {'product_id': self.bread.id, 'quantity': 1})
+        self.assertEqual(self.post('checkout', {}).status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+
+class CartStoreBehaviour:
+    """Comportement commun aux deux paniers ; ``make_store()`` fournit le panier testé"""
+
+    def setUp(self):
+        self.store = self.make_store()
+        self.cart_id = self.store.create()
+        self.addCleanup(self.store.delete, self.cart_id)
+
+    @mock.patch('orders.cart.MAX_LINES', 2)
+    def test_line_limit_counts_products_only(self):
+        self.store.change(self.cart_id, 1, 1)
+        self.assertEqual(self.store.change(self.cart_id, 2, 1, add=True), {1: 1, 2: 1})
+        with self.assertRaises(CartLimitExceeded):
+            self.store.change(self.cart_id, 3, 1)
+        # Produits déjà présents : modifiables à la limite
+        self.assertEqual(self.store.change(self.cart_id, 2, 4), {1: 1, 2: 4})
+        self.store.change(self.cart_id, 1, 0)
+        self.assertEqual(self.store.change(self.cart_id, 3, 1), {2: 4, 3: 1})
+
+    @mock.patch('orders.cart.MAX_QUANTITY', 5)
+    def test_quantity_limit_leaves_line_unchanged(self):
+        self.store.change(self.cart_id, 1, 5)
+        for quantity, add in ((1, True), (6, False)):
+            with self.assertRaises(CartLimitExceeded):
+                self.store.change(self.cart_id, 1, quantity, add=add)
+        self.assertEqual(self.store.items(self.cart_id), {1: 5})
+
+    def test_removing_lines_keeps_the_cart(self):
+        self.store.change(self.cart_id, 1, 3)
+        self.assertEqual(self.store.change(self.cart_id, 1, -3, add=True), {})
+        self.assertEqual(self.store.change(self.cart_id, 2, 0), {})
+        self.assertEqual(self.store.items(self.cart_id), {})
+
+    def test_unknown_and_deleted_carts(self):
+        self.assertIsNone(self.store.change('inconnu', 1, 1))
+        self.assertIsNone(self.store.items('inconnu'))
+        self.store.delete(self.cart_id)
+        self.assertIsNone(self.store.change(self.cart_id, 1, 1))
+        self.assertIsNone(self.store.items(self.cart_id))
+
+
+class LocalCartStoreTests(CartStoreBehaviour, SimpleTestCase):
+    def make_store(self):
+        return LocalCartStore()
+
+
+# Serveur Redis jetable : REDIS_TEST_URL=redis://localhost:6379/15 python manage.py test orders
+@skipUnless(os.environ.get('REDIS_TEST_URL'), 'REDIS_TEST_URL non défini')
+class RedisCartStoreTests(CartStoreBehaviour, SimpleTestCase):
+    def make_store(self):
+        settings = override_settings(REDIS_URL=os.environ['REDIS_TEST_URL'])
+        settings.enable()
+        self.addCleanup(settings.disable)
+        return RedisCartStore()
+
+    def test_reads_and_changes_push_back_expiry(self):
+        from ecommerce.redis import get_redis
+
+        key = self.store.key(self.cart_id)
+        for access in (lambda: self.store.items(self.cart_id), lambda: self.store.change(self.cart_id, 1, 1)):
+            get_redis().expire(key, 10)
+            access()
+            self.assertGreater(get_redis().ttl(key), TTL - 5)
@@ -0,0 +1,102 @@
+"""
+Changements de statut des commandes, validés par une machine à états.
+
+``transition_orders`` traite des milliers de commandes par paquets : une
+lecture verrouillée des statuts actuels, puis un seul
+``UPDATE ... WHERE id IN (...) AND status IN (<statuts de départ autorisés>)``
+par paquet. Les effets de bord (stock, agrégats, métriques) passent par
+``order_status_changed``, envoyé une fois par statut de départ et par paquet.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .models import Order
+from .signals import order_status_changed
+
+# Statut actuel -> statuts suivants autorisés
+TRANSITIONS = {
+    'pending': {'confirmed', 'cancelled'},
+    'confirmed': {'shipped', 'cancelled'},
+    'shipped': {'delivered'},
+    'delivered': set(),
+    'cancelled': set(),
+}
+
+UPDATED = 'updated'
+UNCHANGED = 'unchanged'
+INVALID = 'invalid'
+NOT_FOUND = 'not_found'
+
+CHUNK_SIZE = 1000
+
+
+class InvalidTransition(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Changement de statut impossible.'
+    default_code = 'invalid_transition'
+
+
+def sources(new_status):
+    """Statuts à partir desquels ``new_status`` est atteignable"""
+    return {old for old, targets in TRANSITIONS.items() if new_status in targets}
+
+
+def transition_orders(order_ids, new_status, chunk_size=CHUNK_SIZE):
+    """
+    Passe les commandes ``order_ids`` au statut ``new_status`` quand la
+    machine à états le permet.
+
+    Retourne ``{id: (résultat, statut actuel)}`` ; le résultat vaut
+    ``updated``, ``unchanged`` (déjà dans ce statut), ``invalid`` (changement
+    interdit depuis le statut actuel) ou ``not_found``. Chaque paquet est
+    appliqué dans sa propre transaction.
+    """
+    allowed = sources(new_status)
+    order_ids = list(dict.fromkeys(order_ids))
+    outcomes = {}
+    for start in range(0, len(order_ids), chunk_size):
+        chunk = order_ids[start:start + chunk_size]
+        with transaction.atomic():
+            current = dict(
+                Order.objects.select_for_update().filter(id__in=chunk).values_list('id', 'status')
+            )
+            moved = defaultdict(list)
+            for order_id in chunk:
+                old_status = current.get(order_id)
+                if old_status is None:
+                    outcomes[order_id] = (NOT_FOUND, None)
+                elif old_status == new_status:
+                    outcomes[order_id] = (UNCHANGED, old_status)
+                elif old_status in allowed:
+                    moved[old_status].append(order_id)
+                    outcomes[order_id] = (UPDATED, new_status)
+                else:
+                    outcomes[order_id] = (INVALID, old_status)
+            if not moved:
+                continue
+            Order.objects.filter(
+                id__in=[order_id for ids in moved.values() for order_id in ids], status__in=allowed,
+            ).update(status=new_status, updated_at=timezone.now())
+            for old_status, ids in moved.items():
+                order_status_changed.send(sender=Order, order_ids=ids, old_status=old_status,
+                                          new_status=new_status)
+    return outcomes
+
+
+def transition_order(order_id, new_status):
+    """
+    Une seule commande ; lève ``Order.DoesNotExist`` ou ``InvalidTransition``.
+    Retourne True si le statut a changé.
+    """
+    outcome, current = transition_orders([order_id], new_status)[order_id]
+    if outcome == NOT_FOUND:
+        raise Order.DoesNotExist
+    if outcome == INVALID:
+        labels = dict(Order.STATUS_CHOICES)
+        raise InvalidTransition(f'Une commande « {labels[current]} » ne peut pas passer '
+                                f'au statut « {labels[new_status]} ».')
+    return outcome == UPDATED
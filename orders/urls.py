@@ -1,9 +1,10 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import OrderViewSet
+from .views import CartViewSet, OrderViewSet
 
 router = DefaultRouter()
 router.register(r'orders', OrderViewSet)
+router.register(r'carts', CartViewSet, basename='cart')
 
 urlpatterns = [
     path('', include(router.urls)),
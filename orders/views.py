@@ -1,54 +1,269 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Prefetch
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import render
+from django.utils import timezone
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
+from ecommerce.conditional import conditional_response, queryset_validators
+from products.cache import get_catalog_version, get_stock_version
 from .models import Order, OrderItem
-from .serializers import OrderSerializer, CreateOrderSerializer
-from .services import send_order_confirmation_email, send_order_notification_to_admin
+from .serializers import (BulkTransitionSerializer, CartLineSerializer, CartProductSerializer, OrderLineSerializer,
+                          OrderSerializer, CreateOrderSerializer, DEFAULT_ORDER_EXPAND, parse_sparse_fieldsets)
+from .transitions import transition_order, transition_orders
+from .outbox import queue_order_emails
+from .export import CSVRenderer, NDJSONRenderer, OrderExportFilterSerializer, stream_export
+from .idempotency import KEY_TTL, idempotent
+from .cart import get_cart_store, order_lines, quote
+
+CUSTOMER_FIELDS = ('customer_name', 'customer_email', 'customer_phone', 'customer_address')
+CHECKOUT_LOCK_TIMEOUT = 30
 
 # Create your views here.
 
+def place_order(data):
+    """Crée une commande à partir de ``data`` (coordonnées du client et ``items_data``)"""
+    serializer = CreateOrderSerializer(data=data)
+    if serializer.is_valid():
+        with transaction.atomic():
+            order = serializer.save()
+            
+            # Emails client et admin envoyés hors requête (send_queued_emails)
+            queue_order_emails(order)
+        
+        response_data = {
+            'message': 'Commande créée avec succès !',
+            'order_id': order.id,
+            # Décimaux en chaînes, comme dans les serializers
+            'total_amount': str(order.total_amount),
+            'status': 'success',
+            'email_status': 'queued',
+            'admin_notification_status': 'queued'
+        }
+        
+        return Response(response_data, status=status.HTTP_201_CREATED)
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
 class OrderViewSet(viewsets.ModelViewSet):
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
+    # Actions qui renvoient des commandes sérialisées avec leurs lignes
+    serialized_actions = ('list', 'retrieve', 'update', 'partial_update')
+    # Seules les lectures acceptent ?fields= et ?expand= ; les écritures
+    # renvoient toujours la commande complète
+    sparse_actions = ('list', 'retrieve', 'export')
+    
+    def get_sparse_fieldsets(self):
+        """Champs (?fields=) et relations (?expand=) demandés, lus une seule fois"""
+        if not hasattr(self, '_sparse_fieldsets'):
+            if self.action in self.sparse_actions:
+                self._sparse_fieldsets = parse_sparse_fieldsets(self.request.query_params)
+            else:
+                self._sparse_fieldsets = (None, DEFAULT_ORDER_EXPAND)
+        return self._sparse_fieldsets
+    
+    def get_items_prefetch(self):
+        """Préchargement des lignes (et de leurs produits) demandé par ?expand="""
+        _, expand = self.get_sparse_fieldsets()
+        if 'items' not in expand:
+            return None
+        items = OrderItem.objects.all()
+        if 'items.product' in expand:
+            items = items.select_related('product')
+        return Prefetch('items', queryset=items)
+    
+    def get_queryset(self):
+        """Précharge les lignes (et leurs produits) en une requête pour toute la page"""
+        queryset = super().get_queryset()
+        prefetch = self.get_items_prefetch() if self.action in self.serialized_actions else None
+        if prefetch is not None:
+            queryset = queryset.prefetch_related(prefetch)
+        return queryset
+    
+    def conditional(self, request, queryset, build):
+        """GET conditionnel ; avec ?expand=items.product, l'ETag suit aussi les versions du catalogue et du stock"""
+        _, expand = self.get_sparse_fieldsets()
+        extra = (get_catalog_version(), get_stock_version()) if 'items.product' in expand else ()
+        return conditional_response(request, queryset_validators(queryset), build, *extra)
+    
+    def list(self, request, *args, **kwargs):
+        return self.conditional(request, self.filter_queryset(Order.objects.all()),
+                                lambda: super(OrderViewSet, self).list(request, *args, **kwargs))
+    
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            queryset = Order.objects.filter(pk=kwargs['pk'])
+        except ValueError:
+            return super().retrieve(request, *args, **kwargs)
+        return self.conditional(request, queryset, lambda: super(OrderViewSet, self).retrieve(request, *args, **kwargs))
+    
+    def update(self, request, *args, **kwargs):
+        # Comme UpdateModelMixin.update, sans vider le préchargement : les
+        # lignes sont en lecture seule ici et restent valides
+        partial = kwargs.pop('partial', False)
+        instance = self.get_object()
+        serializer = self.get_serializer(instance, data=request.data, partial=partial)
+        serializer.is_valid(raise_exception=True)
+        self.perform_update(serializer)
+        return Response(serializer.data)
+    
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fields'], context['expand'] = self.get_sparse_fieldsets()
+        return context
     
     def get_serializer_class(self):
         if self.action == 'create':
             return CreateOrderSerializer
         return OrderSerializer
     
+    @action(detail=False, methods=['get'], renderer_classes=[CSVRenderer, NDJSONRenderer])
+    def export(self, request):
+        """Exporter les commandes en flux (CSV par défaut, ?format=ndjson)"""
+        filters = OrderExportFilterSerializer(data=request.query_params)
+        filters.is_valid(raise_exception=True)
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            stream_export(filters.filter(Order.objects.all()), renderer.format),
+            content_type=f'{renderer.media_type}; charset=utf-8',
+        )
+        filename = f"commandes-{timezone.now():%Y%m%d-%H%M%S}.{renderer.format}"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+    
     @action(detail=False, methods=['post'])
+    @idempotent('create_order')
     def create_order(self, request):
-        """Créer une nouvelle commande"""
-        serializer = CreateOrderSerializer(data=request.data)
-        if serializer.is_valid():
-            order = serializer.save()
-            
-            # Envoyer l'email de confirmation au client
-            email_sent = send_order_confirmation_email(order)
-            
-            # Envoyer la notification à l'admin
-            admin_notification_sent = send_order_notification_to_admin(order)
-            
-            response_data = {
-                'message': 'Commande créée avec succès !',
-                'order_id': order.id,
-                'status': 'success',
-                'email_sent': email_sent,
-                'admin_notification_sent': admin_notification_sent
-            }
-            
-            return Response(response_data, status=status.HTTP_201_CREATED)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        """Créer une nouvelle commande (en-tête Idempotency-Key pour les nouvelles tentatives)"""
+        return place_order(request.data)
+    
+    def transition(self, pk, new_status):
+        """Change le statut d'une commande sans la charger ni la réécrire entièrement"""
+        try:
+            transition_order(int(pk), new_status)
+        except (Order.DoesNotExist, ValueError):
+            raise Http404
+    
+    @action(detail=False, methods=['post'], url_path='transition', url_name='bulk-transition')
+    def bulk_transition(self, request):
+        """Changer le statut d'un lot de commandes : {"ids": [...], "status": "shipped"}"""
+        serializer = BulkTransitionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        new_status = serializer.validated_data['status']
+        outcomes = transition_orders(serializer.validated_data['ids'], new_status)
+        counts = dict.fromkeys(['updated', 'unchanged', 'invalid', 'not_found'], 0)
+        results = []
+        for order_id, (outcome, current) in outcomes.items():
+            counts[outcome] += 1
+            results.append({'id': order_id, 'outcome': outcome, 'status': current})
+        return Response({'status': new_status, 'counts': counts, 'results': results})
     
     @action(detail=True, methods=['post'])
     def confirm_order(self, request, pk=None):
         """Confirmer une commande"""
-        order = self.get_object()
-        order.status = 'confirmed'
-        order.save()
+        self.transition(pk, 'confirmed')
         return Response({
             'message': 'Commande confirmée avec succès !',
-            'order_id': order.id,
+            'order_id': int(pk),
             'status': 'confirmed'
         })
+    
+    @action(detail=True, methods=['post'])
+    def cancel_order(self, request, pk=None):
+        """Annuler une commande et remettre ses produits en stock"""
+        self.transition(pk, 'cancelled')
+        return Response({
+            'message': 'Commande annulée.',
+            'order_id': int(pk),
+            'status': 'cancelled'
+        })
+
+
+class CartViewSet(viewsets.ViewSet):
+    """
+    Panier côté serveur (voir cart.py). L'identifiant, tiré au hasard à la
+    création, sert de jeton d'accès au panier.
+    """
+    lookup_value_regex = '[A-Za-z0-9_-]+'
+    # La validation crée une commande : même limite que POST /orders/create_order/
+    throttle_scopes = {'checkout': 'order.create_order'}
+    
+    def get_items(self, pk):
+        items = get_cart_store().items(pk)
+        if items is None:
+            raise NotFound('Panier introuvable ou expiré.')
+        return items
+    
+    def cart_response(self, pk, items, status_code=status.HTTP_200_OK):
+        return Response({'id': pk, 'items': order_lines(items)}, status=status_code)
+    
+    def change(self, pk, serializer_class, data, quantity=None, add=False):
+        serializer = serializer_class(data=data)
+        serializer.is_valid(raise_exception=True)
+        line = serializer.validated_data
+        items = get_cart_store().change(pk, line['product_id'], line.get('quantity', quantity), add)
+        if items is None:
+            raise NotFound('Panier introuvable ou expiré.')
+        return self.cart_response(pk, items)
+    
+    def create(self, request):
+        """Créer un panier vide"""
+        return self.cart_response(get_cart_store().create(), {}, status.HTTP_201_CREATED)
+    
+    def retrieve(self, request, pk=None):
+        """Contenu du panier, sans accès à la base"""
+        return self.cart_response(pk, self.get_items(pk))
+    
+    def destroy(self, request, pk=None):
+        get_cart_store().delete(pk)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    
+    @action(detail=True, methods=['post'])
+    def add_item(self, request, pk=None):
+        """Ajouter un produit : {"product_id": 3, "quantity": 2}, ajoutée à la quantité existante"""
+        return self.change(pk, OrderLineSerializer, request.data, add=True)
+    
+    @action(detail=True, methods=['post'])
+    def update_item(self, request, pk=None):
+        """Fixer la quantité d'un produit : {"product_id": 3, "quantity": 5} (0 le retire)"""
+        return self.change(pk, CartLineSerializer, request.data)
+    
+    @action(detail=True, methods=['post'])
+    def remove_item(self, request, pk=None):
+        """Retirer un produit : {"product_id": 3}"""
+        return self.change(pk, CartProductSerializer, request.data, quantity=0)
+    
+    @action(detail=True, methods=['get'])
+    def quote(self, request, pk=None):
+        """Prix actuels des produits du panier et sous-total"""
+        return Response({'id': pk, **quote(self.get_items(pk))})
+    
+    @action(detail=True, methods=['post'])
+    def checkout(self, request, pk=None):
+        """
+        Passer commande avec le contenu du panier (coordonnées du client dans
+        le corps), puis supprimer le panier. Une nouvelle tentative après
+        succès reçoit la même réponse, sans nouvelle commande.
+        """
+        placed_key, lock_key = f'orders:cart:{pk}:order', f'orders:cart:{pk}:checkout'
+        placed = cache.get(placed_key)
+        if placed is not None:
+            return Response(placed, status=status.HTTP_201_CREATED, headers={'Idempotent-Replayed': 'true'})
+        if not cache.add(lock_key, 1, CHECKOUT_LOCK_TIMEOUT):
+            return Response({'detail': 'Commande de ce panier déjà en cours.'},
+                            status=status.HTTP_409_CONFLICT, headers={'Retry-After': '1'})
+        try:
+            items = self.get_items(pk)
+            if not items:
+                return Response({'detail': 'Le panier est vide.'}, status=status.HTTP_400_BAD_REQUEST)
+            customer = {field: request.data[field] for field in CUSTOMER_FIELDS if field in request.data}
+            response = place_order({**customer, 'items_data': order_lines(items)})
+            if response.status_code == status.HTTP_201_CREATED:
+                cache.set(placed_key, response.data, KEY_TTL)
+                get_cart_store().delete(pk)
+            return response
+        finally:
+            cache.delete(lock_key)
@@ -1,16 +1,43 @@
 from django.contrib import admin
+from django.core.files.storage import default_storage
+from django.utils.html import format_html
+from ecommerce.admin_pagination import EstimatedCountPaginator
 from .models import Product
+from .search import filter_by_search
+
+
+class StockRangeFilter(admin.SimpleListFilter):
+    """Tranches de stock fixes, plutôt que la liste de toutes les valeurs distinctes"""
+    title = 'stock'
+    parameter_name = 'stock_range'
+    RANGES = {
+        'out': ('Épuisé', {'stock': 0}),
+        'low': ('1 à 10', {'stock__range': (1, 10)}),
+        'medium': ('11 à 100', {'stock__range': (11, 100)}),
+        'high': ('Plus de 100', {'stock__gt': 100}),
+    }
+    
+    def lookups(self, request, model_admin):
+        return [(key, label) for key, (label, _) in self.RANGES.items()]
+    
+    def queryset(self, request, queryset):
+        if self.value() in self.RANGES:
+            return queryset.filter(**self.RANGES[self.value()][1])
+        return queryset
+
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
     list_display = ['name', 'price', 'stock', 'image_preview', 'created_at']
-    list_filter = ['created_at', 'stock']
+    list_filter = ['created_at', StockRangeFilter]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     search_fields = ['name', 'description']
     readonly_fields = ['created_at', 'updated_at', 'image_preview']
     
     fieldsets = (
         ('Informations de base', {
-            'fields': ('name', 'description', 'price', 'stock')
+            'fields': ('sku', 'name', 'description', 'price', 'stock')
         }),
         ('Image', {
             'fields': ('image', 'image_preview'),
@@ -22,9 +49,17 @@ class ProductAdmin(admin.ModelAdmin):
         }),
     )
     
+    def get_search_results(self, request, queryset, search_term):
+        """Utilise l'index plein texte au lieu de LIKE '%...%' sur chaque ligne"""
+        if not search_term.strip():
+            return queryset, False
+        return filter_by_search(queryset, search_term), False
+    
     def image_preview(self, obj):
         if obj.image:
-            return f'<img src="{obj.image.url}" style="max-height: 50px; max-width: 50px;" />'
+            # Miniature générée si disponible, plutôt que l'original pleine taille
+            thumbnail = obj.image_variants.get('thumbnail')
+            url = default_storage.url(thumbnail['jpeg']) if thumbnail else obj.image.url
+            return format_html('<img src="{}" style="max-height: 50px; max-width: 50px;" />', url)
         return "Aucune image"
     image_preview.short_description = 'Aperçu'
-    image_preview.allow_tags = True
@@ -0,0 +1,182 @@
+"""
+Vues async du catalogue (liste, détail, ``available``), servies sous ASGI.
+
+Elles rendent exactement les mêmes réponses que ``ProductViewSet`` (même
+sérialiseur, même pagination, mêmes clés de cache) mais n'occupent pas de
+thread pendant les accès au cache et à la base : un processus ASGI peut
+ainsi garder des milliers de lectures en vol. Les autres méthodes HTTP
+sur ces URLs sont déléguées aux vues synchrones de ``ProductViewSet``.
+
+Le flux SSE des changements de stock et de prix (``product_stream``) n'est
+servi que sous ASGI : une connexion ouverte n'y coûte pas de thread.
+
+Branchement : ``ecommerce.asgi`` sert ces vues via ``ecommerce.asgi_urls`` ;
+sous WSGI, rien ne change.
+"""
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.urls import resolve
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import APIException
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from ecommerce.conditional import aqueryset_validators, check_conditional, set_validators
+from .cache import acatalog_cache_key, aget_or_build
+from .models import Product
+from .serializers import ProductSerializer
+from .stream import RESET, get_broker
+
+KEEPALIVE = getattr(settings, 'PRODUCT_STREAM_KEEPALIVE', 15)
+# Délai de reconnexion suggéré aux clients (millisecondes)
+RETRY_MS = 3000
+
+READ_METHODS = ('GET', 'HEAD')
+
+
+def json_response(data, status=200):
+    return HttpResponse(JSONRenderer().render(data), status=status, content_type='application/json')
+
+
+def serialize(products, request, many=False):
+    return ProductSerializer(products, many=many, context={'request': request}).data
+
+
+async def delegate_to_sync(request, *args, **kwargs):
+    """Écritures et autres méthodes : vue DRF synchrone de la même URL"""
+    match = resolve(request.path_info, urlconf='ecommerce.urls')
+    # Le rendu de la réponse DRF est fait ensuite par le handler, comme pour toute vue
+    return await sync_to_async(match.func)(request, *match.args, **match.kwargs)
+
+
+def catalog_view(name, queryset):
+    """
+    Lecture async en cache ; ``name`` est le nom d'action de la vue synchrone
+    (clé de cache partagée), ``queryset(*args, **kwargs)`` les produits
+    affichés, pour les GET conditionnels (mêmes ETag que la vue synchrone).
+    """
+    def decorator(build):
+        async def view(request, *args, **kwargs):
+            if request.method not in READ_METHODS:
+                return await delegate_to_sync(request, *args, **kwargs)
+            drf_request = Request(request)
+            try:
+                key = await acatalog_cache_key(request, name, kwargs.get('pk'))
+                validators = await aget_or_build(f'{key}:validators',
+                                                 lambda: aqueryset_validators(queryset(*args, **kwargs)))
+                etag, last_modified, not_modified = check_conditional(request, validators)
+                if not_modified is not None:
+                    return not_modified
+                data = await aget_or_build(key, lambda: build(drf_request, *args, **kwargs))
+            except APIException as e:
+                return json_response({'detail': e.detail}, status=e.status_code)
+            except Http404:
+                return json_response({'detail': 'No Product matches the given query.'}, status=404)
+            return set_validators(json_response(data), etag, last_modified)
+        view.__name__ = view.__qualname__ = build.__name__
+        view.__doc__ = build.__doc__
+        # Comme les vues DRF : le CSRF est vérifié par DRF pour les écritures déléguées
+        return csrf_exempt(view)
+    return decorator
+
+
+async def paginate(queryset, request):
+    paginator = api_settings.DEFAULT_PAGINATION_CLASS()
+    if paginator.use_offset(request):
+        # ?page=N : pagination classique (COUNT + OFFSET), gardée synchrone
+        page = await sync_to_async(paginator.paginate_queryset)(queryset, request)
+    else:
+        rows = [product async for product in paginator.get_page_queryset(queryset, request).aiterator()]
+        page = paginator.paginate_rows(rows)
+    return paginator.get_paginated_response(serialize(page, request, many=True)).data
+
+
+@catalog_view('list', lambda: Product.objects.all())
+async def product_list(request):
+    """Liste paginée des produits"""
+    return await paginate(Product.objects.all(), request)
+
+
+@catalog_view('available', lambda: Product.objects.filter(stock__gt=0))
+async def product_available(request):
+    """Produits en stock"""
+    return await paginate(Product.objects.filter(stock__gt=0), request)
+
+
+@catalog_view('retrieve', lambda pk: Product.objects.filter(pk=pk))
+async def product_detail(request, pk):
+    """Détail d'un produit"""
+    try:
+        product = await Product.objects.aget(pk=pk)
+    except (Product.DoesNotExist, ValueError):
+        raise Http404
+    return serialize(product, request)
+
+
+def format_event(event):
+    lines = [] if event['id'] is None else [f'id: {event["id"]}']
+    lines += [f'event: {event["event"]}', f'data: {json.dumps(event["data"], separators=(",", ":"))}']
+    return '\n'.join(lines) + '\n\n'
+
+
+def last_event_id(request):
+    value = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+
+async def event_stream(broker, subscription, last_id):
+    try:
+        yield f'retry: {RETRY_MS}\n\n'
+        if last_id is not None:
+            missed, current = await broker.since(last_id)
+            if missed is None:
+                missed = [{'id': current, 'event': RESET, 'data': {}}]
+            for event in missed:
+                yield format_event(event)
+                last_id = event['id']
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.get(), KEEPALIVE)
+            except asyncio.TimeoutError:
+                # Commentaire SSE : garde la connexion ouverte à travers les proxys
+                yield ': ping\n\n'
+                continue
+            if subscription.overflowed:
+                # Client trop lent : des événements ont été perdus
+                subscription.overflowed = False
+                event = {'id': None, 'event': RESET, 'data': {}}
+            elif event['id'] is not None:
+                if last_id is not None and event['id'] <= last_id:
+                    # Déjà envoyé depuis l'historique
+                    continue
+                last_id = event['id']
+            yield format_event(event)
+    finally:
+        broker.unsubscribe(subscription)
+
+
+async def product_stream(request):
+    """
+    Flux SSE des changements de stock et de prix. Se connecter au flux avant
+    de charger le catalogue ; à la reconnexion, ``Last-Event-ID`` (envoyé par
+    ``EventSource``) ou ``?last_event_id=`` rejoue les événements manqués.
+    """
+    if request.method != 'GET':
+        return json_response({'detail': f'Méthode « {request.method} » non autorisée.'}, status=405)
+    broker = get_broker()
+    # Abonné avant de lire l'historique : aucun événement ne passe entre les deux
+    subscription = broker.subscribe()
+    response = StreamingHttpResponse(event_stream(broker, subscription, last_event_id(request)),
+                                     content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Pas de mise en tampon par nginx
+    response['X-Accel-Buffering'] = 'no'
+    return response
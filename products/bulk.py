@@ -0,0 +1,180 @@
+"""
+Import et export en masse du catalogue.
+
+Les fichiers (CSV ou JSON Lines) sont lus et écrits en flux : la mémoire
+utilisée dépend de la taille d'un lot, pas de celle du fichier. Les lignes
+sont insérées ou mises à jour par lots, par la référence ``sku`` :
+``INSERT ... ON CONFLICT (sku) DO UPDATE`` via ``bulk_create``, ou ``COPY``
+dans une table temporaire sur PostgreSQL.
+"""
+import csv
+import io
+import json
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from .cache import bump_catalog_version
+from .models import Product
+from .stream import publish_reset
+
+FIELDS = ['sku', 'name', 'description', 'price', 'stock']
+UPDATE_FIELDS = ['name', 'description', 'price', 'stock', 'updated_at']
+
+
+class RowError(ValueError):
+    pass
+
+
+def detect_format(path, default='csv'):
+    if path and path.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    if path and path.endswith('.csv'):
+        return 'csv'
+    return default
+
+
+def read_rows(stream, fmt):
+    """Itère sur ``(numéro de ligne, dict)`` sans charger tout le fichier"""
+    if fmt == 'jsonl':
+        for number, line in enumerate(stream, start=1):
+            if line.strip():
+                try:
+                    yield number, json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield number, RowError(f'JSON invalide : {e}')
+    else:
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+
+
+def clean_row(row):
+    """Valide une ligne et retourne les valeurs prêtes à insérer"""
+    if isinstance(row, Exception):
+        raise row
+    if not isinstance(row, dict):
+        raise RowError('objet attendu')
+    sku = str(row.get('sku') or '').strip()
+    name = str(row.get('name') or '').strip()
+    if not sku:
+        raise RowError('sku manquant')
+    if not name:
+        raise RowError('name manquant')
+    if len(sku) > 64 or len(name) > 200:
+        raise RowError('sku ou name trop long')
+    try:
+        price = Decimal(str(row.get('price'))).quantize(Decimal('0.01'))
+        stock = int(row.get('stock') or 0)
+    except (InvalidOperation, TypeError, ValueError):
+        raise RowError('price ou stock invalide')
+    if price < 0 or stock < 0 or price >= Decimal('1e8'):
+        raise RowError('price ou stock hors limites')
+    return {'sku': sku, 'name': name, 'description': str(row.get('description') or ''),
+            'price': price, 'stock': stock}
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def upsert_batch(rows, using):
+    """Insère ou met à jour un lot en une instruction (bulk_create ... update_conflicts)"""
+    Product.objects.using(using).bulk_create(
+        [Product(**row) for row in rows],
+        update_conflicts=True,
+        unique_fields=['sku'],
+        update_fields=UPDATE_FIELDS,
+    )
+
+
+COPY_UPSERT = """
+    INSERT INTO products_product (sku, name, description, price, stock, image, image_variants, created_at, updated_at)
+    SELECT sku, name, description, price, stock, NULL, '{}'::jsonb, %(now)s, %(now)s FROM products_import
+    ON CONFLICT (sku) DO UPDATE SET
+        name = EXCLUDED.name, description = EXCLUDED.description,
+        price = EXCLUDED.price, stock = EXCLUDED.stock, updated_at = EXCLUDED.updated_at
+"""
+
+
+def copy_batch(rows, using):
+    """PostgreSQL : COPY du lot dans une table temporaire puis un seul INSERT ... ON CONFLICT"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([row[field] for field in FIELDS])
+    buffer.seek(0)
+
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS products_import "
+            "(sku text, name text, description text, price numeric, stock integer) ON COMMIT DELETE ROWS"
+        )
+        copy_sql = 'COPY products_import (sku, name, description, price, stock) FROM STDIN WITH (FORMAT csv)'
+        raw = cursor.cursor
+        if hasattr(raw, 'copy'):
+            # psycopg 3
+            with raw.copy(copy_sql) as copy:
+                copy.write(buffer.read())
+        else:
+            # psycopg2
+            raw.copy_expert(copy_sql, buffer)
+        cursor.execute(COPY_UPSERT, {'now': timezone.now()})
+
+
+def import_products(stream, fmt='csv', batch_size=5000, using=None, on_error=None):
+    """
+    Importe les produits de ``stream`` et retourne ``(lignes importées, lignes rejetées)``.
+
+    Dans un lot, la dernière ligne d'une même référence l'emporte.
+    """
+    using = using or router.db_for_write(Product)
+    write = copy_batch if connections[using].vendor == 'postgresql' else upsert_batch
+    imported = rejected = 0
+
+    def valid_rows():
+        nonlocal rejected
+        for number, row in read_rows(stream, fmt):
+            try:
+                yield clean_row(row)
+            except RowError as e:
+                rejected += 1
+                if on_error:
+                    on_error(number, e)
+
+    for batch in batched(valid_rows(), batch_size):
+        rows = list({row['sku']: row for row in batch}.values())
+        with transaction.atomic(using=using):
+            write(rows, using)
+        imported += len(batch)
+
+    if imported:
+        bump_catalog_version()
+        # Trop de lignes pour un diff : les clients du flux rechargent le catalogue
+        publish_reset()
+    return imported, rejected
+
+
+def export_products(stream, fmt='csv', chunk_size=5000, using=None):
+    """Écrit tout le catalogue dans ``stream`` en lisant la base par morceaux"""
+    rows = (Product.objects.using(using or router.db_for_read(Product))
+            .order_by('id').values_list(*FIELDS)
+            .iterator(chunk_size=chunk_size))
+    count = 0
+    if fmt == 'jsonl':
+        for values in rows:
+            row = dict(zip(FIELDS, values))
+            row['price'] = str(row['price'])
+            stream.write(json.dumps(row, ensure_ascii=False) + '\n')
+            count += 1
+    else:
+        writer = csv.writer(stream)
+        writer.writerow(FIELDS)
+        for values in rows:
+            writer.writerow(['' if value is None else value for value in values])
+            count += 1
+    return count
@@ -0,0 +1,187 @@
+"""
+Cache en lecture du catalogue produits.
+
+Les réponses de liste, détail et ``available`` sont stockées sous une clé
+qui contient un numéro de version du catalogue. Toute écriture sur un
+produit incrémente ce numéro (voir ``signals.py``) : les anciennes entrées
+ne sont plus jamais lues et expirent d'elles-mêmes.
+
+Les mouvements de stock des commandes (``mark_stock_changed``) n'invalident
+pas tout le catalogue : la clé d'un détail contient aussi la version du
+produit affiché, invalidée aussitôt ; celle des listes une génération de
+stock, renouvelée au plus une fois toutes les ``PRODUCT_LIST_STOCK_LAG``
+secondes. Le stock affiché dans les listes peut donc avoir ce retard.
+
+Un verrou ``cache.add`` par clé évite que plusieurs workers reconstruisent
+la même entrée en parallèle après une invalidation.
+
+Les fonctions préfixées par ``a`` sont les équivalents async, pour les vues
+async du catalogue (``async_views.py``) ; elles partagent les mêmes clés.
+"""
+import asyncio
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+VERSION_KEY = 'products:catalog:version'
+STOCK_GENERATION_KEY = 'products:catalog:stock'
+# Change à chaque mouvement de stock, sans délai (ETag des commandes avec produits)
+STOCK_VERSION_KEY = 'products:catalog:stock:version'
+# Stock modifié depuis la dernière génération / génération renouvelée récemment
+STOCK_PENDING_KEY = 'products:catalog:stock:pending'
+STOCK_GATE_KEY = 'products:catalog:stock:gate'
+CACHE_TIMEOUT = getattr(settings, 'PRODUCT_CACHE_TIMEOUT', 300)
+STOCK_LAG = getattr(settings, 'PRODUCT_LIST_STOCK_LAG', 10)
+LOCK_TIMEOUT = 10
+LOCK_WAIT = 2.0
+LOCK_POLL_INTERVAL = 0.02
+
+
+def _new_version():
+    # Basé sur l'horloge pour ne jamais réutiliser une version après éviction
+    return time.time_ns() // 1000
+
+
+def get_catalog_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, _new_version(), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+async def aget_catalog_version():
+    version = await cache.aget(VERSION_KEY)
+    if version is None:
+        await cache.aadd(VERSION_KEY, _new_version(), None)
+        version = await cache.aget(VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    """Invalide toutes les réponses du catalogue en cache"""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, _new_version(), None)
+
+
+def product_version_key(product_id):
+    return f'products:product:{product_id}:version'
+
+
+def mark_stock_changed(product_ids):
+    """Stock de ``product_ids`` modifié (commandes) : détails invalidés, listes après ``STOCK_LAG`` au plus"""
+    version = _new_version()
+    versions = {product_version_key(product_id): version for product_id in product_ids}
+    cache.set_many({**versions, STOCK_VERSION_KEY: version, STOCK_PENDING_KEY: 1}, None)
+
+
+def get_stock_version():
+    version = cache.get(STOCK_VERSION_KEY)
+    if version is None:
+        cache.add(STOCK_VERSION_KEY, _new_version(), None)
+        version = cache.get(STOCK_VERSION_KEY)
+    return version
+
+
+def _request_digest(request):
+    url = f'{request.get_host()}{request.get_full_path()}'
+    return hashlib.md5(url.encode('utf-8')).hexdigest()
+
+
+def _sub_version_key(product_id):
+    """Version propre à la réponse : celle du produit d'un détail, la génération de stock d'une liste"""
+    return STOCK_GENERATION_KEY if product_id is None else product_version_key(product_id)
+
+
+def _stock_due(values, product_id):
+    """Liste dont le stock a changé depuis la dernière génération"""
+    return product_id is None and values.get(STOCK_PENDING_KEY) is not None
+
+
+def catalog_cache_key(request, name, product_id=None):
+    """Clé d'une réponse : versions du catalogue et du stock (ou du produit), vue, hôte et URL complète"""
+    sub_key = _sub_version_key(product_id)
+    values = cache.get_many([VERSION_KEY, sub_key, STOCK_PENDING_KEY])
+    missing = [key for key in (VERSION_KEY, sub_key) if values.get(key) is None]
+    for key in missing:
+        cache.add(key, _new_version(), None)
+    if _stock_due(values, product_id) and cache.add(STOCK_GATE_KEY, 1, STOCK_LAG):
+        cache.delete(STOCK_PENDING_KEY)
+        cache.set(STOCK_GENERATION_KEY, _new_version(), None)
+        missing.append(STOCK_GENERATION_KEY)
+    if missing:
+        values.update(cache.get_many(missing))
+    return f'products:catalog:v{values[VERSION_KEY]}:{name}:s{values[sub_key]}:{_request_digest(request)}'
+
+
+async def acatalog_cache_key(request, name, product_id=None):
+    sub_key = _sub_version_key(product_id)
+    values = await cache.aget_many([VERSION_KEY, sub_key, STOCK_PENDING_KEY])
+    missing = [key for key in (VERSION_KEY, sub_key) if values.get(key) is None]
+    for key in missing:
+        await cache.aadd(key, _new_version(), None)
+    if _stock_due(values, product_id) and await cache.aadd(STOCK_GATE_KEY, 1, STOCK_LAG):
+        await cache.adelete(STOCK_PENDING_KEY)
+        await cache.aset(STOCK_GENERATION_KEY, _new_version(), None)
+        missing.append(STOCK_GENERATION_KEY)
+    if missing:
+        values.update(await cache.aget_many(missing))
+    return f'products:catalog:v{values[VERSION_KEY]}:{name}:s{values[sub_key]}:{_request_digest(request)}'
+
+
+def get_or_build(key, builder, timeout=CACHE_TIMEOUT):
+    """
+    Retourne la valeur en cache pour ``key`` ou la construit avec ``builder``.
+
+    Un seul appelant reconstruit une clé donnée ; les autres attendent
+    jusqu'à ``LOCK_WAIT`` secondes que la valeur soit disponible avant de
+    la calculer eux-mêmes (sans la stocker).
+    """
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    lock_key = f'{key}:lock'
+    if cache.add(lock_key, 1, LOCK_TIMEOUT):
+        try:
+            value = builder()
+            cache.set(key, value, timeout)
+        finally:
+            cache.delete(lock_key)
+        return value
+
+    deadline = time.monotonic() + LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        value = cache.get(key)
+        if value is not None:
+            return value
+    return builder()
+
+
+async def aget_or_build(key, builder, timeout=CACHE_TIMEOUT):
+    """Comme ``get_or_build``, avec un ``builder`` async ; l'attente ne bloque pas la boucle"""
+    value = await cache.aget(key)
+    if value is not None:
+        return value
+
+    lock_key = f'{key}:lock'
+    if await cache.aadd(lock_key, 1, LOCK_TIMEOUT):
+        try:
+            value = await builder()
+            await cache.aset(key, value, timeout)
+        finally:
+            await cache.adelete(lock_key)
+        return value
+
+    deadline = time.monotonic() + LOCK_WAIT
+    while time.monotonic() < deadline:
+        await asyncio.sleep(LOCK_POLL_INTERVAL)
+        value = await cache.aget(key)
+        if value is not None:
+            return value
+    return await builder()
@@ -0,0 +1,160 @@
+"""
+Déclinaisons des images produit.
+
+À chaque nouvelle image, trois tailles (miniature, carte, pleine) sont
+générées en WebP et en JPEG, hors du cycle de la requête. Les fichiers
+portent un hash de leur contenu (``products/variants/miel-card-1a2b3c4d5e6f.webp``)
+et peuvent donc être servis avec un cache HTTP de longue durée.
+
+Le résultat est stocké dans ``Product.image_variants`` :
+
+    {'source': 'products/miel.jpg',
+     'card': {'width': 400, 'height': 400,
+              'webp': 'products/variants/miel-card-....webp',
+              'jpeg': 'products/variants/miel-card-....jpg'}, ...}
+"""
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .cache import bump_catalog_version
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+# Nom : (largeur, hauteur, recadrage carré)
+VARIANTS = {
+    'thumbnail': (100, 100, True),
+    'card': (400, 400, True),
+    'full': (1200, 1200, False),
+}
+# Format : (extension, format Pillow, options d'encodage)
+FORMATS = {
+    'webp': ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('jpg', 'JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+VARIANTS_DIR = 'products/variants'
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'PRODUCT_IMAGE_VARIANT_WORKERS', 2),
+            thread_name_prefix='image-variants',
+        )
+    return _executor
+
+
+def needs_variants(product):
+    """Vrai si l'image du produit n'a pas encore de déclinaisons à jour"""
+    return bool(product.image) and product.image_variants.get('source') != product.image.name
+
+
+def render_variant(image, width, height, crop):
+    if crop:
+        return ImageOps.fit(image, (width, height), Image.LANCZOS)
+    resized = image.copy()
+    resized.thumbnail((width, height), Image.LANCZOS)
+    return resized
+
+
+def save_content_addressed(stem, variant, extension, data):
+    """Enregistre ``data`` sous un nom dérivé de son contenu, s'il n'existe pas déjà"""
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    name = f'{VARIANTS_DIR}/{stem}-{variant}-{digest}.{extension}'
+    if not default_storage.exists(name):
+        name = default_storage.save(name, ContentFile(data))
+    return name
+
+
+def build_variants(image_name):
+    """Génère toutes les déclinaisons de l'image ``image_name`` et retourne leur description"""
+    with default_storage.open(image_name, 'rb') as f:
+        source = Image.open(f)
+        source = ImageOps.exif_transpose(source)
+        source.load()
+    if source.mode not in ('RGB', 'L'):
+        # Le JPEG ne gère pas la transparence : fond blanc
+        background = Image.new('RGB', source.size, 'white')
+        background.paste(source, mask=source.convert('RGBA').getchannel('A'))
+        source = background
+
+    stem = PurePosixPath(image_name).stem
+    variants = {'source': image_name}
+    for variant, (width, height, crop) in VARIANTS.items():
+        rendered = render_variant(source, width, height, crop)
+        description = {'width': rendered.width, 'height': rendered.height}
+        for key, (extension, pil_format, options) in FORMATS.items():
+            buffer = BytesIO()
+            rendered.convert('RGB').save(buffer, pil_format, **options)
+            description[key] = save_content_addressed(stem, variant, extension, buffer.getvalue())
+        variants[variant] = description
+    return variants
+
+
+def generate_variants(product_id):
+    """
+    Génère les déclinaisons d'un produit et les enregistre.
+
+    La mise à jour ne s'applique que si l'image n'a pas changé entre-temps.
+    Retourne True si des déclinaisons ont été enregistrées.
+    """
+    product = Product.objects.filter(pk=product_id).only('image').first()
+    if product is None or not product.image:
+        return False
+    variants = build_variants(product.image.name)
+    updated = Product.objects.filter(pk=product_id, image=product.image.name).update(
+        image_variants=variants, updated_at=timezone.now())
+    if updated:
+        # update() ne déclenche pas post_save : invalider le catalogue nous-mêmes
+        transaction.on_commit(bump_catalog_version)
+    return bool(updated)
+
+
+def _run_in_background(product_id):
+    close_old_connections()
+    try:
+        generate_variants(product_id)
+    except Exception:
+        logger.exception("Échec de la génération des images du produit %s", product_id)
+    finally:
+        connection.close()
+
+
+def schedule_variants(product_id):
+    """
+    Lance la génération des déclinaisons hors de la requête.
+
+    Avec ``PRODUCT_IMAGE_VARIANTS_ASYNC = False`` (tests, scripts), la
+    génération est faite immédiatement. Les produits dont la tâche a été
+    perdue (redémarrage) sont rattrapés par ``generate_image_variants``.
+    """
+    if getattr(settings, 'PRODUCT_IMAGE_VARIANTS_ASYNC', True):
+        _get_executor().submit(_run_in_background, product_id)
+    else:
+        generate_variants(product_id)
+
+
+def variant_urls(product, request=None):
+    """URLs publiques des déclinaisons, pour l'API"""
+    urls = {}
+    for variant, description in product.image_variants.items():
+        if variant not in VARIANTS:
+            continue
+        urls[variant] = {'width': description['width'], 'height': description['height']}
+        for key in FORMATS:
+            url = default_storage.url(description[key])
+            urls[variant][key] = request.build_absolute_uri(url) if request is not None else url
+    return urls
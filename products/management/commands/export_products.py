@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from products.bulk import detect_format, export_products
+
+
+class Command(BaseCommand):
+    help = "Exporte le catalogue en CSV ou JSON Lines, en flux"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-',
+                            help="Fichier de sortie ('-' pour la sortie standard)")
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help="Format de sortie (déduit de l'extension, CSV par défaut)")
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--database', default=None)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or detect_format(path)
+        if path == '-':
+            export_products(self.stdout, fmt, options['chunk_size'], options['database'])
+            return
+        with open(path, 'w', newline='', encoding='utf-8') as stream:
+            count = export_products(stream, fmt, options['chunk_size'], options['database'])
+        self.stderr.write(f'{count} produit(s) exporté(s) dans {path}')
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from products.images import generate_variants, needs_variants
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = "Génère les déclinaisons (miniature, carte, pleine) des images produit existantes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help='Régénère aussi les produits qui ont déjà des déclinaisons')
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        products = (Product.objects.exclude(image='').exclude(image__isnull=True)
+                    .only('id', 'image', 'image_variants').order_by('id'))
+        done = failed = 0
+        for product in products.iterator(chunk_size=options['chunk_size']):
+            if not options['force'] and not needs_variants(product):
+                continue
+            try:
+                if generate_variants(product.id):
+                    done += 1
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f'Produit {product.id} ({product.image.name}) : {e}')
+        self.stdout.write(f'{done} produit(s) traité(s), {failed} échec(s)')
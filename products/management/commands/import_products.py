@@ -0,0 +1,38 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.bulk import detect_format, import_products
+
+
+class Command(BaseCommand):
+    help = "Importe (crée ou met à jour par sku) des produits depuis un fichier CSV ou JSON Lines"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Fichier à importer ('-' pour l'entrée standard)")
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help="Format du fichier (déduit de l'extension par défaut)")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--database', default=None)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or detect_format(path)
+
+        def report(number, error):
+            self.stderr.write(f'Ligne {number} ignorée : {error}')
+
+        start = time.monotonic()
+        if path == '-':
+            imported, rejected = import_products(sys.stdin, fmt, options['batch_size'], options['database'], report)
+        else:
+            try:
+                stream = open(path, newline='', encoding='utf-8')
+            except OSError as e:
+                raise CommandError(f'Impossible de lire {path} : {e}')
+            with stream:
+                imported, rejected = import_products(stream, fmt, options['batch_size'], options['database'], report)
+
+        self.stdout.write(f'{imported} produit(s) importé(s), {rejected} ligne(s) rejetée(s) '
+                          f'en {time.monotonic() - start:.1f} s')
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:47
+
+from django.db import migrations, models
+from django.db.models import CharField, Value
+from django.db.models.functions import Cast, Concat
+
+
+def assign_skus(apps, schema_editor):
+    """Donne une référence P<id> aux produits existants"""
+    Product = apps.get_model('products', 'Product')
+    Product.objects.filter(sku__isnull=True).update(sku=Concat(Value('P'), Cast('id', CharField())))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_product_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='sku',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True, verbose_name='Référence'),
+        ),
+        migrations.RunPython(assign_skus, migrations.RunPython.noop),
+    ]
@@ -3,11 +3,15 @@ from django.db import models
 # Create your models here.
 
 class Product(models.Model):
+    # Référence stable du produit, clé des imports (manage.py import_products)
+    sku = models.CharField(max_length=64, unique=True, blank=True, null=True, verbose_name="Référence")
     name = models.CharField(max_length=200, verbose_name="Nom du produit")
     description = models.TextField(verbose_name="Description")
     price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Prix")
     stock = models.IntegerField(default=0, verbose_name="Stock disponible")
     image = models.ImageField(upload_to='products/', blank=True, null=True, verbose_name="Image")
+    # Déclinaisons générées en arrière-plan (voir images.py)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False, verbose_name="Déclinaisons de l'image")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Date de création")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Dernière modification")
     
@@ -15,6 +19,29 @@ class Product(models.Model):
         verbose_name = "Produit"
         verbose_name_plural = "Produits"
         ordering = ['-created_at']
+        indexes = [
+            # Sert la pagination par curseur sur (created_at, id)
+            models.Index(fields=['-created_at', '-id'], name='product_created_id_idx'),
+        ]
     
     def __str__(self):
         return self.name
+    
+    def save(self, *args, **kwargs):
+        # Sans référence saisie, P<id> comme pour les produits d'avant la
+        # migration 0005 : l'export doit rester réimportable
+        if self.sku:
+            return super().save(*args, **kwargs)
+        # NULL plutôt que '' : la colonne est unique
+        self.sku = None
+        super().save(*args, **kwargs)
+        # L'id n'est connu qu'après l'INSERT : une requête de plus, à la création seulement
+        self.sku = f'P{self.pk}'
+        type(self)._default_manager.using(self._state.db).filter(pk=self.pk).update(sku=self.sku)
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Valeurs lues en base, pour ne publier que les vrais changements (stream.py)
+        instance._loaded_stock_price = (instance.__dict__.get('stock'), instance.__dict__.get('price'))
+        return instance
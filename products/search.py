@@ -0,0 +1,143 @@
+"""
+Recherche plein texte sur les produits.
+
+Sur SQLite la recherche utilise la table FTS5 ``products_product_fts`` ;
+sur PostgreSQL la colonne générée ``search_vector`` et son index GIN (voir
+la migration 0003). Les deux sont tenues à jour par la base à chaque
+écriture sur ``products_product``. Les autres bases retombent sur un
+``icontains`` non classé.
+"""
+import re
+
+from django.db import connections, router
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Product
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+SQLITE_RANKED = """
+    SELECT rowid FROM products_product_fts
+    WHERE products_product_fts MATCH %s
+    ORDER BY bm25(products_product_fts, 10.0, 1.0), rowid DESC
+    LIMIT %s OFFSET %s
+"""
+SQLITE_MATCHING = "SELECT rowid FROM products_product_fts WHERE products_product_fts MATCH %s"
+
+POSTGRESQL_RANKED = """
+    SELECT id FROM products_product, websearch_to_tsquery('french', %s) query
+    WHERE search_vector @@ query
+    ORDER BY ts_rank_cd(search_vector, query) DESC, id DESC
+    LIMIT %s OFFSET %s
+"""
+POSTGRESQL_MATCHING = (
+    "SELECT id FROM products_product WHERE search_vector @@ websearch_to_tsquery('french', %s)"
+)
+
+
+# Recréés après chaque migrate : SQLite supprime les triggers quand Django
+# reconstruit la table products_product (ajout ou modification de colonne).
+SQLITE_INDEX = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS products_product_fts USING fts5(
+        name, description,
+        content='products_product', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_product_fts_insert AFTER INSERT ON products_product BEGIN
+        INSERT INTO products_product_fts(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_product_fts_delete AFTER DELETE ON products_product BEGIN
+        INSERT INTO products_product_fts(products_product_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_product_fts_update
+    AFTER UPDATE OF name, description ON products_product BEGIN
+        INSERT INTO products_product_fts(products_product_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO products_product_fts(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+]
+SQLITE_TRIGGERS = {'products_product_fts_insert', 'products_product_fts_delete', 'products_product_fts_update'}
+
+
+def ensure_search_index(using='default'):
+    """
+    Recrée l'index FTS5 et ses triggers s'ils manquent (SQLite uniquement),
+    puis réindexe tout le catalogue dans ce cas.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'products_product'")
+        if SQLITE_TRIGGERS <= {row[0] for row in cursor.fetchall()}:
+            return False
+        for sql in SQLITE_INDEX:
+            cursor.execute(sql)
+        cursor.execute("INSERT INTO products_product_fts(products_product_fts) VALUES ('rebuild')")
+    return True
+
+
+def get_vendor():
+    return connections[router.db_for_read(Product)].vendor
+
+
+def to_fts5_query(text):
+    """Transforme une saisie libre en requête FTS5 sûre : chaque mot, en préfixe"""
+    return ' '.join(f'"{word}"*' for word in WORD_RE.findall(text))
+
+
+def _query_param(vendor, text):
+    return to_fts5_query(text) if vendor == 'sqlite' else text
+
+
+def search_ids(text, limit=20, offset=0):
+    """Identifiants des produits correspondant à ``text``, du plus pertinent au moins pertinent"""
+    vendor = get_vendor()
+    if not WORD_RE.search(text):
+        return []
+    if vendor == 'sqlite':
+        sql = SQLITE_RANKED
+    elif vendor == 'postgresql':
+        sql = POSTGRESQL_RANKED
+    else:
+        return list(
+            filter_by_search(Product.objects.order_by('-created_at', '-id'), text)
+            .values_list('id', flat=True)[offset:offset + limit]
+        )
+    with connections[router.db_for_read(Product)].cursor() as cursor:
+        cursor.execute(sql, [_query_param(vendor, text), limit, offset])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def filter_by_search(queryset, text):
+    """Restreint ``queryset`` aux produits correspondant à ``text`` (sans classement)"""
+    vendor = get_vendor()
+    if not WORD_RE.search(text):
+        return queryset.none()
+    if vendor == 'sqlite':
+        return queryset.filter(id__in=RawSQL(SQLITE_MATCHING, [_query_param(vendor, text)]))
+    if vendor == 'postgresql':
+        return queryset.filter(id__in=RawSQL(POSTGRESQL_MATCHING, [text]))
+    condition = Q()
+    for word in WORD_RE.findall(text):
+        condition &= Q(name__icontains=word) | Q(description__icontains=word)
+    return queryset.filter(condition)
+
+
+def search_products(text, limit=20, offset=0):
+    """Produits correspondant à ``text``, classés par pertinence"""
+    ids = search_ids(text, limit, offset)
+    products = Product.objects.in_bulk(ids)
+    return [products[pk] for pk in ids if pk in products]
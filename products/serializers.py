@@ -1,8 +1,15 @@
 from rest_framework import serializers
+from .images import variant_urls
 from .models import Product
 
 class ProductSerializer(serializers.ModelSerializer):
+    image_variants = serializers.SerializerMethodField()
+    
     class Meta:
         model = Product
-        fields = ['id', 'name', 'description', 'price', 'stock', 'image', 'created_at', 'updated_at']
-        read_only_fields = ['created_at', 'updated_at'] 
\ No newline at end of file
+        fields = ['id', 'sku', 'name', 'description', 'price', 'stock', 'image', 'image_variants', 'created_at', 'updated_at']
+        read_only_fields = ['created_at', 'updated_at']
+    
+    def get_image_variants(self, obj):
+        """URLs des miniatures, cartes et images pleines en WebP et JPEG"""
+        return variant_urls(obj, self.context.get('request'))
@@ -0,0 +1,44 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import receiver
+
+from .cache import bump_catalog_version
+from .images import needs_variants, schedule_variants
+from .models import Product
+from .search import ensure_search_index
+from .stream import product_change, publish_changes
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_catalog_cache(sender, **kwargs):
+    """Invalide le cache du catalogue une fois la transaction validée"""
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver(post_save, sender=Product)
+def publish_stock_and_price(sender, instance, created, **kwargs):
+    """Diffuse le stock et le prix sur le flux SSE quand ils changent"""
+    values = (instance.stock, instance.price)
+    if created or values != getattr(instance, '_loaded_stock_price', None):
+        publish_changes([product_change(instance.pk, *values)])
+    instance._loaded_stock_price = values
+
+
+@receiver(post_delete, sender=Product)
+def publish_deletion(sender, instance, **kwargs):
+    publish_changes([{'id': instance.pk, 'deleted': True}])
+
+
+@receiver(post_save, sender=Product)
+def generate_image_variants(sender, instance, **kwargs):
+    """Génère les déclinaisons d'une nouvelle image, après validation de la transaction"""
+    if needs_variants(instance):
+        transaction.on_commit(lambda: schedule_variants(instance.pk))
+    elif not instance.image and instance.image_variants:
+        Product.objects.filter(pk=instance.pk).update(image_variants={})
+
+
+def restore_search_index(sender, using, **kwargs):
+    """Remet en place l'index plein texte après les migrations"""
+    ensure_search_index(using)
@@ -0,0 +1,230 @@
+"""
+Flux des changements de stock et de prix (Server-Sent Events).
+
+Chaque modification de ``stock`` ou ``price`` publie, après validation de
+la transaction, un événement numéroté contenant les nouvelles valeurs des
+produits concernés : ``[{"id": 3, "stock": 5, "price": "2500.00"}]``, ou
+``{"id": 3, "deleted": true}`` pour un produit supprimé. Les numéros
+croissent d'un par événement ; les ``PRODUCT_STREAM_HISTORY`` derniers sont
+gardés pour qu'un client reconnecté (``Last-Event-ID``) reçoive ce qu'il a
+manqué. S'il a trop de retard, il reçoit un événement ``reset`` et doit
+recharger le catalogue.
+
+Avec ``REDIS_URL``, les événements passent par Redis (pub/sub, historique
+dans un sorted set) et chaque processus n'ouvre qu'un abonnement, qu'il
+redistribue à ses clients. Sans Redis, un broker en mémoire du processus
+(développement, tests).
+"""
+import asyncio
+import json
+import logging
+import threading
+from collections import deque
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import transaction
+
+from ecommerce.redis import get_script
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'products:stream'
+SEQUENCE_KEY = 'products:stream:seq'
+HISTORY_KEY = 'products:stream:history'
+HISTORY_SIZE = getattr(settings, 'PRODUCT_STREAM_HISTORY', 1000)
+# Au-delà, un client trop lent est resynchronisé par un ``reset``
+QUEUE_SIZE = 100
+
+PRODUCTS = 'products'
+RESET = 'reset'
+
+# Numéro, ajout à l'historique et diffusion en une seule opération atomique
+PUBLISH_SCRIPT = """
+local id = redis.call('INCR', KEYS[1])
+local message = '{"id":' .. id .. ',"event":"' .. ARGV[1] .. '","data":' .. ARGV[2] .. '}'
+redis.call('ZADD', KEYS[2], id, message)
+redis.call('ZREMRANGEBYRANK', KEYS[2], 0, -tonumber(ARGV[3]) - 1)
+redis.call('PUBLISH', KEYS[3], message)
+return id
+"""
+
+
+class Subscription:
+    """File d'événements d'un client, alimentée depuis n'importe quel thread"""
+
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+        self.overflowed = False
+
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self):
+        return await self.queue.get()
+
+
+def missed_events(history, current, last_id):
+    """Événements après ``last_id``, ou ``None`` si une partie n'est plus dans l'historique"""
+    if last_id > current:
+        # Numérotation repartie de zéro (Redis vidé)
+        return None
+    events = [event for event in history if event['id'] > last_id]
+    if current > last_id and (not events or events[0]['id'] != last_id + 1):
+        return None
+    return events
+
+
+class Broker:
+    """Redistribution des événements aux abonnés du processus"""
+
+    def __init__(self):
+        self.subscriptions = set()
+
+    def subscribe(self):
+        subscription = Subscription()
+        self.subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self.subscriptions.discard(subscription)
+
+    def dispatch(self, event):
+        for subscription in list(self.subscriptions):
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, event)
+            except RuntimeError:
+                # Boucle fermée : connexion abandonnée sans passer par unsubscribe()
+                self.unsubscribe(subscription)
+
+
+class LocalBroker(Broker):
+    """Broker en mémoire, limité au processus courant"""
+
+    def __init__(self):
+        super().__init__()
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.current = 0
+            self.history = deque(maxlen=HISTORY_SIZE)
+            self.subscriptions.clear()
+
+    def publish(self, kind, data):
+        with self.lock:
+            self.current += 1
+            event = {'id': self.current, 'event': kind, 'data': data}
+            self.history.append(event)
+        self.dispatch(event)
+        return event['id']
+
+    async def since(self, last_id):
+        with self.lock:
+            return missed_events(list(self.history), self.current, last_id), self.current
+
+
+class RedisBroker(Broker):
+    """Événements partagés entre processus par Redis"""
+
+    def __init__(self, url):
+        super().__init__()
+        self.url = url
+        self.listener = None
+        self.client = None
+
+    def publish(self, kind, data):
+        return get_script(PUBLISH_SCRIPT)(keys=[SEQUENCE_KEY, HISTORY_KEY, CHANNEL],
+                                          args=[kind, json.dumps(data), HISTORY_SIZE])
+
+    def async_client(self):
+        if self.client is None:
+            import redis.asyncio
+
+            self.client = redis.asyncio.Redis.from_url(self.url)
+        return self.client
+
+    def subscribe(self):
+        if self.listener is None or self.listener.done():
+            self.listener = asyncio.ensure_future(self.listen())
+        return super().subscribe()
+
+    async def listen(self):
+        """Abonnement unique du processus, rétabli après une coupure"""
+        from redis.exceptions import RedisError
+
+        while True:
+            try:
+                async with self.async_client().pubsub() as pubsub:
+                    await pubsub.subscribe(CHANNEL)
+                    async for message in pubsub.listen():
+                        if message['type'] == 'message':
+                            self.dispatch(json.loads(message['data']))
+            except RedisError as e:
+                logger.warning('Abonnement Redis au flux produits interrompu : %s', e)
+            # Des événements ont pu être perdus pendant la coupure
+            self.dispatch({'id': None, 'event': RESET, 'data': {}})
+            await asyncio.sleep(1)
+
+    async def since(self, last_id):
+        client = self.async_client()
+        current, raw = await asyncio.gather(
+            client.get(SEQUENCE_KEY), client.zrangebyscore(HISTORY_KEY, f'({last_id}', '+inf'),
+        )
+        current = int(current or 0)
+        return missed_events([json.loads(message) for message in raw], current, last_id), current
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    return RedisBroker(settings.REDIS_URL) if settings.REDIS_URL else LocalBroker()
+
+
+def product_change(product_id, stock, price):
+    return {'id': product_id, 'stock': stock, 'price': str(price)}
+
+
+def product_changes(product_ids):
+    """Valeurs actuelles de ``stock`` et ``price`` ; les produits absents sont supprimés"""
+    rows = {
+        product_id: product_change(product_id, stock, price)
+        for product_id, stock, price
+        in Product.objects.filter(pk__in=product_ids).values_list('id', 'stock', 'price')
+    }
+    return [rows.get(product_id, {'id': product_id, 'deleted': True}) for product_id in sorted(product_ids)]
+
+
+def publish(kind, data):
+    from redis.exceptions import RedisError
+
+    try:
+        get_broker().publish(kind, data)
+    except RedisError as e:
+        # Les clients se resynchronisent à la reconnexion suivante
+        logger.warning('Publication sur le flux produits impossible : %s', e)
+
+
+def publish_changes(changes):
+    """Publie ``changes`` une fois la transaction validée"""
+    transaction.on_commit(lambda: publish(PRODUCTS, changes), robust=True)
+
+
+def publish_product_changes(product_ids):
+    """
+    Publie les nouvelles valeurs de ``product_ids`` après un ``update()``.
+    Elles sont lues tout de suite, dans la transaction : après le commit,
+    une erreur ferait échouer une requête dont l'écriture a réussi.
+    """
+    if product_ids:
+        publish_changes(product_changes(set(product_ids)))
+
+
+def publish_reset():
+    """Changements en masse (import) : les clients rechargent le catalogue"""
+    transaction.on_commit(lambda: publish(RESET, {}), robust=True)
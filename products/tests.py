@@ -1,3 +1,657 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+from rest_framework.test import APIClient, APITestCase
+
+from ecommerce.admin_pagination import estimated_row_count
+from ecommerce.asgi import CatalogASGIHandler
+from .cache import STOCK_GATE_KEY, get_or_build, mark_stock_changed
+from .models import Product
+from .search import ensure_search_index, search_products
+from .stream import get_broker, missed_events, publish_product_changes
+
+
+def make_products(count, **extra):
+    """Crée ``count`` produits en une requête"""
+    defaults = {'description': 'Produit de test', 'price': Decimal('100.00'), 'stock': 5}
+    defaults.update(extra)
+    return Product.objects.bulk_create(
+        Product(name=f'Produit {i}', **defaults) for i in range(count)
+    )
+
+
+class ProductPaginationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        make_products(45)
+        self.url = reverse('product-list')
+
+    def collect(self, url):
+        ids, pages = [], 0
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(p['id'] for p in response.data['results'])
+            url = response.data['next']
+            pages += 1
+        return ids, pages
+
+    def test_cursor_walk_matches_model_ordering(self):
+        ids, pages = self.collect(self.url + '?page_size=10')
+        expected = list(Product.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+        self.assertEqual(pages, 5)
+
+    def test_first_page_has_no_previous_and_no_count(self):
+        response = self.client.get(self.url)
+        self.assertEqual(len(response.data['results']), 20)
+        self.assertIsNone(response.data['previous'])
+        self.assertNotIn('count', response.data)
+
+    def test_previous_link_returns_same_page(self):
+        first = self.client.get(self.url + '?page_size=10').data
+        second = self.client.get(first['next']).data
+        back = self.client.get(second['previous']).data
+        self.assertEqual([p['id'] for p in back['results']], [p['id'] for p in first['results']])
+        self.assertIsNone(back['previous'])
+
+    def test_cursor_is_stable_when_rows_are_inserted(self):
+        first = self.client.get(self.url + '?page_size=10').data
+        make_products(3)
+        second = self.client.get(first['next']).data
+        seen = {p['id'] for p in first['results']}
+        self.assertFalse(seen & {p['id'] for p in second['results']})
+        self.assertEqual(len(second['results']), 10)
+
+    def test_page_size_is_bounded(self):
+        make_products(100)
+        response = self.client.get(self.url + '?page_size=1000')
+        self.assertEqual(len(response.data['results']), 100)
+
+    def test_invalid_cursor_returns_404(self):
+        response = self.client.get(self.url + '?cursor=pas-un-curseur')
+        self.assertEqual(response.status_code, 404)
+
+    def test_offset_pagination_still_available(self):
+        response = self.client.get(self.url + '?page=3&page_size=10')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 45)
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_available_is_paginated(self):
+        make_products(5, stock=0)
+        ids, _ = self.collect(reverse('product-available') + '?page_size=7')
+        self.assertEqual(len(ids), 45)
+
+
+class ProductCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = make_products(3)[0]
+
+    def test_repeated_reads_are_served_from_cache(self):
+        urls = [reverse('product-list'), reverse('product-available'),
+                reverse('product-detail', args=[self.product.id])]
+        for url in urls:
+            first = self.client.get(url)
+            with self.assertNumQueries(0):
+                second = self.client.get(url)
+            self.assertEqual(first.data, second.data)
+
+    def test_save_invalidates_cached_responses(self):
+        url = reverse('product-detail', args=[self.product.id])
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = 'Pain Artisanal'
+            self.product.save()
+        self.assertEqual(self.client.get(url).data['name'], 'Pain Artisanal')
+
+    def test_delete_invalidates_cached_responses(self):
+        url = reverse('product-list')
+        self.assertEqual(len(self.client.get(url).data['results']), 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.delete()
+        self.assertEqual(len(self.client.get(url).data['results']), 2)
+
+    def test_api_write_invalidates_cached_list(self):
+        url = reverse('product-list')
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, {'name': 'Mangues', 'description': 'Fruits',
+                                              'price': '500.00', 'stock': 3})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(self.client.get(url).data['results']), 4)
+
+    def test_stock_changes_reach_lists_within_lag(self):
+        url = reverse('product-list')
+        detail_url = reverse('product-detail', args=[self.product.id])
+
+        def set_stock(stock):
+            Product.objects.filter(pk=self.product.id).update(stock=stock)
+            mark_stock_changed([self.product.id])
+
+        def listed_stock():
+            return next(row['stock'] for row in self.client.get(url).data['results'] if row['id'] == self.product.id)
+
+        self.client.get(url)
+        set_stock(4)
+        self.assertEqual(listed_stock(), 4)
+        set_stock(3)
+        self.assertEqual(self.client.get(detail_url).data['stock'], 3)
+        # Génération renouvelée il y a moins de PRODUCT_LIST_STOCK_LAG secondes
+        with self.assertNumQueries(0):
+            self.assertEqual(listed_stock(), 4)
+        cache.delete(STOCK_GATE_KEY)
+        self.assertEqual(listed_stock(), 3)
+
+    def test_missing_product_is_not_cached(self):
+        url = reverse('product-detail', args=[999999])
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_concurrent_rebuilds_run_builder_once(self):
+        calls = []
+        release = threading.Event()
+
+        def builder():
+            calls.append(1)
+            release.wait(1)
+            return 'valeur'
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(get_or_build('cle-test', builder)))
+                   for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.05)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['valeur'] * 5)
+        self.assertEqual(len(calls), 1)
+
+
+class ProductConditionalGetTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.products = make_products(5)
+        self.urls = [reverse('product-list'), reverse('product-available'),
+                     reverse('product-detail', args=[self.products[0].id])]
+
+    def test_responses_carry_validators(self):
+        for url in self.urls:
+            response = self.client.get(url)
+            self.assertRegex(response['ETag'], r'^"[0-9a-f]{32}"$')
+            self.assertIn('GMT', response['Last-Modified'])
+
+    def test_if_none_match_returns_304_in_one_query_without_serializer(self):
+        for url in self.urls:
+            etag = self.client.get(url)['ETag']
+            cache.clear()
+            with mock.patch('products.serializers.ProductSerializer.to_representation') as serialize:
+                with self.assertNumQueries(1):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            serialize.assert_not_called()
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response['ETag'], etag)
+            self.assertEqual(response.content, b'')
+            # Validateurs en cache : aucune requête
+            with self.assertNumQueries(0):
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_if_modified_since_returns_304(self):
+        url = self.urls[0]
+        last_modified = self.client.get(url)['Last-Modified']
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+    def test_changes_invalidate_etag(self):
+        url = self.urls[0]
+        etag = self.client.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products[3].delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        etag = response['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products[1].name = 'Renommé'
+            self.products[1].save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etag_depends_on_query_string(self):
+        first = self.client.get(self.urls[0] + '?page_size=2')['ETag']
+        self.assertNotEqual(self.client.get(self.urls[0] + '?page_size=3')['ETag'], first)
+        response = self.client.get(self.urls[0] + '?page_size=3', HTTP_IF_NONE_MATCH=first)
+        self.assertEqual(response.status_code, 200)
+
+    def test_missing_product_has_no_validators(self):
+        response = self.client.get(reverse('product-detail', args=[0]))
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(response.has_header('ETag'))
+
+
+class ProductSearchTests(APITestCase):
+    url = reverse('product-search')
+
+    def setUp(self):
+        cache.clear()
+        self.honey = Product.objects.create(name='Miel Local', description='Récolté dans nos ruches',
+                                            price=Decimal('2500.00'), stock=3)
+        self.cheese = Product.objects.create(name='Fromage de Chèvre', description='Affiné, texture crémeuse',
+                                             price=Decimal('1200.00'), stock=8)
+        self.bread = Product.objects.create(name='Pain Artisanal', description='Parfait avec du miel',
+                                            price=Decimal('150.00'), stock=15)
+
+    def search(self, q, **params):
+        response = self.client.get(self.url, {'q': q, **params})
+        self.assertEqual(response.status_code, 200)
+        return [p['id'] for p in response.data['results']]
+
+    def test_results_are_ranked_name_first(self):
+        self.assertEqual(self.search('miel'), [self.honey.id, self.bread.id])
+
+    def test_accents_and_prefixes(self):
+        self.assertEqual(self.search('chevre'), [self.cheese.id])
+        self.assertEqual(self.search('crém'), [self.cheese.id])
+
+    def test_all_words_must_match(self):
+        self.assertEqual(self.search('pain miel'), [self.bread.id])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.honey.name = 'Confiture'
+        self.honey.save()
+        self.assertEqual(self.search('confiture'), [self.honey.id])
+        self.assertEqual(self.search('miel'), [self.bread.id])
+        self.bread.delete()
+        cache.clear()
+        self.assertEqual(self.search('miel'), [])
+
+    def test_bulk_created_products_are_indexed(self):
+        make_products(3, description='Mangues du Sénégal')
+        self.assertEqual(len(self.search('senegal')), 3)
+
+    def test_pagination(self):
+        make_products(5, description='Mangues')
+        first = self.client.get(self.url, {'q': 'mangues', 'page_size': 3}).data
+        second = self.client.get(first['next']).data
+        self.assertEqual(len(first['results']) + len(second['results']), 5)
+        self.assertIsNone(second['next'])
+
+    def test_query_syntax_is_escaped(self):
+        for q in ['"miel', 'miel OR', 'NEAR(', '*', 'miel -pain', "l'abeille"]:
+            self.client.get(self.url, {'q': q})
+        self.assertEqual(self.search('***'), [])
+
+    def test_index_is_restored_when_triggers_are_lost(self):
+        # Ce que provoque une reconstruction de table par une migration SQLite
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER products_product_fts_insert')
+        self.assertTrue(ensure_search_index())
+        self.assertFalse(ensure_search_index())
+        product = Product.objects.create(name='Bissap', description='Fleurs', price=Decimal('300.00'))
+        self.assertEqual(self.search('bissap'), [product.id])
+
+    def test_missing_query_is_rejected(self):
+        self.assertEqual(self.client.get(self.url).status_code, 400)
+
+    def test_admin_search_uses_index(self):
+        from django.contrib.auth.models import User
+        admin_user = User.objects.create_superuser('admin', 'admin@example.com', 'secret')
+        self.client.force_login(admin_user)
+        response = self.client.get(reverse('admin:products_product_changelist'), {'q': 'chevre'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['cl'].queryset), [self.cheese])
+
+
+def image_upload(name='miel.png', size=(800, 600), mode='RGBA'):
+    buffer = BytesIO()
+    Image.new(mode, size, (200, 150, 0, 255) if mode == 'RGBA' else (200, 150, 0)).save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+@override_settings(PRODUCT_IMAGE_VARIANTS_ASYNC=False)
+class ImageVariantTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=media)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def create_product(self, **extra):
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.create(name='Miel Local', description='Miel pur', price=Decimal('2500.00'),
+                                             stock=3, image=image_upload(), **extra)
+        product.refresh_from_db()
+        return product
+
+    def test_variants_are_generated_after_save(self):
+        product = self.create_product()
+        variants = product.image_variants
+        self.assertEqual(variants['source'], product.image.name)
+        self.assertEqual((variants['thumbnail']['width'], variants['thumbnail']['height']), (100, 100))
+        self.assertEqual((variants['card']['width'], variants['card']['height']), (400, 400))
+        self.assertEqual((variants['full']['width'], variants['full']['height']), (800, 600))
+        for variant in ('thumbnail', 'card', 'full'):
+            self.assertRegex(variants[variant]['webp'], rf'^products/variants/miel-{variant}-[0-9a-f]{{12}}\.webp$')
+            with default_storage.open(variants[variant]['jpeg']) as f:
+                self.assertEqual(Image.open(f).format, 'JPEG')
+
+    def test_variants_are_exposed_by_the_api(self):
+        product = self.create_product()
+        data = self.client.get(reverse('product-detail', args=[product.id])).data
+        self.assertTrue(data['image_variants']['card']['webp'].startswith('http://testserver/media/products/variants/'))
+        self.assertEqual(data['image_variants']['thumbnail']['width'], 100)
+        self.assertNotIn('source', data['image_variants'])
+
+    def test_unchanged_image_is_not_regenerated(self):
+        product = self.create_product()
+        with mock.patch('products.signals.schedule_variants') as schedule:
+            with self.captureOnCommitCallbacks(execute=True):
+                product.stock = 10
+                product.save()
+        schedule.assert_not_called()
+
+    def test_removing_image_clears_variants(self):
+        product = self.create_product()
+        product.image = None
+        product.save()
+        product.refresh_from_db()
+        self.assertEqual(product.image_variants, {})
+
+    def test_backfill_command(self):
+        product = self.create_product()
+        Product.objects.filter(pk=product.pk).update(image_variants={})
+        out = StringIO()
+        call_command('generate_image_variants', stdout=out)
+        self.assertIn('1 produit(s) traité(s)', out.getvalue())
+        product.refresh_from_db()
+        self.assertIn('card', product.image_variants)
+
+        out = StringIO()
+        call_command('generate_image_variants', stdout=out)
+        self.assertIn('0 produit(s) traité(s)', out.getvalue())
+
+
+class BulkImportExportTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return path
+
+    def test_csv_import_creates_and_updates_by_sku(self):
+        Product.objects.create(sku='MIEL-1', name='Miel', description='Ancien', price=Decimal('1.00'), stock=1)
+        path = self.write('produits.csv', 'sku,name,description,price,stock\n'
+                                          'MIEL-1,Miel Local,Miel pur,2500,3\n'
+                                          'PAIN-1,Pain Artisanal,Four à bois,150.5,15\n')
+        out = StringIO()
+        call_command('import_products', path, batch_size=1, stdout=out)
+        self.assertIn('2 produit(s) importé(s), 0 ligne(s) rejetée(s)', out.getvalue())
+        honey = Product.objects.get(sku='MIEL-1')
+        self.assertEqual((honey.name, honey.price, honey.stock), ('Miel Local', Decimal('2500.00'), 3))
+        self.assertEqual(Product.objects.get(sku='PAIN-1').price, Decimal('150.50'))
+        self.assertEqual(Product.objects.count(), 2)
+
+    def test_jsonl_import_rejects_bad_rows(self):
+        path = self.write('produits.jsonl', '\n'.join([
+            json.dumps({'sku': 'A', 'name': 'Mangues', 'price': '500', 'stock': 4}),
+            json.dumps({'sku': 'B', 'name': 'Sans prix'}),
+            '{pas du json',
+            json.dumps({'name': 'Sans sku', 'price': 1}),
+            json.dumps({'sku': 'A', 'name': 'Mangues Kent', 'price': '600', 'stock': 2}),
+        ]) + '\n')
+        err = StringIO()
+        call_command('import_products', path, stdout=StringIO(), stderr=err)
+        self.assertEqual(err.getvalue().count('ignorée'), 3)
+        self.assertEqual(list(Product.objects.values_list('sku', 'name')), [('A', 'Mangues Kent')])
+
+    def test_imported_products_are_searchable(self):
+        path = self.write('produits.csv', 'sku,name,description,price,stock\nK-1,Beurre de karité,Pur,900,2\n')
+        call_command('import_products', path, stdout=StringIO())
+        self.assertEqual(len(search_products('karite')), 1)
+
+    def test_export_then_import_round_trip(self):
+        for product in make_products(7):
+            product.sku = f'S{product.id}'
+            product.save()
+        for fmt in ('csv', 'jsonl'):
+            path = os.path.join(self.directory, f'export.{fmt}')
+            call_command('export_products', path, stderr=StringIO())
+            Product.objects.update(name='Effacé')
+            call_command('import_products', path, stdout=StringIO())
+            self.assertEqual(Product.objects.filter(name__startswith='Produit').count(), 7)
+            self.assertEqual(Product.objects.count(), 7)
+
+    def test_products_created_without_sku_round_trip(self):
+        api = APIClient()
+        response = api.post(reverse('product-list'), {'name': 'Mangues', 'description': 'Fruits',
+                                                      'price': '500.00', 'stock': 3, 'sku': ''})
+        self.assertEqual(response.data['sku'], f"P{response.data['id']}")
+        Product.objects.create(name='Pain Artisanal', description='Four à bois', price=Decimal('150.00'))
+        path = os.path.join(self.directory, 'export.csv')
+        call_command('export_products', path, stderr=StringIO())
+        Product.objects.update(stock=0)
+        out = StringIO()
+        call_command('import_products', path, stdout=out)
+        self.assertIn('2 produit(s) importé(s), 0 ligne(s) rejetée(s)', out.getvalue())
+        self.assertEqual(Product.objects.count(), 2)
+        self.assertEqual(Product.objects.get(name='Mangues').stock, 3)
+
+    def test_export_reads_in_chunks(self):
+        make_products(3)
+        out = StringIO()
+        with self.assertNumQueries(1):
+            call_command('export_products', format='jsonl', chunk_size=2, stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 3)
+
+
+@override_settings(ROOT_URLCONF='ecommerce.asgi_urls')
+class AsyncCatalogTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.products = make_products(25)
+
+    def sync_get(self, url):
+        cache.clear()
+        with override_settings(ROOT_URLCONF='ecommerce.urls'):
+            response = self.client.get(url)
+        cache.clear()
+        return response.json()
+
+    async def test_reads_match_sync_views(self):
+        urls = [
+            '/api/products/?page_size=10',
+            '/api/products/?page=2&page_size=10',
+            '/api/products/available/',
+            f'/api/products/{self.products[0].id}/',
+        ]
+        for url in urls:
+            expected = await sync_to_async(self.sync_get)(url)
+            response = await self.async_client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertEqual(response.json(), expected, url)
+
+    async def test_cursor_walk(self):
+        url, ids = '/api/products/?page_size=10', []
+        while url:
+            data = (await self.async_client.get(url)).json()
+            ids.extend(p['id'] for p in data['results'])
+            url = data['next']
+        self.assertEqual(sorted(ids), sorted(p.id for p in self.products))
+
+    async def test_errors(self):
+        response = await self.async_client.get('/api/products/0/')
+        self.assertEqual(response.status_code, 404)
+        self.assertIn('detail', response.json())
+        response = await self.async_client.get('/api/products/?cursor=pas-un-curseur')
+        self.assertEqual(response.status_code, 404)
+
+    def test_repeated_reads_are_cached(self):
+        url = f'/api/products/{self.products[0].id}/'
+        get = async_to_sync(self.async_client.get)
+        get(url)
+        with self.assertNumQueries(0):
+            response = get(url)
+        self.assertEqual(response.json()['id'], self.products[0].id)
+
+    async def test_writes_are_delegated_to_sync_views(self):
+        response = await self.async_client.post(
+            '/api/products/', {'name': 'Mangues', 'description': 'Fruits', 'price': '500.00', 'stock': 3},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 201)
+        response = await self.async_client.patch(
+            f'/api/products/{self.products[0].id}/', {'stock': 9}, content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((await Product.objects.aget(pk=self.products[0].id)).stock, 9)
+
+    async def test_conditional_get_matches_sync_etag(self):
+        url = f'/api/products/{self.products[0].id}/'
+        expected = await sync_to_async(lambda: self.client.get(url)['ETag'])()
+        response = await self.async_client.get(url)
+        self.assertEqual(response['ETag'], expected)
+        response = await self.async_client.get(url, headers={'If-None-Match': expected})
+        self.assertEqual(response.status_code, 304)
+
+    def test_handler_routes_to_async_urls(self):
+        self.assertEqual(CatalogASGIHandler.urlconf, 'ecommerce.asgi_urls')
+
+
+class ProductAdminTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_superuser('admin', 'admin@example.com', 'secret')
+        self.client.force_login(user)
+        self.url = reverse('admin:products_product_changelist')
+
+    def changelist_queries(self, query=''):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url + query)
+        self.assertEqual(response.status_code, 200)
+        return [q['sql'] for q in queries]
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        make_products(5)
+        small = self.changelist_queries()
+        make_products(200, stock=500)
+        self.assertEqual(len(self.changelist_queries()), len(small))
+
+    def test_stock_filter_uses_ranges(self):
+        make_products(3, stock=0)
+        make_products(2, stock=50)
+        queries = self.changelist_queries()
+        self.assertFalse([sql for sql in queries if 'DISTINCT' in sql])
+        response = self.client.get(self.url + '?stock_range=out')
+        self.assertEqual(response.context['cl'].result_count, 3)
+        self.assertContains(response, '11 à 100')
+
+    @override_settings(ADMIN_EXACT_COUNT_LIMIT=10)
+    def test_large_tables_use_estimated_count(self):
+        make_products(30)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.assertEqual(estimated_row_count(Product), 30)
+        queries = self.changelist_queries()
+        self.assertFalse([sql for sql in queries if 'COUNT(' in sql and 'products_product' in sql])
+        # Avec un filtre : comptage plafonné
+        response = self.client.get(self.url + '?stock_range=low')
+        self.assertEqual(response.context['cl'].result_count, 10)
+
+
+@override_settings(ROOT_URLCONF='ecommerce.asgi_urls')
+class ProductStreamTests(TestCase):
+    def setUp(self):
+        self.broker = get_broker()
+        self.broker.clear()
+        self.addCleanup(self.broker.clear)
+        self.product = make_products(1, stock=5)[0]
+
+    def published(self):
+        return [(event['event'], event['data']) for event in self.broker.history]
+
+    async def read(self, response, count):
+        return [(await anext(response.streaming_content)).decode() for _ in range(count)]
+
+    def test_saves_publish_stock_and_price_changes_only(self):
+        product = Product.objects.get(pk=self.product.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            product.name = 'Renommé'
+            product.save()
+        self.assertEqual(self.published(), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            product.stock = 3
+            product.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            product.delete()
+        self.assertEqual(self.published(), [
+            ('products', [{'id': self.product.pk, 'stock': 3, 'price': '100.00'}]),
+            ('products', [{'id': self.product.pk, 'deleted': True}]),
+        ])
+
+    def test_stock_reservation_publishes_new_stock(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('order-create-order'), {
+                'customer_name': 'Awa Diop', 'customer_email': 'awa@example.com', 'customer_address': 'Dakar',
+                'items_data': [{'product_id': self.product.pk, 'quantity': 2}],
+            }, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertIn(('products', [{'id': self.product.pk, 'stock': 3, 'price': '100.00'}]), self.published())
+
+    def test_rollback_publishes_nothing(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            Product.objects.filter(pk=self.product.pk).update(stock=0)
+            publish_product_changes([self.product.pk])
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(self.published(), [])
+
+    async def test_stream_replays_missed_events_then_follows(self):
+        for stock in (4, 3, 2):
+            self.broker.publish('products', [{'id': self.product.pk, 'stock': stock, 'price': '100.00'}])
+        response = await self.async_client.get('/api/products/stream/', headers={'Last-Event-ID': '1'})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        retry, second, third = await self.read(response, 3)
+        self.assertTrue(retry.startswith('retry:'))
+        self.assertEqual(
+            second, f'id: 2\nevent: products\ndata: [{{"id":{self.product.pk},"stock":3,"price":"100.00"}}]\n\n')
+        self.assertTrue(third.startswith('id: 3\n'))
+
+        await sync_to_async(self.broker.publish)('products', [{'id': self.product.pk, 'deleted': True}])
+        live, = await self.read(response, 1)
+        self.assertEqual(live, f'id: 4\nevent: products\ndata: [{{"id":{self.product.pk},"deleted":true}}]\n\n')
+
+    async def test_unknown_last_event_id_resets(self):
+        self.broker.publish('products', [])
+        response = await self.async_client.get('/api/products/stream/?last_event_id=99')
+        _, reset = await self.read(response, 2)
+        self.assertEqual(reset, 'id: 1\nevent: reset\ndata: {}\n\n')
+
+    def test_missed_events(self):
+        history = [{'id': i} for i in (4, 5, 6)]
+        self.assertEqual(missed_events(history, 6, 4), [{'id': 5}, {'id': 6}])
+        self.assertEqual(missed_events(history, 6, 6), [])
+        self.assertIsNone(missed_events(history, 6, 2))
+        self.assertIsNone(missed_events(history, 6, 10))
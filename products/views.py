@@ -1,8 +1,13 @@
 from django.shortcuts import render
-from rest_framework import viewsets
+from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from ecommerce.conditional import conditional_response, queryset_validators
+from .cache import catalog_cache_key, get_or_build
 from .models import Product
+from .search import search_products
 from .serializers import ProductSerializer
 
 # Create your views here.
@@ -11,9 +16,72 @@ class ProductViewSet(viewsets.ModelViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     
+    def cached_response(self, request, build, queryset=None, product_id=None):
+        """
+        Sert la réponse depuis le cache du catalogue, ou la construit. Avec
+        ``queryset`` (les produits affichés), répond aussi aux GET conditionnels ;
+        ses validateurs sont gardés en cache avec la réponse. ``product_id`` :
+        détail d'un produit, invalidé dès que son stock change.
+        """
+        key = catalog_cache_key(request, self.action, product_id)
+        def respond():
+            return Response(get_or_build(key, lambda: build().data))
+        
+        if queryset is None:
+            return respond()
+        validators = get_or_build(f'{key}:validators', lambda: queryset_validators(queryset))
+        return conditional_response(request, validators, respond)
+    
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, lambda: super(ProductViewSet, self).list(request, *args, **kwargs),
+                                    Product.objects.all())
+    
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            product_id = int(kwargs['pk'])
+            queryset = Product.objects.filter(pk=product_id)
+        except ValueError:
+            product_id = queryset = None
+        return self.cached_response(request, lambda: super(ProductViewSet, self).retrieve(request, *args, **kwargs),
+                                    queryset, product_id)
+    
     @action(detail=False, methods=['get'])
     def available(self, request):
         """Retourne seulement les produits en stock"""
+        return self.cached_response(request, lambda: self.list_available(request), Product.objects.filter(stock__gt=0))
+    
+    def list_available(self, request):
         products = Product.objects.filter(stock__gt=0)
+        page = self.paginate_queryset(products)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
         serializer = self.get_serializer(products, many=True)
         return Response(serializer.data)
+
+    
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """Recherche plein texte classée par pertinence : ?q=miel&page=2"""
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({'q': ['Ce paramètre est requis.']}, status=status.HTTP_400_BAD_REQUEST)
+        return self.cached_response(request, lambda: self.search_results(request, query))
+    
+    def search_results(self, request, query):
+        try:
+            page = int(request.query_params.get('page', 1))
+        except ValueError:
+            page = 0
+        if page < 1:
+            raise NotFound('Page invalide.')
+        
+        size = self.paginator.get_page_size(request)
+        products = search_products(query, limit=size + 1, offset=(page - 1) * size)
+        url = request.build_absolute_uri()
+        serializer = self.get_serializer(products[:size], many=True)
+        return Response({
+            'next': replace_query_param(url, 'page', page + 1) if len(products) > size else None,
+            'previous': replace_query_param(url, 'page', page - 1) if page > 1 else None,
+            'results': serializer.data,
+        })